@@ -0,0 +1,110 @@
+"""
+Capture anonymisée du trafic de l'API principale, pour benchmarks/replay.py.
+
+Avec CAPTURE_PATH défini, chaque requête sur /api/* ajoute une ligne JSON
+compacte au fichier : heure d'arrivée, modèle de route (/api/sessions/{session_id}
+et non le chemin réel), statut, durée, et les
+métadonnées déclarées par l'endpoint via `annotate()` (langue, longueur de
+l'historique, longueur du texte, résultat du cache). Aucun texte, identifiant
+ni adresse n'est enregistré.
+"""
+
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger("capture")
+
+CAPTURE_PATH_ENV = "CAPTURE_PATH"
+
+# Endpoint enregistré pour les requêtes qui ne correspondent à aucune route
+UNMATCHED_ROUTE = "<non routée>"
+
+# Clés courtes : le fichier grossit d'une ligne par requête
+FIELDS = {
+    "lang": "l",
+    "history": "h",
+    "chars": "n",
+    "bytes": "b",
+    "cache": "c",
+}
+
+_current = contextvars.ContextVar("holokia_capture", default=None)
+
+
+def annotate(**values):
+    """Ajoute des métadonnées à la requête capturée en cours (sans effet sinon)"""
+    record = _current.get()
+    if record is None:
+        return
+    for name, value in values.items():
+        if value is not None:
+            record[FIELDS[name]] = value
+
+
+class CaptureWriter:
+    """Fichier en ajout seul, une ligne par requête"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8", buffering=1)
+
+    def write(self, record):
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self._lock:
+            try:
+                self._file.write(line)
+            except OSError as e:
+                logger.warning(f"Impossible d'écrire la capture dans {self.path} : {e}")
+
+
+class CaptureMiddleware:
+    """Middleware ASGI : une ligne de capture par requête /api/*"""
+
+    def __init__(self, app, writer, prefix="/api/"):
+        self.app = app
+        self.writer = writer
+        self.prefix = prefix
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.prefix):
+            await self.app(scope, receive, send)
+            return
+
+        record = {"t": round(time.time(), 3), "e": UNMATCHED_ROUTE, "m": scope["method"]}
+        token = _current.set(record)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _current.reset(token)
+            # Modèle de route, connu une fois la requête routée : le chemin brut
+            # contiendrait les identifiants de session
+            route = scope.get("route")
+            record["e"] = getattr(route, "path", None) or UNMATCHED_ROUTE
+            record["s"] = status
+            record["d"] = round(time.perf_counter() - start, 4)
+            self.writer.write(record)
+
+
+def instrument_app(app, path=None):
+    """Active la capture si CAPTURE_PATH (ou `path`) est défini"""
+    path = path or os.getenv(CAPTURE_PATH_ENV)
+    if not path:
+        return False
+    app.add_middleware(CaptureMiddleware, writer=CaptureWriter(path))
+    logger.info(f"Capture du trafic activée : {path}")
+    return True
@@ -0,0 +1,71 @@
+"""
+Intentions simples (salutations, identité, remerciements, au revoir) reconnues
+avant le LLM à partir de app/intents.yaml.
+
+Les motifs sont compilés une fois au chargement et comparés au message entier
+normalisé : un tour reconnu ne coûte ni appel Groq ni synthèse, son audio étant
+préparé au démarrage de l'API principale.
+"""
+
+import logging
+import re
+
+import yaml # type: ignore
+
+import metrics
+from speculation import normalize_transcript
+
+logger = logging.getLogger("avatar-backend")
+
+# Au-delà, le message porte une vraie question même s'il commence par une salutation
+MAX_INTENT_CHARS = 60
+
+INTENT_REPLIES = metrics.counter(
+    "holokia_intent_replies_total", "Réponses servies localement sans appel au LLM, par intention", labels=("intent",),
+)
+
+
+class IntentMatcher:
+    def __init__(self, intents):
+        # Langue -> [(intention, motif compilé)]
+        self._patterns = {}
+        # (intention, langue) -> réponse
+        self.replies = {}
+        for name, spec in intents.items():
+            for lang, patterns in (spec.get("patterns") or {}).items():
+                pattern = re.compile("|".join(f"(?:{pattern})" for pattern in patterns))
+                self._patterns.setdefault(lang, []).append((name, pattern))
+            for lang, reply in (spec.get("replies") or {}).items():
+                self.replies[(name, lang)] = reply
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            config = yaml.safe_load(f) or {}
+        return cls(config.get("intents") or {})
+
+    def match(self, text, lang=None):
+        """(intention, langue, réponse) si le message entier correspond à une intention, sinon None"""
+        normalized = normalize_transcript(text)
+        if not normalized or len(normalized) > MAX_INTENT_CHARS:
+            return None
+        # Motifs de la langue détectée d'abord ; langdetect se trompe souvent sur un seul mot
+        for language in sorted(self._patterns, key=lambda language: language != lang):
+            for name, pattern in self._patterns[language]:
+                if pattern.fullmatch(normalized) and (name, language) in self.replies:
+                    return name, language, self.replies[(name, language)]
+        return None
+
+    def phrases(self):
+        """(texte, langue) de toutes les réponses, pour la synthèse au démarrage"""
+        return [(reply, lang) for (name, lang), reply in self.replies.items()]
+
+
+def load_intents(path):
+    try:
+        matcher = IntentMatcher.from_file(path)
+    except (OSError, yaml.YAMLError, re.error) as e:
+        logger.warning(f"Intentions locales désactivées, impossible de charger {path} : {e}")
+        return None
+    logger.info(f"{len(matcher.replies)} réponse(s) locale(s) chargée(s) depuis {path}")
+    return matcher
@@ -1,6 +1,6 @@
-from fastapi import FastAPI, HTTPException # type: ignore
+from fastapi import FastAPI, HTTPException, Request # type: ignore
+from fastapi.concurrency import run_in_threadpool # type: ignore
 from fastapi.middleware.cors import CORSMiddleware # type: ignore
-from fastapi.middleware.gzip import GZipMiddleware # type: ignore
 from pydantic import BaseModel # type: ignore
 from typing import List, Optional
 from langchain_groq import ChatGroq # type: ignore
@@ -13,9 +13,24 @@ from langdetect import detect # type: ignore
 from datetime import datetime
 import httpx # type: ignore
 from cachetools import TTLCache # type: ignore
+import json
 import time
 import asyncio
 import hashlib
+import readiness
+import metrics
+import tracing
+import stubs
+import capture
+import speculation
+import intents
+import warmup
+import ndjson
+import sessions
+import sentences
+import monolith
+from service_registry import ServiceRegistry
+from upstream_pool import UpstreamPool, register_pool_metrics
 
 # Chargement des variables d'environnement
 load_dotenv()
@@ -25,23 +40,87 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("avatar-backend")
 
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+# LLM_BACKEND=stub : LLM factice pour les tests de charge (voir stubs.py)
+LLM_STUB = stubs.llm_stub_enabled()
 
-if not GROQ_API_KEY:
+if not GROQ_API_KEY and not LLM_STUB:
     logger.error("GROQ_API_KEY non définie dans les variables d'environnement")
     raise ValueError("GROQ_API_KEY est requise. Veuillez la définir dans le fichier .env")
 
 # Initialisation du cache
-cache = TTLCache(maxsize=500, ttl=86400)
+cache = TTLCache(maxsize=int(os.getenv("LLM_CACHE_SIZE", 500)), ttl=86400)
+
+# Instances TTS/STT vivantes (mises à jour par start_service.py en mode superviseur)
+registry = ServiceRegistry()
+
+# Répartition des appels entre instances : least_outstanding ou ewma
+UPSTREAM_STRATEGY = os.getenv("UPSTREAM_STRATEGY", "least_outstanding")
+# TTS : chaque phrase va à l'instance qui possède son audio en cache (TTS_HASH_AFFINITY=0 pour désactiver)
+tts_pool = UpstreamPool(
+    "tts", registry, strategy=UPSTREAM_STRATEGY,
+    hash_affinity=os.getenv("TTS_HASH_AFFINITY", "1") != "0",
+    load_factor=float(os.getenv("TTS_AFFINITY_LOAD_FACTOR", 1.25))
+)
+# STT : un même enregistrement (sha256) revient à la même instance, dont le cache rejoint la transcription en cours
+# (par processus : avec des workers pré-fork, la connexion peut arriver sur un autre worker de l'instance)
+stt_pool = UpstreamPool(
+    "stt", registry, strategy=UPSTREAM_STRATEGY,
+    hash_affinity=os.getenv("STT_HASH_AFFINITY", "1") != "0",
+    load_factor=float(os.getenv("STT_AFFINITY_LOAD_FACTOR", 1.25))
+)
+register_pool_metrics([tts_pool, stt_pool])
+
+# Démarrage du LLM sur la transcription partielle stable du flux STT (voir speculation.py)
+SPECULATIVE_LLM = os.getenv("SPECULATIVE_LLM", "0") == "1"
+# Similarité minimale (0-1) entre partielle et finale normalisées pour garder la réponse spéculative
+speculator = speculation.Speculator(tolerance=float(os.getenv("SPECULATION_TOLERANCE", 0.9)))
+
+# Réponses locales (salutations, identité...) servies sans appel au LLM ; LOCAL_INTENTS=0 pour désactiver
+INTENTS_PATH = os.getenv("INTENTS_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "intents.yaml"))
+intent_matcher = intents.load_intents(INTENTS_PATH) if os.getenv("LOCAL_INTENTS", "1") != "0" else None
+# (texte, langue) -> audioId des réponses locales déjà synthétisées
+intent_audio = {}
+
+# Préchauffage du cache LLM et des MP3 au démarrage (HOLOKIA_WARMUP=1 ou start_service.py --warmup)
+WARMUP_ENABLED = os.getenv("HOLOKIA_WARMUP", "0") == "1"
+WARMUP_PHRASES_PATH = os.getenv(
+    "WARMUP_PHRASES_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "warmup_phrases.yaml")
+)
+warmup_progress = None
+
+# Sessions de conversation : le client n'envoie que sessionId + message (voir sessions.py)
+session_store = sessions.SessionStore(
+    max_sessions=int(os.getenv("SESSION_MAX", 1000)),
+    ttl=float(os.getenv("SESSION_TTL_S", 1800)),
+    spill_dir=os.getenv("SESSION_SPILL_DIR") or None
+)
+
+# Mode monolithe : TTS et STT chargés dans ce processus et appelés sans réseau (voir monolith.py)
+service_apps = monolith.load_service_apps() if monolith.enabled() else {}
+
+def upstream_client(timeout):
+    """Client httpx vers les services TTS/STT ; les instances déclarant un socket Unix sont jointes par celui-ci"""
+    mounts = {url: httpx.AsyncHTTPTransport(uds=path) for url, path in registry.sockets().items()}
+    if service_apps:
+        mounts.update(monolith.in_process_transports(registry, service_apps))
+    return httpx.AsyncClient(timeout=timeout, mounts=mounts)
+
+# Taille maximale d'un enregistrement transmis au service STT
+MAX_STT_UPLOAD_BYTES = int(os.getenv("MAX_STT_UPLOAD_BYTES", 10 * 1024 * 1024))
 
 # Initialisation du modèle LLM
 try:
-    llm = ChatGroq(
-        groq_api_key=GROQ_API_KEY,
-        model="meta-llama/llama-4-scout-17b-16e-instruct",
-        max_tokens=200,
-        temperature=0.5
-    )
-    logger.info("Modèle LLM Groq initialisé avec succès")
+    if LLM_STUB:
+        llm = stubs.make_stub_llm()
+        logger.warning("LLM factice activé (LLM_BACKEND=stub) : aucune requête vers Groq")
+    else:
+        llm = ChatGroq(
+            groq_api_key=GROQ_API_KEY,
+            model="meta-llama/llama-4-scout-17b-16e-instruct",
+            max_tokens=200,
+            temperature=0.5
+        )
+        logger.info("Modèle LLM Groq initialisé avec succès")
 except Exception as e:
     logger.error(f"Erreur lors de l'initialisation du modèle LLM : {e}")
     raise
@@ -58,17 +137,41 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID", "Server-Timing"],
 )
 
-app.add_middleware(GZipMiddleware, minimum_size=1000)
+# Endpoints dont chaque ligne doit partir dès qu'elle est prête
+STREAMING_PATHS = {"/api/turn"}
+
+app.add_middleware(ndjson.SelectiveGZipMiddleware, minimum_size=1000, excluded_paths=STREAMING_PATHS)
+
+# Latences par route et GET /metrics
+metrics.instrument_app(app, "main")
+
+# X-Request-ID transmis aux services TTS/STT et en-tête Server-Timing
+tracing.instrument_app(app, "main")
+
+# Capture anonymisée du trafic pour benchmarks/replay.py (si CAPTURE_PATH est défini)
+capture.instrument_app(app)
 
 class Message(BaseModel):
     role: str
     content: str
 
 class GenerateRequest(BaseModel):
-    history: List[Message]
+    history: List[Message] = []
     detectedLanguage: str | None = None  # Ajouter la langue détectée
+    speculationId: str | None = None  # Génération spéculative démarrée sur la partielle
+    sessionId: str | None = None  # Mode session : seul le nouveau message est envoyé
+    message: str | None = None
+
+class SessionRequest(BaseModel):
+    history: List[Message] = []
+
+class SpeculateRequest(BaseModel):
+    speculationId: str
+    history: List[Message]
+    detectedLanguage: str | None = None
 
 class GenerateResponse(BaseModel):
     text: str
@@ -81,10 +184,98 @@ class TTSRequest(BaseModel):
 class STTRequest(BaseModel):
     audio_id: str
     language: str | None = None
+    word_timestamps: bool = False
+
+class TurnRequest(BaseModel):
+    text: str
+    history: List[Message] = []
+    detectedLanguage: str | None = None
+
+@app.on_event("startup")
+async def announce_ready():
+    if WARMUP_ENABLED:
+        # Prêt seulement une fois les caches préchauffés (ou le délai écoulé)
+        asyncio.create_task(warm_up_then_announce())
+        return
+    # LLM initialisé : le service est prêt à recevoir des requêtes
+    readiness.notify_ready(service="main")
+
+async def warm_up_then_announce():
+    global warmup_progress
+    try:
+        phrases = warmup.load_phrases(WARMUP_PHRASES_PATH)
+    except Exception as e:
+        logger.warning(f"Préchauffage ignoré, impossible de lire {WARMUP_PHRASES_PATH} : {e}")
+        phrases = []
+    logger.info(f"Préchauffage de {len(phrases)} phrase(s) depuis {WARMUP_PHRASES_PATH}")
+    warmup_progress = warmup.WarmupProgress(len(phrases))
+    try:
+        await warmup.warm_up(
+            phrases,
+            warm_phrase,
+            warmup_progress,
+            concurrency=int(os.getenv("WARMUP_CONCURRENCY", 4)),
+            deadline=float(os.getenv("WARMUP_DEADLINE_S", 60))
+        )
+    finally:
+        readiness.notify_ready(service="main", warmup=f"{warmup_progress.done}/{warmup_progress.total}")
+
+async def warm_phrase(phrase, lang):
+    """Premier tour de conversation : remplit le cache de réponses puis synthétise l'audio de la réponse"""
+    # Réponse locale : ni appel au LLM ni cache, son audio est préparé par synthesize_intent_audio
+    if intent_matcher and intent_matcher.match(phrase, lang):
+        logger.info(f"Préchauffage de '{phrase[:30]}' ignoré : réponse locale")
+        return
+    reply = await generate_response(GenerateRequest(
+        history=[Message(role="user", content=phrase)],
+        detectedLanguage=lang
+    ))
+    await synthesize_speech(reply.text, lang)
+
+@app.on_event("startup")
+async def start_intent_audio_synthesis():
+    if intent_matcher:
+        asyncio.create_task(synthesize_intent_audio())
+
+async def synthesize_intent_audio():
+    """Synthétise l'audio des réponses locales ; le service TTS peut démarrer après l'API principale"""
+    pending = intent_matcher.phrases()
+    for attempt in range(8):
+        for text, lang in list(pending):
+            try:
+                result = await synthesize_speech(text, lang)
+            except HTTPException as e:
+                logger.warning(f"Audio de la réponse locale '{text[:30]}' non synthétisé : {e.detail}")
+                continue
+            intent_audio[(text, lang)] = result["audioId"]
+            pending.remove((text, lang))
+        if not pending:
+            logger.info(f"Audio des {len(intent_audio)} réponse(s) locale(s) prêt")
+            return
+        await asyncio.sleep(min(60, 5 * 2 ** attempt))
+    logger.warning(f"{len(pending)} réponse(s) locale(s) sans audio : le client passera par /api/tts")
+
+def resolve_language(user_message, detected_language=None):
+    """Langue de la réponse (fr, en ou ar) : celle fournie, sinon détectée sur le message"""
+    with tracing.span("lang"):
+        detected_lang = detected_language if detected_language else detect(user_message)
+    lang_mapping = {
+        "en": "en",
+        "fr": "fr",
+        "ar": "ar",
+        "ar-MA": "ar",
+        "fr-FR": "fr",
+        "en-US": "en",
+        "en-GB": "en"
+    }
+    return lang_mapping.get(detected_lang, "en")
 
 @app.post("/api/generate", response_model=GenerateResponse)
 async def generate_response(request: GenerateRequest):
     try:
+        if request.sessionId:
+            return await generate_in_session(request)
+
         if not request.history:
             raise HTTPException(status_code=400, detail="L'historique de conversation ne peut pas être vide")
         
@@ -94,91 +285,13 @@ async def generate_response(request: GenerateRequest):
         user_message = next((msg.content for msg in reversed(recent_history) if msg.role == "user"), "")
         if not user_message.strip():
             raise HTTPException(status_code=400, detail="Aucun message utilisateur trouvé")
-            
-        detected_lang = request.detectedLanguage if request.detectedLanguage else detect(user_message)
-        lang_mapping = {
-            "en": "en",
-            "fr": "fr",
-            "ar": "ar",
-            "ar-MA": "ar",
-            "fr-FR": "fr",
-            "en-US": "en",
-            "en-GB": "en"
-        }
-        detected_lang = lang_mapping.get(detected_lang, "en")
-        logger.info(f"Langue détectée : {detected_lang} pour le message : {user_message[:50]}...")
-        
-        system_prompts = {
-            "fr": "Tu es un avatar IA conversationnelle, tu t'appelles HOLOKIA. Réponds aux questions de l'utilisateur avec précision et sois bref.",
-            "en": "You are a conversational AI avatar named HOLOKIA. Answer the user's questions accurately and be brief.",
-            "ar": "أنت مساعد افتراضي ذكي اسمه HOLOKIA. أجب عن أسئلة المستخدم بدقة وباختصار.",
-        }
-        system_prompt = system_prompts.get(detected_lang, system_prompts["en"])
-        
-        cache_key = f"{conversation}_{detected_lang}"
-        if cache_key in cache:
-            logger.info(f"Utilisation du cache pour : {cache_key[:50]}...")
-            response = cache[cache_key]
-        else:
-            try:
-                prompt = ChatPromptTemplate.from_messages([
-                    ("system", system_prompt),
-                    ("user", conversation)
-                ])
-                parser = StrOutputParser()
-                model = prompt | llm | parser
-                
-                start_time = time.time()
-                response = model.invoke({"question": conversation})
-                logger.info(f"Temps appel Groq : {time.time() - start_time} secondes")
-                
-                if not response or len(response.strip()) < 5:
-                    logger.warning("Réponse LLM trop courte, utilisation du fallback")
-                    response = system_prompts.get(detected_lang, system_prompts["en"])
-                
-                # Forcer le texte pré-généré pour les salutations
-                if response.strip() == "Bonjour ! Comment puis-je vous aider aujourd'hui ?":
-                    response = "Bonjour ! Je suis HOLOKIA, comment puis-je vous aider aujourd'hui ?"
-                elif response.strip() in [
-                    "Hello! I'm HOLOKIA. How can I assist you today?",
-                    "Hello! I'm HOLOKIA, how can I assist you today?",
-                ]:
-                    response = "Hello! I am HOLOKIA, how can I assist you today?"
-                elif response.strip() == "مرحبًا! كيف يمكنني مساعدتك اليوم؟":
-                    response = "مرحبًا! أنا HOLOKIA، كيف يمكنني مساعدتك اليوم؟"
 
-                cache[cache_key] = response
-                logger.info(f"Réponse générée en {detected_lang} : {response}")
-            except Exception as e:
-                for attempt in range(3):
-                    try:
-                        start_time = time.time()
-                        response = model.invoke({"question": conversation})
-                        logger.info(f"Temps appel Groq (tentative {attempt + 1}) : {time.time() - start_time} secondes")
-                        if not response or len(response.strip()) < 5:
-                            logger.warning("Réponse LLM trop courte, utilisation du fallback")
-                            response = system_prompts.get(detected_lang, system_prompts["en"])
-                        
-                        # Forcer le texte pré-généré pour les salutations
-                        if response.strip() == "Bonjour ! Comment puis-je vous aider aujourd'hui ?":
-                            response = "Bonjour ! Je suis HOLOKIA, comment puis-je vous aider aujourd'hui ?"
-                        elif response.strip() in [
-                            "Hello! I'm HOLOKIA. How can I assist you today?",
-                            "Hello! I'm HOLOKIA, how can I assist you today?"
-                        ]:
-                            response = "Hello! I am HOLOKIA, how can I assist you today?"
-                        
-                        cache[cache_key] = response
-                        return GenerateResponse(text=response)
-                    except Exception as retry_e:
-                        logger.warning(f"Échec appel LLM, tentative {attempt + 1}/3 : {retry_e}")
-                        if attempt < 2:
-                            await asyncio.sleep(2)
-                        else:
-                            logger.error(f"Erreur lors de l'appel au LLM après 3 tentatives : {retry_e}")
-                            raise HTTPException(status_code=500, detail="Erreur lors de la génération de la réponse par le LLM")
-        
-        return GenerateResponse(text=response)
+        if request.speculationId and SPECULATIVE_LLM:
+            speculative_response = await speculator.resolve(request.speculationId, user_message)
+            if speculative_response is not None:
+                return speculative_response
+            
+        return await answer_message(conversation, user_message, request.detectedLanguage, len(request.history))
             
     except HTTPException:
         raise
@@ -186,29 +299,222 @@ async def generate_response(request: GenerateRequest):
         logger.exception(f"Erreur inattendue dans generate_response : {e}")
         raise HTTPException(status_code=500, detail="Erreur interne du serveur")
 
+async def generate_in_session(request: GenerateRequest):
+    session = session_store.get(request.sessionId)
+    if session is None:
+        # Le client recrée une session en renvoyant son historique
+        raise HTTPException(status_code=404, detail="Session inconnue ou expirée")
+    user_message = request.message or ""
+    if not user_message.strip():
+        raise HTTPException(status_code=400, detail="Le message ne peut pas être vide")
+
+    response = await answer_message(
+        session.conversation(user_message), user_message, request.detectedLanguage, len(session.lines) + 1
+    )
+    session.record_turn(user_message, response.text)
+    session_store.save(session)
+    return response
+
+SYSTEM_PROMPTS = {
+    "fr": "Tu es un avatar IA conversationnelle, tu t'appelles HOLOKIA. Réponds aux questions de l'utilisateur avec précision et sois bref.",
+    "en": "You are a conversational AI avatar named HOLOKIA. Answer the user's questions accurately and be brief.",
+    "ar": "أنت مساعد افتراضي ذكي اسمه HOLOKIA. أجب عن أسئلة المستخدم بدقة وباختصار.",
+}
+
+def llm_chain(lang):
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", SYSTEM_PROMPTS.get(lang, SYSTEM_PROMPTS["en"])),
+        ("user", "{question}")
+    ])
+    return prompt | llm | StrOutputParser()
+
+def finalize_reply(response, lang):
+    """Réponse trop courte remplacée par le fallback, salutations remplacées par le texte pré-généré"""
+    if not response or len(response.strip()) < 5:
+        logger.warning("Réponse LLM trop courte, utilisation du fallback")
+        return SYSTEM_PROMPTS.get(lang, SYSTEM_PROMPTS["en"])
+    if response.strip() == "Bonjour ! Comment puis-je vous aider aujourd'hui ?":
+        return "Bonjour ! Je suis HOLOKIA, comment puis-je vous aider aujourd'hui ?"
+    if response.strip() in [
+        "Hello! I'm HOLOKIA. How can I assist you today?",
+        "Hello! I'm HOLOKIA, how can I assist you today?",
+    ]:
+        return "Hello! I am HOLOKIA, how can I assist you today?"
+    if response.strip() == "مرحبًا! كيف يمكنني مساعدتك اليوم؟":
+        return "مرحبًا! أنا HOLOKIA، كيف يمكنني مساعدتك اليوم؟"
+    return response
+
+def local_answer(conversation, user_message, lang):
+    """Réponse sans appel au LLM (intention locale ou cache), sinon None"""
+    if intent_matcher:
+        with tracing.span("intent"):
+            intent = intent_matcher.match(user_message, lang)
+        if intent:
+            intent_name, intent_lang, reply = intent
+            intents.INTENT_REPLIES.labels(intent_name).inc()
+            logger.info(f"Intention locale '{intent_name}' ({intent_lang}) : réponse sans appel au LLM")
+            return GenerateResponse(text=reply, audioId=intent_audio.get((reply, intent_lang)))
+
+    cache_key = f"{conversation}_{lang}"
+    with tracing.span("cache"):
+        cache_hit = cache_key in cache
+    metrics.record_cache("llm", cache_hit)
+    capture.annotate(cache="hit" if cache_hit else "miss")
+    if cache_hit:
+        logger.info(f"Utilisation du cache pour : {cache_key[:50]}...")
+        return GenerateResponse(text=cache[cache_key])
+    return None
+
+async def answer_message(conversation, user_message, detected_language=None, history_length=1):
+    """Réponse au dernier message ; `conversation` est le contexte déjà mis en forme (« role: contenu » par ligne)"""
+    detected_lang = resolve_language(user_message, detected_language)
+    logger.info(f"Langue détectée : {detected_lang} pour le message : {user_message[:50]}...")
+    capture.annotate(lang=detected_lang, history=history_length, chars=len(user_message))
+
+    local = local_answer(conversation, user_message, detected_lang)
+    if local:
+        return local
+
+    cache_key = f"{conversation}_{detected_lang}"
+    model = llm_chain(detected_lang)
+    try:
+        start_time = time.time()
+        # Hors de la boucle asyncio : les autres requêtes continuent pendant l'appel
+        with metrics.time_upstream("groq"), tracing.span("llm"):
+            response = await run_in_threadpool(model.invoke, {"question": conversation})
+        logger.info(f"Temps appel Groq : {time.time() - start_time} secondes")
+        response = finalize_reply(response, detected_lang)
+        cache[cache_key] = response
+        logger.info(f"Réponse générée en {detected_lang} : {response}")
+    except Exception as e:
+        for attempt in range(3):
+            try:
+                start_time = time.time()
+                with metrics.time_upstream("groq"), tracing.span("llm", attempt=attempt + 1):
+                    response = await run_in_threadpool(model.invoke, {"question": conversation})
+                logger.info(f"Temps appel Groq (tentative {attempt + 1}) : {time.time() - start_time} secondes")
+                response = finalize_reply(response, detected_lang)
+                cache[cache_key] = response
+                return GenerateResponse(text=response)
+            except Exception as retry_e:
+                logger.warning(f"Échec appel LLM, tentative {attempt + 1}/3 : {retry_e}")
+                if attempt < 2:
+                    await asyncio.sleep(2)
+                else:
+                    logger.error(f"Erreur lors de l'appel au LLM après 3 tentatives : {retry_e}")
+                    raise HTTPException(status_code=500, detail="Erreur lors de la génération de la réponse par le LLM")
+
+    return GenerateResponse(text=response)
+
+async def stream_reply(conversation, user_message, lang, history_length, on_sentence):
+    """
+    Réponse de /api/turn phrase par phrase : `on_sentence(texte, audioId)` est appelé
+    dès qu'une phrase est complète, pendant que le LLM écrit la suite. Réponses
+    locales et du cache : une seule phrase. Renvoie le texte complet.
+    """
+    capture.annotate(lang=lang, history=history_length, chars=len(user_message))
+    local = local_answer(conversation, user_message, lang)
+    if local:
+        on_sentence(local.text, local.audioId)
+        return local.text
+
+    spoken = []
+    buffer = ""
+    try:
+        start_time = time.time()
+        with metrics.time_upstream("groq"), tracing.span("llm", streamed=True):
+            async for chunk in llm_chain(lang).astream({"question": conversation}):
+                complete, buffer = sentences.split_sentences(buffer + chunk)
+                for sentence in complete:
+                    spoken.append(sentence)
+                    on_sentence(sentence, None)
+        logger.info(f"Temps appel Groq (flux) : {time.time() - start_time} secondes")
+    except Exception as e:
+        if spoken:
+            raise
+        # Rien n'est encore parti : l'appel classique et ses tentatives prennent le relais
+        logger.warning(f"Flux LLM interrompu ({e}), appel sans flux")
+        response = await answer_message(conversation, user_message, lang, history_length)
+        on_sentence(response.text, response.audioId)
+        return response.text
+
+    rest = buffer.strip()
+    if not spoken:
+        # Réponse d'un seul tenant : même traitement que /api/generate (fallback, salutations)
+        rest = finalize_reply(rest, lang)
+    if rest:
+        spoken.append(rest)
+        on_sentence(rest, None)
+    response = " ".join(spoken)
+    cache[f"{conversation}_{lang}"] = response
+    logger.info(f"Réponse générée en {lang} ({len(spoken)} phrase(s)) : {response}")
+    return response
+
+@app.post("/api/sessions")
+async def create_session(request: SessionRequest):
+    """Crée une session, amorcée avec l'historique existant du client s'il y en a un"""
+    session = session_store.create((msg.role, msg.content) for msg in request.history)
+    logger.info(f"Session {session.id} créée ({len(session.lines)} message(s) repris, {len(session_store)} en mémoire)")
+    return {"sessionId": session.id, "ttl": session_store.ttl}
+
+@app.delete("/api/sessions/{session_id}")
+async def delete_session(session_id: str):
+    session_store.delete(session_id)
+    return {"deleted": True}
+
+@app.post("/api/generate/speculate")
+async def speculate_response(request: SpeculateRequest):
+    """
+    Démarre la génération sur une transcription partielle stable ; la requête
+    /api/generate de la transcription finale reprend le résultat via speculationId.
+    """
+    if not SPECULATIVE_LLM:
+        return {"accepted": False}
+    user_message = next((msg.content for msg in reversed(request.history) if msg.role == "user"), "")
+    if not user_message.strip():
+        raise HTTPException(status_code=400, detail="Aucun message utilisateur trouvé")
+    speculator.start(
+        request.speculationId,
+        user_message,
+        generate_response(GenerateRequest(history=request.history, detectedLanguage=request.detectedLanguage))
+    )
+    return {"accepted": True}
+
 @app.post("/api/tts")
 async def generate_tts(request: TTSRequest):
+    result = await synthesize_speech(request.text, request.lang)
+    return {
+        "audioPath": result["audioPath"],
+    }
+
+async def synthesize_speech(text: str, lang: str):
+    """Appelle le service TTS (instance propriétaire du cache) et renvoie sa réponse complète"""
     try:
-        text = request.text
-        lang = request.lang
         if not text.strip():
             raise HTTPException(status_code=400, detail="Le texte ne peut pas être vide")
         if not lang.strip():
             raise HTTPException(status_code=400, detail="La langue ne peut pas être vide")
         
         cache_key = hashlib.md5(f"{text}_{lang}".encode()).hexdigest()
+        capture.annotate(lang=lang, chars=len(text))
         logger.info(f"Proxy TTS : génération audio pour '{text[:50]}...' (lang: {lang}, id: {cache_key})")
         
-        async with httpx.AsyncClient(timeout=180.0) as client:  # Augmenté à 120s
+        async with upstream_client(timeout=180.0) as client:  # Augmenté à 120s
+            failed_urls = set()
             for attempt in range(3):
+                replica = None
                 try:
-                    start_time = time.time()
-                    response = await client.post(
-                        "http://localhost:5000/generate-tts/",
-                        json={"text": text, "lang": lang, "audio_id": cache_key}
-                    )
-                    logger.info(f"Temps requête TTS (tentative {attempt + 1}) : {time.time() - start_time} secondes")
-                    response.raise_for_status()
+                    async with tts_pool.request(exclude=failed_urls, key=cache_key) as replica:
+                        start_time = time.time()
+                        with tracing.span("tts", replica=replica.url, attempt=attempt + 1):
+                            response = await client.post(
+                                f"{replica.url}/generate-tts/",
+                                json={"text": text, "lang": lang, "audio_id": cache_key},
+                                headers=tracing.propagation_headers()
+                            )
+                        tracing.import_server_timing(response.headers.get("server-timing"), "tts.")
+                        logger.info(f"Temps requête TTS {replica.url} (tentative {attempt + 1}) : {time.time() - start_time} secondes")
+                        response.raise_for_status()
                     result = response.json()
                     
                     if not result.get("audioId"):
@@ -216,10 +522,11 @@ async def generate_tts(request: TTSRequest):
                         
                         
                     logger.info(f"Audio généré avec succès : {result['audioId']}")
-                    return {
-                        "audioPath": result["audioPath"],
-                    }
+                    if "cached" in result:
+                        capture.annotate(cache="hit" if result["cached"] else "miss")
+                    return result
                 except httpx.TimeoutException as e:
+                    failed_urls.add(replica.url)
                     logger.error(f"Timeout TTS, tentative {attempt + 1}/3 : {str(e)}")
                     if attempt < 2:
                         await asyncio.sleep(2)
@@ -227,6 +534,7 @@ async def generate_tts(request: TTSRequest):
                         logger.error("Timeout lors de la requête TTS après 3 tentatives")
                         raise HTTPException(status_code=504, detail="Timeout lors de la génération TTS")
                 except httpx.RequestError as e:
+                    failed_urls.add(replica.url)
                     logger.error(f"Erreur requête TTS, tentative {attempt + 1}/3 : {str(e)}")
                     if attempt < 2:
                         await asyncio.sleep(2)
@@ -241,7 +549,95 @@ async def generate_tts(request: TTSRequest):
         raise HTTPException(status_code=500, detail="Erreur interne du serveur")
 
 @app.post("/api/stt")
-async def transcribe_audio(request: STTRequest):
+async def transcribe_audio(request: Request):
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        return await proxy_stt_upload(request, content_type)
+
+    try:
+        stt_request = STTRequest(**await request.json())
+    except Exception:
+        raise HTTPException(status_code=400, detail="Corps attendu : fichier audio multipart ou JSON {audio_id, language}")
+    return await transcribe_audio_file(stt_request)
+
+async def proxy_stt_upload(request: Request, content_type: str):
+    """Transmet l'upload multipart au service STT au fil de l'eau, sans le garder en mémoire"""
+    declared_size = request.headers.get("content-length")
+    if declared_size and declared_size.isdigit() and int(declared_size) > MAX_STT_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="Fichier audio trop volumineux")
+
+    received = 0
+    too_large = False
+
+    async def body():
+        nonlocal received, too_large
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > MAX_STT_UPLOAD_BYTES:
+                too_large = True
+                raise ValueError("Limite de taille d'upload dépassée")
+            yield chunk
+
+    language = request.query_params.get("language")
+    params = {key: value for key, value in request.query_params.items() if key in ("language", "word_timestamps")}
+    logger.info(f"Proxy STT : upload direct (lang: {language})")
+
+    try:
+        # Pas de nouvelle tentative : le corps streamé ne peut pas être rejoué
+        async with upstream_client(timeout=60.0) as client:
+            async with stt_pool.request() as replica:
+                start_time = time.time()
+                with tracing.span("stt", replica=replica.url):
+                    response = await client.post(
+                        f"{replica.url}/transcribe/",
+                        content=body(),
+                        headers={"content-type": content_type, **tracing.propagation_headers()},
+                        params=params or None
+                    )
+                tracing.import_server_timing(response.headers.get("server-timing"), "stt.")
+                logger.info(f"Temps requête STT {replica.url} (upload {received} octets) : {time.time() - start_time} secondes")
+                capture.annotate(lang=language, bytes=received)
+                if response.status_code >= 500:
+                    response.raise_for_status()
+    except httpx.TimeoutException as e:
+        logger.error(f"Timeout STT lors de l'upload : {str(e)}")
+        raise HTTPException(status_code=504, detail="Timeout lors de la transcription STT")
+    except httpx.HTTPStatusError as e:
+        # Erreur 5xx comptée contre l'instance ; son détail est renvoyé plus bas
+        response = e.response
+    except Exception as e:
+        if too_large:
+            logger.warning(f"Upload STT refusé : plus de {MAX_STT_UPLOAD_BYTES} octets")
+            raise HTTPException(status_code=413, detail="Fichier audio trop volumineux")
+        logger.error(f"Erreur requête STT lors de l'upload : {e}")
+        raise HTTPException(status_code=502, detail="Erreur de communication avec le service STT")
+
+    if response.status_code >= 400:
+        try:
+            detail = response.json().get("detail", "Erreur du service STT")
+        except Exception:
+            detail = "Erreur du service STT"
+        raise HTTPException(status_code=response.status_code, detail=detail)
+
+    result = response.json()
+    logger.info(f"Transcription réussie : '{result.get('text', '')[:50]}...'")
+    return stt_response(result)
+
+def stt_response(result):
+    """Réponse /api/stt : texte et indicateurs de fiabilité renvoyés par le service STT"""
+    response = {
+        "text": result["text"],
+        "language": result.get("language", "unknown"),
+        "confidence": result.get("confidence"),
+        "no_speech_prob": result.get("no_speech_prob"),
+        "low_confidence": result.get("low_confidence", False),
+        "dropped_seconds": result.get("dropped_seconds")
+    }
+    if result.get("words") is not None:
+        response["words"] = result["words"]
+    return response
+
+async def transcribe_audio_file(request: STTRequest):
     try:
         audio_id = request.audio_id
         language = request.language
@@ -250,29 +646,33 @@ async def transcribe_audio(request: STTRequest):
             raise HTTPException(status_code=400, detail="audio_id ne peut pas être vide")
         
         logger.info(f"Proxy STT : transcription audio {audio_id} (lang: {language})")
+        capture.annotate(lang=language)
         
-        async with httpx.AsyncClient(timeout=60.0) as client:
+        async with upstream_client(timeout=60.0) as client:
+            failed_urls = set()
             for attempt in range(3):
+                replica = None
                 try:
-                    start_time = time.time()
-                    response = await client.post(
-                        "http://localhost:5002/transcribe-file/",
-                        json={"audio_id": audio_id, "language": language}
-                    )
-                    logger.info(f"Temps requête STT (tentative {attempt + 1}) : {time.time() - start_time} secondes")
-                    response.raise_for_status()
+                    async with stt_pool.request(exclude=failed_urls, key=audio_id) as replica:
+                        start_time = time.time()
+                        with tracing.span("stt", replica=replica.url, attempt=attempt + 1):
+                            response = await client.post(
+                                f"{replica.url}/transcribe-file/",
+                                json={"audio_id": audio_id, "language": language, "word_timestamps": request.word_timestamps},
+                                headers=tracing.propagation_headers()
+                            )
+                        tracing.import_server_timing(response.headers.get("server-timing"), "stt.")
+                        logger.info(f"Temps requête STT {replica.url} (tentative {attempt + 1}) : {time.time() - start_time} secondes")
+                        response.raise_for_status()
                     result = response.json()
                     
                     if not result.get("text"):
                         raise HTTPException(status_code=500, detail="Le service STT n'a pas retourné de texte")
                         
                     logger.info(f"Transcription réussie : '{result['text'][:50]}...'")
-                    return {
-                        "text": result["text"],
-                        "language": result.get("language", "unknown"),
-                        "confidence": result.get("confidence")
-                    }
+                    return stt_response(result)
                 except httpx.TimeoutException as e:
+                    # Même instance au prochain essai : elle termine la transcription déjà commencée
                     logger.error(f"Timeout STT, tentative {attempt + 1}/3 : {str(e)}")
                     if attempt < 2:
                         await asyncio.sleep(2)
@@ -280,6 +680,7 @@ async def transcribe_audio(request: STTRequest):
                         logger.error("Timeout lors de la requête STT après 3 tentatives")
                         raise HTTPException(status_code=504, detail="Timeout lors de la transcription STT")
                 except httpx.RequestError as e:
+                    failed_urls.add(replica.url)
                     logger.error(f"Erreur requête STT, tentative {attempt + 1}/3 : {str(e)}")
                     if attempt < 2:
                         await asyncio.sleep(2)
@@ -293,10 +694,186 @@ async def transcribe_audio(request: STTRequest):
         logger.exception(f"Erreur inattendue dans le proxy STT : {e}")
         raise HTTPException(status_code=500, detail="Erreur interne du serveur")
 
+async def transcribe_upload(content: bytes, filename: str, content_type: str, language: str | None = None):
+    """Transcrit un enregistrement déjà reçu ; le corps étant rejouable, un échec est retenté"""
+    # Clé d'affinité : sha256 du contenu, comme la clé du cache de transcriptions du service STT
+    content_hash = hashlib.sha256(content).hexdigest()
+    async with upstream_client(timeout=60.0) as client:
+        failed_urls = set()
+        for attempt in range(2):
+            replica = None
+            try:
+                async with stt_pool.request(exclude=failed_urls, key=content_hash) as replica:
+                    start_time = time.time()
+                    with tracing.span("stt", replica=replica.url, attempt=attempt + 1):
+                        response = await client.post(
+                            f"{replica.url}/transcribe/",
+                            files={"file": (filename, content, content_type)},
+                            params={"language": language} if language else None,
+                            headers=tracing.propagation_headers()
+                        )
+                    tracing.import_server_timing(response.headers.get("server-timing"), "stt.")
+                    logger.info(f"Temps requête STT {replica.url} ({len(content)} octets, tentative {attempt + 1}) : {time.time() - start_time} secondes")
+                    if response.status_code >= 500:
+                        response.raise_for_status()
+            except (httpx.RequestError, httpx.HTTPStatusError) as e:
+                # Après un timeout, même instance : la transcription y est encore en cours
+                if replica and not isinstance(e, httpx.TimeoutException):
+                    failed_urls.add(replica.url)
+                logger.error(f"Erreur requête STT, tentative {attempt + 1}/2 : {e}")
+                if attempt == 0:
+                    continue
+                raise HTTPException(status_code=502, detail="Erreur de communication avec le service STT")
+
+            if response.status_code >= 400:
+                try:
+                    detail = response.json().get("detail", "Erreur du service STT")
+                except Exception:
+                    detail = "Erreur du service STT"
+                raise HTTPException(status_code=response.status_code, detail=detail)
+            return stt_response(response.json())
+
+async def read_turn_request(request: Request):
+    """Entrée de /api/turn : (texte, audio, historique, langue) ; audio = (contenu, nom, type) ou None"""
+    content_type = request.headers.get("content-type", "")
+    if not content_type.startswith("multipart/form-data"):
+        try:
+            turn = TurnRequest(**await request.json())
+        except Exception:
+            raise HTTPException(status_code=400, detail="Corps attendu : fichier audio multipart ou JSON {text, history}")
+        if not turn.text.strip():
+            raise HTTPException(status_code=400, detail="Le texte ne peut pas être vide")
+        return turn.text, None, turn.history, turn.detectedLanguage
+
+    declared_size = request.headers.get("content-length")
+    if declared_size and declared_size.isdigit() and int(declared_size) > MAX_STT_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="Fichier audio trop volumineux")
+    form = await request.form()
+    upload = form.get("file")
+    if upload is None or isinstance(upload, str):
+        raise HTTPException(status_code=400, detail="Fichier audio requis (champ file)")
+    content = await upload.read()
+    if len(content) > MAX_STT_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="Fichier audio trop volumineux")
+    try:
+        history = [Message(**msg) for msg in json.loads(form.get("history") or "[]")]
+    except Exception:
+        raise HTTPException(status_code=400, detail="Champ history invalide (liste JSON de {role, content})")
+    # Le frontend envoie la locale (ex. "fr-fr") dans le champ "lang"
+    language = form.get("language") or form.get("lang")
+    language = language.split("-")[0].lower() if language else None
+    audio = (content, upload.filename or "audio.webm", upload.content_type or "audio/webm")
+    return None, audio, history, language
+
+@app.post("/api/turn")
+async def conversational_turn(request: Request):
+    """
+    Tour de conversation complet en un appel : audio (multipart, champ file,
+    avec history en JSON) ou texte (JSON {text, history}) -> STT -> langue ->
+    LLM -> TTS. La réponse est un flux NDJSON : "transcript", puis un "audio"
+    par phrase, puis "reply" (texte complet) et "done" avec les durées, ou
+    "error". Le LLM est lu en flux et chaque phrase est synthétisée dès qu'elle
+    est complète : la première phrase est audible pendant que la suite s'écrit.
+    """
+    text, audio, history, language = await read_turn_request(request)
+
+    async def events():
+        start = time.perf_counter()
+        timings = {}
+        stage_start = start
+        stage = "stt" if audio else "llm"
+
+        def lap(name):
+            nonlocal stage_start
+            now = time.perf_counter()
+            timings[name] = round((now - stage_start) * 1000, 1)
+            stage_start = now
+
+        producer = None
+        pending = asyncio.Queue()
+        try:
+            user_text, lang = text, language
+            if audio:
+                transcript = await transcribe_upload(*audio, language=language)
+                lap("stt")
+                yield ndjson.line({"type": "transcript", **transcript})
+                # Bruit ou silence transcrit : pas de réponse
+                if not transcript["text"].strip() or transcript.get("low_confidence"):
+                    yield ndjson.line({"type": "done", "skipped": "low_confidence", "timings_ms": timings})
+                    return
+                user_text = transcript["text"]
+                lang = transcript.get("language") if transcript.get("language") in ("fr", "en", "ar") else None
+
+            stage = "llm"
+            lang = resolve_language(user_text, lang)
+            recent_history = [*history, Message(role="user", content=user_text)][-5:]
+            conversation = "\n".join(f"{msg.role}: {msg.content}" for msg in recent_history)
+
+            def on_sentence(sentence, audio_id):
+                if audio_id:
+                    # Réponse locale : audio déjà synthétisé au démarrage
+                    synthesis = asyncio.get_running_loop().create_future()
+                    synthesis.set_result({"audioId": audio_id})
+                else:
+                    synthesis = asyncio.create_task(synthesize_speech(sentence, lang))
+                pending.put_nowait((sentence, synthesis))
+
+            async def produce():
+                try:
+                    reply_text = await stream_reply(conversation, user_text, lang, len(history) + 1, on_sentence)
+                    timings["llm"] = round((time.perf_counter() - stage_start) * 1000, 1)
+                    return reply_text
+                finally:
+                    pending.put_nowait(None)
+
+            producer = asyncio.create_task(produce())
+            index = 0
+            while (item := await pending.get()) is not None:
+                sentence, synthesis = item
+                stage = "tts"
+                result = await synthesis
+                if index == 0:
+                    timings["first_audio"] = round((time.perf_counter() - stage_start) * 1000, 1)
+                yield ndjson.line({
+                    "type": "audio",
+                    "index": index,
+                    "text": sentence,
+                    "audioId": result["audioId"],
+                    "audioPath": f"/audios/{result['audioId']}.mp3",
+                    # Repères de synchronisation labiale si le service TTS en fournit
+                    "mouthCues": result.get("mouthCues"),
+                })
+                index += 1
+                stage = "llm"
+            reply_text = await producer
+            yield ndjson.line({"type": "reply", "text": reply_text, "language": lang, "sentences": index})
+            timings["total"] = round((time.perf_counter() - start) * 1000, 1)
+            yield ndjson.line({"type": "done", "timings_ms": timings})
+        except HTTPException as e:
+            yield ndjson.line({"type": "error", "stage": stage, "status": e.status_code, "detail": e.detail})
+        except Exception as e:
+            logger.exception(f"Erreur inattendue dans /api/turn ({stage}) : {e}")
+            yield ndjson.line({"type": "error", "stage": stage, "status": 500, "detail": "Erreur interne du serveur"})
+        finally:
+            # Client parti ou erreur : génération et synthèses restantes abandonnées
+            if producer and not producer.done():
+                producer.cancel()
+            while not pending.empty():
+                item = pending.get_nowait()
+                if item is not None:
+                    item[1].cancel()
+
+    return ndjson.response(events())
+
+@app.get("/api/upstreams")
+async def upstreams():
+    """Charge, latence EWMA et exclusions de chaque instance TTS/STT"""
+    return {"tts": tts_pool.snapshot(), "stt": stt_pool.snapshot()}
+
 @app.get("/health")
 async def health_check():
     try:
-        if not GROQ_API_KEY:
+        if not GROQ_API_KEY and not LLM_STUB:
             return {"status": "error", "message": "GROQ_API_KEY non configurée"}
             
         try:
@@ -312,7 +889,8 @@ async def health_check():
                 "status": "healthy",
                 "service": "Avatar Backend API",
                 "version": "1.0.0",
-                "llm": "Groq - Llama-4-Scout",
+                "llm": "stub" if LLM_STUB else "Groq - Llama-4-Scout",
+                "warmup": warmup_progress.snapshot() if warmup_progress else None,
                 "timestamp": datetime.utcnow().isoformat() + "Z"
             }
         except Exception as e:
@@ -322,5 +900,10 @@ async def health_check():
         return {"status": "error", "message": f"Erreur interne : {str(e)}"}
 
 if __name__ == "__main__":
-    import uvicorn # type: ignore
-    uvicorn.run(app, host="0.0.0.0", port=5001)
\ No newline at end of file
+    import serving
+    # PORT est fourni par start_service.py pour les instances supplémentaires
+    if service_apps:
+        # Un seul serveur sur les ports de l'API principale, du TTS et du STT
+        serving.run(monolith.PortDispatcher(app, service_apps), 5001, extra_ports=list(monolith.SERVICE_PORTS.values()))
+    else:
+        serving.run(app, 5001)
\ No newline at end of file
@@ -0,0 +1,91 @@
+"""
+Mode monolithe : API principale, TTS et STT dans un seul processus.
+
+Pour les petites machines, HOLOKIA_MONOLITH=1 (ou start_service.py --monolith)
+évite trois runtimes Python et trois piles FastAPI. Le processus écoute sur
+les trois ports habituels et chaque port sert son application : l'API HTTP vue
+du navigateur ne change pas. Les appels de l'API principale vers le TTS et le
+STT passent par un transport ASGI httpx, sans connexion réseau, si bien que la
+répartition (upstream_pool.py), les retries et le traçage restent les mêmes.
+"""
+
+import logging
+import os
+
+import httpx # type: ignore
+
+import readiness
+
+logger = logging.getLogger("avatar-backend")
+
+MONOLITH_ENV = "HOLOKIA_MONOLITH"
+
+# Ports sur lesquels le processus sert aussi le TTS et le STT
+SERVICE_PORTS = {
+    "tts": int(os.getenv("TTS_PORT", 5000)),
+    "stt": int(os.getenv("STT_PORT", 5002)),
+}
+
+
+def enabled():
+    return os.getenv(MONOLITH_ENV, "0") == "1"
+
+
+def load_service_apps():
+    """Importe les services TTS et STT (chargement de Whisper compris) ; service -> application"""
+    import tts_server
+    import stt_server
+
+    # Le fichier de disponibilité n'est écrit qu'une fois l'API principale prête
+    readiness.silence("tts", "stt")
+    logger.info("Mode monolithe : TTS et STT chargés dans le processus de l'API principale")
+    return {"tts": tts_server.app, "stt": stt_server.app}
+
+
+def in_process_transports(registry, service_apps):
+    """URL d'instance -> transport ASGI vers l'application du service, dans ce processus"""
+    transports = {}
+    for service, service_app in service_apps.items():
+        # Une exception non gérée devient une réponse 500, comme à travers le réseau
+        transport = httpx.ASGITransport(app=service_app, raise_app_exceptions=False)
+        for url in registry.instances(service):
+            transports[url] = transport
+    return transports
+
+
+class PortDispatcher:
+    """Application ASGI servant chaque service sur son port, l'API principale sur les autres"""
+
+    def __init__(self, main_app, service_apps, ports=None):
+        ports = ports or SERVICE_PORTS
+        self.main_app = main_app
+        self.service_apps = service_apps
+        self.apps_by_port = {ports[service]: service_app for service, service_app in service_apps.items()}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+            return
+        server = scope.get("server")
+        target = self.apps_by_port.get(server[1]) if server else None
+        await (target or self.main_app)(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        """Démarre les services avant l'API principale, qui peut les appeler dès son démarrage"""
+        apps = [*self.service_apps.values(), self.main_app]
+        await receive()
+        try:
+            for app in apps:
+                await app.router.startup()
+        except Exception as e:
+            logger.exception(f"Échec du démarrage en mode monolithe : {e}")
+            await send({"type": "lifespan.startup.failed", "message": str(e)})
+            return
+        await send({"type": "lifespan.startup.complete"})
+        await receive()
+        for app in reversed(apps):
+            try:
+                await app.router.shutdown()
+            except Exception as e:
+                logger.warning(f"Erreur à l'arrêt en mode monolithe : {e}")
+        await send({"type": "lifespan.shutdown.complete"})
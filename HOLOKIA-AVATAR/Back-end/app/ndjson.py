@@ -0,0 +1,87 @@
+"""
+Réponses en flux NDJSON (une ligne JSON par événement), partagées par
+/api/turn et les endpoints de lot des services TTS et STT.
+
+GZip retient le corps jusqu'à la fin de la réponse : les chemins en flux
+passent par `SelectiveGZipMiddleware` sans compression.
+"""
+
+import asyncio
+import json
+import time
+
+from fastapi import HTTPException # type: ignore
+from fastapi.middleware.gzip import GZipMiddleware # type: ignore
+from fastapi.responses import StreamingResponse # type: ignore
+
+MEDIA_TYPE = "application/x-ndjson"
+
+
+class SelectiveGZipMiddleware(GZipMiddleware):
+    """GZip, sauf pour les réponses en flux NDJSON que la compression retiendrait jusqu'à la fin"""
+
+    def __init__(self, app, minimum_size=500, excluded_paths=()):
+        super().__init__(app, minimum_size=minimum_size)
+        self.excluded_paths = set(excluded_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] in self.excluded_paths:
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+
+def line(event):
+    return json.dumps(event, ensure_ascii=False) + "\n"
+
+
+def response(events):
+    return StreamingResponse(events, media_type=MEDIA_TYPE)
+
+
+def group_duplicates(items, key):
+    """[(premier élément, [index de tous les éléments identiques])], dans l'ordre d'apparition"""
+    groups = {}
+    for index, item in enumerate(items):
+        groups.setdefault(key(item), (item, []))[1].append(index)
+    return list(groups.values())
+
+
+async def run_batch(groups, handler):
+    """
+    Exécute `handler(élément)` une fois par groupe et produit une ligne par
+    élément du lot dans l'ordre de complétion : "result" ou "error" avec son
+    index, puis "done". Le parallélisme est borné par `handler`.
+    """
+    start = time.perf_counter()
+
+    async def run(item, indexes):
+        try:
+            return indexes, await handler(item), None
+        except HTTPException as e:
+            return indexes, None, {"status": e.status_code, "detail": e.detail}
+        except Exception as e:
+            return indexes, None, {"status": 500, "detail": str(e)}
+
+    tasks = [asyncio.create_task(run(item, indexes)) for item, indexes in groups]
+    errors = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            indexes, result, error = await next_done
+            for index in indexes:
+                if error:
+                    errors += 1
+                    yield line({"type": "error", "index": index, **error})
+                else:
+                    yield line({"type": "result", "index": index, **result})
+        yield line({
+            "type": "done",
+            "items": sum(len(indexes) for _, indexes in groups),
+            "unique": len(groups),
+            "errors": errors,
+            "seconds": round(time.perf_counter() - start, 3),
+        })
+    finally:
+        # Client déconnecté : inutile de poursuivre le lot
+        for task in tasks:
+            task.cancel()
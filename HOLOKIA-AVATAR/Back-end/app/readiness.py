@@ -0,0 +1,38 @@
+"""
+Signal de disponibilité des services pour start_service.py.
+
+Quand start_service.py lance un service, il lui passe dans SERVICE_READY_FILE
+le chemin d'un fichier à créer une fois le service prêt (modèles chargés,
+préchauffage terminé). Lancé à la main, le service n'écrit rien.
+"""
+
+import logging
+import os
+import time
+
+logger = logging.getLogger("readiness")
+
+READY_FILE_ENV = "SERVICE_READY_FILE"
+
+# Services montés dans un autre (mode monolithe) : seul le service hôte signale le processus prêt
+_silenced = set()
+
+
+def silence(*services):
+    _silenced.update(services)
+
+
+def notify_ready(**details):
+    """Crée le fichier de disponibilité (écriture atomique)"""
+    path = os.getenv(READY_FILE_ENV)
+    if not path or details.get("service") in _silenced:
+        return
+    try:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(f"{os.getpid()} {time.time()}")
+            for key, value in details.items():
+                f.write(f" {key}={value}")
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Impossible d'écrire le fichier de disponibilité {path} : {e}")
@@ -0,0 +1,27 @@
+"""
+Découpage en phrases du texte produit au fil de l'eau par le LLM.
+
+/api/turn synthétise chaque phrase dès qu'elle est complète, pendant que le
+LLM continue d'écrire la suite. Une phrase n'est coupée qu'après une
+ponctuation finale suivie d'un espace, et seulement si elle fait au moins
+`min_chars` caractères : les phrases très courtes (« Bonjour ! ») partent avec
+la suivante plutôt que dans un appel TTS à part.
+"""
+
+import re
+
+# Ponctuation finale (arabe comprise), guillemets ou parenthèses fermants, puis espace
+_SENTENCE_END = re.compile(r"[.!?؟…]+[\"'»)\]]*\s+")
+
+MIN_SENTENCE_CHARS = 20
+
+
+def split_sentences(text, min_chars=MIN_SENTENCE_CHARS):
+    """Renvoie (phrases complètes, reste encore incomplet) ; le reste garde ses espaces"""
+    sentences = []
+    start = 0
+    for match in _SENTENCE_END.finditer(text):
+        if len(text[start:match.end()].strip()) >= min_chars:
+            sentences.append(text[start:match.end()].strip())
+            start = match.end()
+    return sentences, text[start:]
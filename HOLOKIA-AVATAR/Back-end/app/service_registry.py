@@ -0,0 +1,102 @@
+"""
+Liste des instances vivantes des services TTS/STT, vue depuis l'API principale.
+
+start_service.py (mode superviseur) tient à jour un fichier JSON dont le chemin
+est passé dans HOLOKIA_INSTANCES_FILE. Sans ce fichier, la liste vient de
+TTS_REPLICAS / STT_REPLICAS (URLs séparées par des virgules), ou à défaut d'une
+seule instance à l'adresse habituelle. Une instance peut aussi déclarer un
+socket Unix (champ "uds" du fichier, ou TTS_UDS / STT_UDS dans l'ordre des
+URLs) : l'API principale l'utilise alors à la place du port TCP.
+"""
+
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger("avatar-backend")
+
+INSTANCES_FILE_ENV = "HOLOKIA_INSTANCES_FILE"
+
+DEFAULT_INSTANCES = {
+    "tts": ["http://localhost:5000"],
+    "stt": ["http://localhost:5002"],
+}
+
+
+def _split(value):
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def configured_instances():
+    """Instances par défaut, éventuellement remplacées par TTS_REPLICAS / STT_REPLICAS"""
+    instances = {}
+    for service, urls in DEFAULT_INSTANCES.items():
+        configured = os.getenv(f"{service.upper()}_REPLICAS", "")
+        instances[service] = [url.rstrip("/") for url in _split(configured)] or urls
+    return instances
+
+
+def configured_sockets(instances):
+    """URL -> socket Unix d'après TTS_UDS / STT_UDS (un chemin par URL, dans le même ordre)"""
+    sockets = {}
+    for service, urls in instances.items():
+        sockets.update(zip(urls, _split(os.getenv(f"{service.upper()}_UDS", ""))))
+    return sockets
+
+# Délai minimal entre deux vérifications du fichier
+_RELOAD_INTERVAL = 1.0
+
+
+class ServiceRegistry:
+    """Relit le fichier d'instances quand il change ; le choix de l'instance revient à UpstreamPool"""
+
+    def __init__(self, path=None, defaults=None):
+        self.path = path if path is not None else os.getenv(INSTANCES_FILE_ENV)
+        self.defaults = defaults or configured_instances()
+        self._instances = dict(self.defaults)
+        self._sockets = configured_sockets(self.defaults)
+        self._mtime = None
+        self._checked_at = 0.0
+
+    def instances(self, service):
+        self._maybe_reload()
+        return self._instances.get(service) or self.defaults.get(service, [])
+
+    def sockets(self):
+        """URL -> chemin du socket Unix, pour les instances qui en déclarent un"""
+        self._maybe_reload()
+        return self._sockets
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if not self.path or now - self._checked_at < _RELOAD_INTERVAL:
+            return
+        self._checked_at = now
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.warning(f"Fichier d'instances illisible {self.path} : {e}")
+            return
+        self._mtime = mtime
+        instances = {
+            service: [instance["url"] for instance in entries]
+            for service, entries in data.get("services", {}).items()
+        }
+        # Un service sans instance vivante garde sa dernière liste connue
+        self._instances.update({service: urls for service, urls in instances.items() if urls})
+        self._sockets = {
+            **configured_sockets(self.defaults),
+            **{
+                instance["url"]: instance["uds"]
+                for entries in data.get("services", {}).values() for instance in entries if instance.get("uds")
+            },
+        }
+        logger.info(f"Instances des services mises à jour : {self._instances}")
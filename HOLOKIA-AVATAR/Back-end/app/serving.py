@@ -0,0 +1,249 @@
+"""
+Lancement uvicorn commun aux services.
+
+Le service écoute sur le port TCP habituel (PORT), utilisé par le navigateur
+et les vérifications de santé. Si SERVICE_UDS est défini (start_service.py
+--uds), il écoute en plus sur ce socket Unix : l'API principale, sur la même
+machine, y envoie ses appels sans passer par la pile TCP de loopback. En mode
+monolithe (monolith.py), le même serveur écoute aussi sur les ports TTS et STT.
+
+Avec `workers` > 1 (mode pré-fork), le processus maître, qui a déjà chargé les
+modèles à l'import du service, ouvre les sockets puis se duplique avec
+os.fork() : les workers héritent des poids en copie à l'écriture au lieu de les
+recharger chacun. gc.freeze() avant le fork évite que le ramasse-miettes des
+workers ne réécrive les pages des objets du maître. Le maître relance les
+workers arrêtés et journalise leur temps de démarrage et leur mémoire.
+
+Le noyau confie chaque connexion acceptée à un worker quelconque : l'état
+propre à un processus (cache STT des transcriptions en cours, file de lots
+Whisper) n'est pas partagé entre workers. L'affinité par hachage de l'API
+principale désigne une instance, pas un worker de cette instance.
+"""
+
+import gc
+import logging
+import os
+import select
+import signal
+import socket
+import time
+
+import readiness
+
+logger = logging.getLogger("serving")
+
+UDS_ENV = "SERVICE_UDS"
+
+# Attente maximale du démarrage d'un worker (lifespan terminé)
+WORKER_STARTUP_TIMEOUT = 120.0
+# Délai minimal entre le lancement d'un worker et sa relance, pour ne pas boucler sur un crash
+WORKER_RESPAWN_DELAY = 1.0
+
+
+def bind_tcp(host, port):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    return sock
+
+
+def bind_unix(path):
+    # Socket resté d'une exécution précédente interrompue
+    if os.path.exists(path):
+        os.unlink(path)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(path)
+    os.chmod(path, 0o660)
+    return sock
+
+
+def run(app, default_port, host="0.0.0.0", extra_ports=(), workers=1, after_fork=None):
+    import uvicorn # type: ignore
+
+    port = int(os.getenv("PORT", default_port))
+    uds = os.getenv(UDS_ENV)
+    if uds and not hasattr(socket, "AF_UNIX"):
+        logger.warning(f"Sockets Unix non disponibles sur cette plateforme, {UDS_ENV} ignoré")
+        uds = None
+    if workers > 1 and not hasattr(os, "fork"):
+        logger.warning("os.fork() non disponible sur cette plateforme, un seul worker")
+        workers = 1
+    if not uds and not extra_ports and workers == 1:
+        uvicorn.run(app, host=host, port=port)
+        return
+
+    ports = [port, *extra_ports]
+    sockets = [bind_tcp(host, p) for p in ports]
+    if uds:
+        sockets.append(bind_unix(uds))
+    logger.info(f"Écoute sur {host} ports {ports}" + (f" et sur le socket Unix {uds}" if uds else ""))
+    try:
+        if workers > 1:
+            PreforkMaster(app, host, port, sockets, workers, after_fork).run()
+        else:
+            uvicorn.Server(uvicorn.Config(app, host=host, port=port)).run(sockets=sockets)
+    finally:
+        for sock in sockets:
+            sock.close()
+        if uds and os.path.exists(uds):
+            os.unlink(uds)
+
+
+class StartupNotifier:
+    """Middleware ASGI : écrit un octet dans un tube quand le lifespan du worker est terminé"""
+
+    def __init__(self, app, fd):
+        self.app = app
+        self.fd = fd
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "lifespan":
+            await self.app(scope, receive, send)
+            return
+
+        async def notify(message):
+            await send(message)
+            if message["type"] == "lifespan.startup.complete" and self.fd is not None:
+                os.write(self.fd, b"1")
+                os.close(self.fd)
+                self.fd = None
+
+        await self.app(scope, receive, notify)
+
+
+def process_memory(pid):
+    """RSS, USS et PSS (Mo) d'un processus ; USS/PSS absents si la plateforme ne les fournit pas"""
+    try:
+        import psutil # type: ignore
+    except ImportError:
+        return {}
+    try:
+        process = psutil.Process(pid)
+        try:
+            info = process.memory_full_info()
+        except psutil.AccessDenied:
+            info = process.memory_info()
+    except psutil.Error:
+        return {}
+    return {key: round(getattr(info, key) / 1024 / 1024, 1) for key in ("rss", "uss", "pss") if hasattr(info, key)}
+
+
+class PreforkMaster:
+    """Processus maître du mode pré-fork : lance, surveille et arrête les workers"""
+
+    def __init__(self, app, host, port, sockets, workers, after_fork=None):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.sockets = sockets
+        self.workers = workers
+        self.after_fork = after_fork
+        self.children = {}  # pid -> (numéro du worker, instant du fork)
+        self.stopping = False
+
+    def run(self):
+        # Objets du maître (modèles compris) exclus du ramasse-miettes : leurs pages restent partagées
+        gc.collect()
+        gc.freeze()
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+        pipes = dict(self.spawn(index) for index in range(self.workers))
+        started = self.wait_started(pipes)
+        self.report(started, self.workers)
+        if self.stopping:
+            self.supervise()
+            return
+        if len(started) < self.workers:
+            # Le maître tient déjà le socket d'écoute : sans cet arrêt, le port semblerait ouvert
+            # alors qu'aucun worker n'accepte les connexions
+            logger.error(f"{self.workers - len(started)} worker(s) non démarré(s) sur {self.workers} : arrêt du service")
+            self.stop(None, None)
+            self.supervise()
+            raise SystemExit(1)
+        # Les workers ne signalent rien eux-mêmes : le service est prêt quand tous ont démarré
+        readiness.notify_ready(workers=len(started))
+        self.supervise()
+
+    def spawn(self, index):
+        """Fork d'un worker ; renvoie (descripteur du tube de démarrage, pid)"""
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            self.run_worker(index, write_fd)
+        os.close(write_fd)
+        self.children[pid] = (index, time.perf_counter())
+        return read_fd, pid
+
+    def run_worker(self, index, ready_fd):
+        import uvicorn # type: ignore
+
+        code = 0
+        try:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            os.environ.pop(readiness.READY_FILE_ENV, None)
+            if self.after_fork:
+                self.after_fork()
+            config = uvicorn.Config(StartupNotifier(self.app, ready_fd), host=self.host, port=self.port)
+            uvicorn.Server(config).run(sockets=self.sockets)
+        except BaseException as e:
+            logger.exception(f"Worker {index} (PID {os.getpid()}) arrêté sur erreur : {e}")
+            code = 1
+        finally:
+            os._exit(code)
+
+    def wait_started(self, pipes):
+        """Attend le signal de démarrage des workers {fd: pid} ; renvoie pid -> temps de démarrage (s)"""
+        started = {}
+        deadline = time.monotonic() + WORKER_STARTUP_TIMEOUT
+        while pipes and not self.stopping and time.monotonic() < deadline:
+            try:
+                readable, _, _ = select.select(list(pipes), [], [], 1.0)
+            except InterruptedError:
+                continue
+            for fd in readable:
+                pid = pipes.pop(fd)
+                # Octet de démarrage, ou fin de fichier si le worker est mort avant
+                if os.read(fd, 1) and pid in self.children:
+                    started[pid] = time.perf_counter() - self.children[pid][1]
+                os.close(fd)
+        for fd, pid in pipes.items():
+            if not self.stopping:
+                logger.warning(f"Worker PID {pid} non démarré après {WORKER_STARTUP_TIMEOUT:.0f}s")
+            os.close(fd)
+        return started
+
+    def report(self, started, expected):
+        logger.info(f"Maître PID {os.getpid()} : mémoire {process_memory(os.getpid())} Mo")
+        for pid, elapsed in started.items():
+            index = self.children[pid][0] if pid in self.children else "?"
+            logger.info(f"Worker {index} PID {pid} démarré en {elapsed * 1000:.0f} ms, mémoire {process_memory(pid)} Mo")
+        logger.info(f"{len(started)}/{expected} worker(s) démarrés (USS : pages propres, PSS : part des pages partagées)")
+
+    def supervise(self):
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            if pid not in self.children:
+                continue
+            index, forked_at = self.children.pop(pid)
+            if self.stopping:
+                continue
+            logger.warning(f"Worker {index} (PID {pid}) arrêté (statut {status}), relance")
+            time.sleep(max(0.0, WORKER_RESPAWN_DELAY - (time.perf_counter() - forked_at)))
+            if not self.stopping:
+                self.report(self.wait_started(dict([self.spawn(index)])), 1)
+
+    def stop(self, signum, frame):
+        if self.stopping:
+            return
+        self.stopping = True
+        logger.info(f"Arrêt des {len(self.children)} worker(s)")
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
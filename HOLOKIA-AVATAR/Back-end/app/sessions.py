@@ -0,0 +1,176 @@
+"""
+Sessions de conversation côté serveur pour /api/generate.
+
+Le client crée une session (POST /api/sessions) puis n'envoie plus que
+`sessionId` et le nouveau message. La session garde les dernières lignes déjà
+mises en forme (« role: contenu ») et le contexte qu'elles forment, mis à jour
+à chaque tour : le prompt d'un tour est ce contexte plus une ligne. Les
+sessions vivent en mémoire (nombre borné, expiration après inactivité) ; avec
+un dossier de débordement, les sessions évincées de la mémoire y sont écrites
+et rechargées au besoin.
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
+logger = logging.getLogger("avatar-backend")
+
+# Le prompt reprend les 5 derniers messages, dont le nouveau
+CONTEXT_LINES = 4
+# Nettoyage des sessions expirées toutes les N créations
+PURGE_EVERY = 100
+
+_SESSION_ID = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+
+
+def valid_session_id(session_id):
+    return bool(session_id and _SESSION_ID.match(session_id))
+
+
+class Session:
+    def __init__(self, session_id, lines=(), turns=0, updated=None):
+        self.id = session_id
+        self.lines = deque(lines, maxlen=CONTEXT_LINES)
+        self.turns = turns
+        self.updated = updated or time.time()
+        self.context = "\n".join(self.lines)
+
+    def add(self, role, content):
+        self.lines.append(f"{role}: {content}")
+        self.context = "\n".join(self.lines)
+        self.updated = time.time()
+
+    def conversation(self, message):
+        """Contexte du prompt pour un nouveau message de l'utilisateur"""
+        line = f"user: {message}"
+        return f"{self.context}\n{line}" if self.context else line
+
+    def record_turn(self, message, reply):
+        self.add("user", message)
+        self.add("assistant", reply)
+        self.turns += 1
+
+    def to_dict(self):
+        return {"id": self.id, "lines": list(self.lines), "turns": self.turns, "updated": self.updated}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["id"], data.get("lines", []), data.get("turns", 0), data.get("updated"))
+
+
+class SessionStore:
+    """Sessions les plus récentes en mémoire (LRU), expirées après `ttl` secondes d'inactivité"""
+
+    def __init__(self, max_sessions=1000, ttl=1800.0, spill_dir=None):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.spill_dir = spill_dir
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._created = 0
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    def create(self, history=()):
+        """Nouvelle session, éventuellement amorcée avec un historique [(role, contenu)]"""
+        session = Session(uuid.uuid4().hex)
+        for role, content in history:
+            session.add(role, content)
+        self.save(session)
+        self._created += 1
+        if self._created % PURGE_EVERY == 0:
+            self.purge_expired()
+        return session
+
+    def get(self, session_id):
+        """Session active, rechargée du disque si elle y a été évincée ; None si inconnue ou expirée"""
+        if not valid_session_id(session_id):
+            return None
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._sessions.move_to_end(session_id)
+        if session is None:
+            session = self._load(session_id)
+            if session is None:
+                return None
+            self.save(session)
+        if time.time() - session.updated > self.ttl:
+            self.delete(session_id)
+            return None
+        return session
+
+    def delete(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+        path = self._path(session_id)
+        if path and os.path.exists(path):
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+    def purge_expired(self):
+        deadline = time.time() - self.ttl
+        with self._lock:
+            expired = [session_id for session_id, session in self._sessions.items() if session.updated < deadline]
+            for session_id in expired:
+                del self._sessions[session_id]
+        if not self.spill_dir:
+            return
+        for name in os.listdir(self.spill_dir):
+            path = os.path.join(self.spill_dir, name)
+            try:
+                if name.endswith(".json") and os.path.getmtime(path) < deadline:
+                    os.unlink(path)
+            except OSError:
+                pass
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def save(self, session):
+        """Enregistre la session en tête de LRU (après un tour, elle a pu être évincée pendant l'appel LLM)"""
+        evicted = []
+        with self._lock:
+            self._sessions[session.id] = session
+            self._sessions.move_to_end(session.id)
+            while len(self._sessions) > self.max_sessions:
+                evicted.append(self._sessions.popitem(last=False)[1])
+        for old in evicted:
+            if time.time() - old.updated <= self.ttl:
+                self._spill(old)
+
+    def _path(self, session_id):
+        return os.path.join(self.spill_dir, f"{session_id}.json") if self.spill_dir else None
+
+    def _spill(self, session):
+        if not self.spill_dir:
+            return
+        path = self._path(session.id)
+        try:
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(session.to_dict(), f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Impossible d'écrire la session {session.id} sur disque : {e}")
+
+    def _load(self, session_id):
+        path = self._path(session_id)
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                session = Session.from_dict(json.load(f))
+            os.unlink(path)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Session {session_id} illisible sur disque : {e}")
+            return None
+        return session
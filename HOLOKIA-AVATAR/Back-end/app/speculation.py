@@ -0,0 +1,117 @@
+"""
+Démarrage spéculatif du LLM sur les transcriptions partielles (SPECULATIVE_LLM=1).
+
+Le flux STT (/ws/transcribe?forward=true) envoie la transcription partielle
+stable d'un énoncé, décodée dès le début du silence final, à
+POST /api/generate/speculate : la génération démarre pendant que Whisper
+produit la transcription finale. Quand /api/generate reçoit ensuite la finale
+avec le même speculationId, le résultat spéculatif est gardé si les deux
+textes normalisés sont assez proches, sinon il est annulé et la génération
+relancée sur le texte final.
+"""
+
+import asyncio
+import difflib
+import logging
+import re
+import time
+import unicodedata
+
+import metrics
+
+logger = logging.getLogger("avatar-backend")
+
+SPECULATIONS = metrics.counter(
+    "holokia_llm_speculations_total",
+    "Générations LLM spéculatives par issue (kept, discarded, failed, missed, expired)",
+    labels=("outcome",),
+)
+SPECULATION_SAVED_SECONDS = metrics.histogram(
+    "holokia_llm_speculation_saved_seconds", "Latence LLM économisée par les générations spéculatives gardées",
+)
+
+
+def normalize_transcript(text):
+    """Minuscules, sans ponctuation, voyelles arabes ni espaces multiples (Whisper varie surtout sur ces points)"""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = "".join(char for char in text if unicodedata.category(char) != "Mn")
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+def transcripts_match(partial, final, tolerance):
+    partial, final = normalize_transcript(partial), normalize_transcript(final)
+    if partial == final:
+        return True
+    return difflib.SequenceMatcher(None, partial, final).ratio() >= tolerance
+
+
+class Speculation:
+    def __init__(self, text, task):
+        self.text = text
+        self.task = task
+        self.started = time.perf_counter()
+        self.finished = None
+        task.add_done_callback(self._done)
+
+    def _done(self, task):
+        self.finished = time.perf_counter()
+        # Une spéculation abandonnée qui échoue ne doit pas laisser d'exception non lue
+        if not task.cancelled():
+            task.exception()
+
+
+class Speculator:
+    """Générations spéculatives en cours, par speculationId"""
+
+    def __init__(self, tolerance=0.9, ttl=60.0):
+        self.tolerance = tolerance
+        self.ttl = ttl
+        self._pending = {}
+
+    def start(self, speculation_id, text, generation):
+        """Lance `generation` (coroutine) ; remplace une spéculation précédente du même énoncé"""
+        self._expire()
+        previous = self._pending.pop(speculation_id, None)
+        if previous:
+            self._cancel(previous, "discarded")
+        self._pending[speculation_id] = Speculation(text, asyncio.create_task(generation))
+        logger.info(f"Génération spéculative {speculation_id} démarrée sur : {text[:50]}...")
+
+    async def resolve(self, speculation_id, final_text):
+        """Résultat spéculatif si la transcription finale correspond, sinon None"""
+        speculation = self._pending.pop(speculation_id, None)
+        if speculation is None:
+            # Finale arrivée avant la spéculation, ou spéculation expirée
+            SPECULATIONS.labels("missed").inc()
+            return None
+        if not transcripts_match(speculation.text, final_text, self.tolerance):
+            logger.info(f"Spéculation {speculation_id} abandonnée : '{speculation.text[:50]}' != '{final_text[:50]}'")
+            self._cancel(speculation, "discarded")
+            return None
+
+        resolved_at = time.perf_counter()
+        try:
+            result = await speculation.task
+        except Exception as e:
+            logger.warning(f"Échec de la génération spéculative {speculation_id} : {e}")
+            SPECULATIONS.labels("failed").inc()
+            return None
+        # Sans spéculation, la génération commencerait maintenant : le gain est sa durée,
+        # au plus le temps écoulé depuis son démarrage
+        finished = speculation.finished or time.perf_counter()
+        saved = min(finished - speculation.started, resolved_at - speculation.started)
+        SPECULATIONS.labels("kept").inc()
+        SPECULATION_SAVED_SECONDS.observe(saved)
+        logger.info(f"Spéculation {speculation_id} gardée : {saved:.3f} secondes économisées")
+        return result
+
+    def _cancel(self, speculation, outcome):
+        # L'appel Groq déjà parti dans le pool de threads va à son terme ; seul son résultat est ignoré
+        speculation.task.cancel()
+        SPECULATIONS.labels(outcome).inc()
+
+    def _expire(self):
+        deadline = time.perf_counter() - self.ttl
+        for speculation_id in [key for key, value in self._pending.items() if value.started < deadline]:
+            self._cancel(self._pending.pop(speculation_id), "expired")
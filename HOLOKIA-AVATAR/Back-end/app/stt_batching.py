@@ -0,0 +1,210 @@
+"""
+Ordonnanceur de transcription Whisper par lots.
+
+Les requêtes concurrentes sont regroupées (jusqu'à `max_batch_size` clips ou
+`max_wait_ms` d'attente), leurs spectrogrammes mel sont empilés dans un seul
+tenseur, l'encodeur est exécuté une seule fois par lot et le décodage est fait
+en lot (un appel par langue demandée).
+"""
+
+import asyncio
+import logging
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+import numpy as np # type: ignore
+import torch # type: ignore
+import whisper # type: ignore
+
+import metrics
+
+logger = logging.getLogger("stt-server")
+
+SAMPLE_RATE = whisper.audio.SAMPLE_RATE
+# Au-delà d'une fenêtre de 30 s, on repasse par model.transcribe (fenêtre glissante)
+MAX_BATCH_SAMPLES = whisper.audio.N_SAMPLES
+
+BATCH_SIZE = metrics.histogram(
+    "holokia_whisper_batch_size", "Nombre de clips par lot Whisper", buckets=(1, 2, 4, 8, 16, 32),
+)
+
+
+def transcript_confidence(segments):
+    """
+    Confiance d'un énoncé à partir des segments Whisper, sans passe supplémentaire.
+
+    Chaque segment vaut exp(avg_logprob) (probabilité moyenne des tokens) pondérée
+    par 1 - no_speech_prob, moyennée selon la durée. Renvoie (confiance,
+    no_speech_prob moyen), ou (None, None) sans segment.
+    """
+    total = confidence = no_speech = 0.0
+    for segment in segments:
+        weight = max(segment["end"] - segment["start"], 1e-3)
+        no_speech_prob = segment.get("no_speech_prob", 0.0)
+        token_prob = math.exp(min(segment.get("avg_logprob", 0.0), 0.0))
+        confidence += weight * token_prob * (1.0 - no_speech_prob)
+        no_speech += weight * no_speech_prob
+        total += weight
+    if not total:
+        return None, None
+    return round(confidence / total, 4), round(no_speech / total, 4)
+
+
+@dataclass
+class _PendingClip:
+    audio: np.ndarray
+    language: str | None
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.perf_counter)
+
+
+class WhisperBatchScheduler:
+    """Regroupe les clips concurrents et les décode en lot sur un thread dédié"""
+
+    def __init__(self, model, max_batch_size=8, max_wait_ms=30, enabled=True, options=None):
+        self.model = model
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms) / 1000)
+        self.enabled = enabled
+        # Options du profil d'inférence (voir whisper_tuning.decode_options)
+        self.options = options or {}
+        self.fp16 = self.options.get("fp16", model.device.type == "cuda")
+        # Un seul thread : le modèle n'est jamais utilisé en parallèle
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="whisper")
+        self._queue = None
+        self._worker = None
+
+    async def transcribe(self, audio, language=None, word_timestamps=False):
+        """Transcrit un signal float32 mono 16 kHz et renvoie un dict au format de model.transcribe"""
+        # L'alignement des mots n'existe que dans model.transcribe
+        if not self.enabled or word_timestamps or len(audio) > MAX_BATCH_SAMPLES:
+            return await self.run_exclusive(self._transcribe_single, audio, language, word_timestamps)
+
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(_PendingClip(audio, language, future))
+        return await future
+
+    def pending(self):
+        """Clips en file d'attente, pas encore pris dans un lot"""
+        return self._queue.qsize() if self._queue else 0
+
+    async def run_exclusive(self, func, *args):
+        """Exécute une fonction sur le thread du modèle, en série avec les lots"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def _ensure_worker(self):
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            batch = [clip for clip in batch if not clip.future.done()]
+            if not batch:
+                continue
+
+            try:
+                results = await loop.run_in_executor(self._executor, self._decode_batch, batch)
+            except Exception as e:
+                logger.exception(f"Erreur lors du décodage du lot : {e}")
+                for clip in batch:
+                    if not clip.future.done():
+                        clip.future.set_exception(e)
+                continue
+
+            for clip, result in zip(batch, results):
+                if not clip.future.done():
+                    clip.future.set_result(result)
+
+    def _decode_batch(self, batch):
+        start_time = time.perf_counter()
+        mel = torch.stack([
+            whisper.log_mel_spectrogram(whisper.pad_or_trim(clip.audio), n_mels=self.model.dims.n_mels)
+            for clip in batch
+        ]).to(self.model.device)
+        if self.fp16:
+            mel = mel.half()
+
+        BATCH_SIZE.observe(len(batch))
+        with metrics.time_upstream("whisper"):
+            return self._decode_mel(batch, mel, start_time)
+
+    def _decode_mel(self, batch, mel, start_time):
+        # Encodeur exécuté une seule fois pour tout le lot
+        with torch.no_grad():
+            audio_features = self.model.embed_audio(mel)
+
+        groups = {}
+        for index, clip in enumerate(batch):
+            groups.setdefault(clip.language, []).append(index)
+
+        results = [None] * len(batch)
+        for language, indexes in groups.items():
+            # language=None : détection de langue par clip à l'intérieur du lot
+            options = whisper.DecodingOptions(
+                task="transcribe",
+                language=language,
+                fp16=self.fp16,
+                beam_size=self.options.get("beam_size"),
+                without_timestamps=True,
+            )
+            decoded = whisper.decode(self.model, audio_features[indexes], options)
+            for index, result in zip(indexes, decoded):
+                results[index] = self._to_transcribe_result(batch[index].audio, result)
+
+        logger.info(
+            f"Lot Whisper : {len(batch)} clip(s), {len(groups)} langue(s) "
+            f"en {time.perf_counter() - start_time:.3f} secondes"
+        )
+        return results
+
+    def _transcribe_single(self, audio, language, word_timestamps=False):
+        with metrics.time_upstream("whisper"):
+            return self._transcribe_model(audio, language, word_timestamps)
+
+    def _transcribe_model(self, audio, language, word_timestamps):
+        return self.model.transcribe(
+            audio,
+            language=language,
+            task="transcribe",
+            fp16=self.fp16,
+            beam_size=self.options.get("beam_size"),
+            best_of=self.options.get("best_of"),
+            condition_on_previous_text=self.options.get("condition_on_previous_text", True),
+            word_timestamps=word_timestamps,
+        )
+
+    @staticmethod
+    def _to_transcribe_result(audio, result):
+        text = result.text.strip()
+        return {
+            "text": text,
+            "language": result.language,
+            "segments": [{
+                "id": 0,
+                "start": 0.0,
+                "end": len(audio) / SAMPLE_RATE,
+                "text": text,
+                "tokens": result.tokens,
+                "temperature": result.temperature,
+                "avg_logprob": result.avg_logprob,
+                "compression_ratio": result.compression_ratio,
+                "no_speech_prob": result.no_speech_prob,
+            }],
+        }
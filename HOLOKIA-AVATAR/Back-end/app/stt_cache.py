@@ -0,0 +1,138 @@
+"""
+Cache des transcriptions du serveur STT, indexé par le contenu audio.
+
+Les entrées récentes sont gardées en mémoire (LRU borné) et recopiées sur
+disque en JSON, ce qui permet de répondre immédiatement aux renvois et
+aux nouvelles tentatives, y compris après un redémarrage.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from collections import OrderedDict
+
+import metrics
+
+logger = logging.getLogger("stt-server")
+
+# Fréquence (en écritures) du nettoyage du dossier disque
+_PRUNE_EVERY = 100
+
+
+class TranscriptCache:
+    """LRU mémoire + disque, avec regroupement des transcriptions identiques en cours"""
+
+    def __init__(self, directory, max_entries=1000, max_disk_entries=10000, enabled=True):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._writes = 0
+        if enabled and directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(data, model_name, language=None, options=""):
+        digest = hashlib.sha256(data)
+        digest.update(f"|{model_name}|{language or 'auto'}|{options}".encode())
+        return digest.hexdigest()
+
+    def get(self, key):
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return self._entries[key]
+        if not self.directory:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Entrée de cache STT illisible {key} : {e}")
+            return None
+        self._remember(key, value)
+        return value
+
+    def put(self, key, value):
+        self._remember(key, value)
+        if not self.directory:
+            return
+        try:
+            tmp_path = self._path(key) + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(value, f, ensure_ascii=False, default=float)
+            os.replace(tmp_path, self._path(key))
+        except Exception as e:
+            logger.warning(f"Impossible d'écrire le cache STT {key} : {e}")
+            return
+        self._writes += 1
+        if self._writes % _PRUNE_EVERY == 0:
+            self._prune_disk()
+
+    async def get_or_compute(self, key, compute):
+        """Renvoie la transcription en cache, attend celle en cours, ou lance `compute()`"""
+        if not self.enabled:
+            return await compute()
+
+        cached = self.get(key)
+        if cached is not None:
+            self.hits += 1
+            metrics.record_cache("stt_transcript", True)
+            logger.info(f"Utilisation du cache STT pour : {key[:16]}")
+            return cached
+
+        # Une nouvelle tentative du proxy rejoint la transcription déjà en cours
+        if key in self._inflight:
+            self.hits += 1
+            metrics.record_cache("stt_transcript", True)
+            logger.info(f"Transcription déjà en cours, attente du résultat : {key[:16]}")
+            return await asyncio.shield(self._inflight[key])
+
+        self.misses += 1
+        metrics.record_cache("stt_transcript", False)
+        # Tâche détachée : si la requête qui l'a lancée est annulée (client parti, timeout du
+        # proxy), la transcription continue pour la nouvelle tentative qui l'attend
+        task = asyncio.create_task(self._compute(key, compute))
+        self._inflight[key] = task
+        task.add_done_callback(lambda done: self._forget(key, done))
+        return await asyncio.shield(task)
+
+    async def _compute(self, key, compute):
+        value = await compute()
+        self.put(key, value)
+        return value
+
+    def _forget(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Évite l'avertissement « exception never retrieved » si plus personne n'attend
+        if not task.cancelled():
+            task.exception()
+
+    def _remember(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _prune_disk(self):
+        try:
+            paths = [os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith(".json")]
+            if len(paths) <= self.max_disk_entries:
+                return
+            paths.sort(key=os.path.getmtime)
+            for path in paths[:len(paths) - self.max_disk_entries]:
+                os.unlink(path)
+        except Exception as e:
+            logger.warning(f"Erreur lors du nettoyage du cache STT : {e}")
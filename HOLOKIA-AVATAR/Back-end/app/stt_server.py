@@ -1,8 +1,10 @@
 import os
 import stat
-from fastapi import FastAPI, HTTPException, UploadFile, File # type: ignore
+import asyncio
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, WebSocket, WebSocketDisconnect # type: ignore
 from fastapi.middleware.cors import CORSMiddleware # type: ignore
 from pydantic import BaseModel # type: ignore
+from typing import List
 import yaml
 import io
 import uuid
@@ -12,10 +14,21 @@ import logging
 from pydub import AudioSegment # type: ignore
 import whisper # type: ignore
 from fastapi.responses import FileResponse # type: ignore
+from fastapi.concurrency import run_in_threadpool # type: ignore
 import time
 import hashlib
 import platform
 import tempfile
+import httpx # type: ignore
+from stt_batching import WhisperBatchScheduler, transcript_confidence
+from stt_cache import TranscriptCache
+import whisper_tuning
+import readiness
+import metrics
+import tracing
+import ndjson
+from stt_streaming import StreamingTranscriber, FfmpegStreamDecoder
+from vad import pcm16_to_float32, trim_silence, SAMPLE_RATE
 
 app = FastAPI(
     title="STT Server",
@@ -32,6 +45,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Latences par route et GET /metrics
+metrics.instrument_app(app, "stt")
+
+# X-Request-ID reçu de l'API principale et en-tête Server-Timing
+tracing.instrument_app(app, "stt")
+
 # Configurer les logs
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("stt-server")
@@ -49,6 +68,16 @@ except Exception as e:
 
 LANGUAGES = config.get("languages", ["fr", "en", "ar"])
 SPEAKERS = config.get("speakers", ["female-pt-4", "male-en-1"])
+STT_CONFIG = config.get("stt") or {}
+BATCHING_CONFIG = STT_CONFIG.get("batching") or {}
+STREAMING_CONFIG = STT_CONFIG.get("streaming") or {}
+VAD_CONFIG = STT_CONFIG.get("vad") or {}
+CACHE_CONFIG = STT_CONFIG.get("cache") or {}
+BULK_CONFIG = STT_CONFIG.get("bulk") or {}
+MODEL_NAME = STT_CONFIG.get("model", "base")
+# En dessous, la transcription est signalée comme peu fiable (low_confidence)
+MIN_CONFIDENCE = STT_CONFIG.get("min_confidence", 0.4)
+PROFILE_NAME, PROFILE = whisper_tuning.resolve_profile(STT_CONFIG)
 logger.info(f"Langues disponibles : {LANGUAGES}")
 logger.info(f"Locuteurs disponibles : {SPEAKERS}")
 
@@ -59,20 +88,169 @@ logger.info(f"Dossier de sortie : {OUTPUT_DIR}")
 
 # Initialiser le modèle Whisper
 try:
-    model = whisper.load_model("base")
-    logger.info("Modèle Whisper chargé avec succès")
+    model = whisper_tuning.load_model(MODEL_NAME, PROFILE)
+    DECODE_OPTIONS = whisper_tuning.decode_options(PROFILE, model)
+    logger.info(f"Modèle Whisper '{MODEL_NAME}' chargé avec succès (profil {PROFILE_NAME} : {PROFILE})")
 except Exception as e:
     logger.error(f"Erreur lors du chargement du modèle Whisper : {e}")
     raise
 
+# Regroupement des transcriptions concurrentes
+scheduler = WhisperBatchScheduler(
+    model,
+    max_batch_size=BATCHING_CONFIG.get("max_batch_size", 8),
+    max_wait_ms=BATCHING_CONFIG.get("max_wait_ms", 30),
+    enabled=BATCHING_CONFIG.get("enabled", True),
+    options=DECODE_OPTIONS,
+)
+metrics.callback(
+    "holokia_whisper_queue_depth", "Clips en attente de l'ordonnanceur Whisper",
+    lambda: [((), scheduler.pending())],
+)
+logger.info(
+    f"Batching Whisper : {'activé' if scheduler.enabled else 'désactivé'} "
+    f"(taille max {scheduler.max_batch_size}, attente max {scheduler.max_wait * 1000:.0f} ms)"
+)
+
+# /transcribe/batch : fichiers lus et décodés au plus BATCH_CONCURRENCY à la fois
+BATCH_CONCURRENCY = BULK_CONFIG.get("concurrency", 8)
+BATCH_MAX_ITEMS = BULK_CONFIG.get("max_items", 5000)
+batch_semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+# Cache des transcriptions par empreinte du contenu audio
+transcript_cache = TranscriptCache(
+    os.path.join(BASE_DIR, CACHE_CONFIG.get("directory", "cache/stt")),
+    max_entries=CACHE_CONFIG.get("max_entries", 1000),
+    max_disk_entries=CACHE_CONFIG.get("max_disk_entries", 10000),
+    enabled=CACHE_CONFIG.get("enabled", True),
+)
+# Les réglages VAD et de décodage changent le résultat : ils font partie de la clé
+CACHE_OPTIONS = json.dumps({"vad": VAD_CONFIG, "decode": DECODE_OPTIONS}, sort_keys=True)
+
 class TranscriptionRequest(BaseModel):
     audio_id: str | None = None
     language: str | None = None
+    word_timestamps: bool = False
+
+class TranscriptionBatchRequest(BaseModel):
+    items: List[TranscriptionRequest]
+    concurrency: int | None = None
+
+class WordTiming(BaseModel):
+    word: str
+    start: float
+    end: float
+    probability: float
 
 class TranscriptionResponse(BaseModel):
     text: str
     language: str
     confidence: float | None = None
+    no_speech_prob: float | None = None
+    low_confidence: bool = False
+    dropped_seconds: float | None = None
+    words: List[WordTiming] | None = None
+
+async def transcribe_speech(audio, language=None, word_timestamps=False):
+    """Supprime les silences, découpe sur les pauses et transcrit les segments en lot"""
+    if VAD_CONFIG.get("enabled", True):
+        with tracing.span("vad"):
+            segments, offsets, dropped = trim_silence(
+                audio,
+                threshold_db=VAD_CONFIG.get("threshold_db", -40.0),
+                min_pause_ms=VAD_CONFIG.get("min_pause_ms", 500),
+                padding_ms=VAD_CONFIG.get("padding_ms", 200),
+            )
+        logger.info(
+            f"VAD : {len(segments)} segment(s), {dropped:.2f}s de silence supprimées "
+            f"sur {len(audio) / SAMPLE_RATE:.2f}s"
+        )
+    else:
+        segments, offsets, dropped = [audio], [0.0], 0.0
+
+    if not segments:
+        return {"text": "", "language": language, "segments": [], "dropped_seconds": dropped,
+                "confidence": None, "no_speech_prob": None}
+
+    # Les segments partent ensemble dans l'ordonnanceur et sont décodés dans le même lot
+    with tracing.span("whisper", segments=len(segments)):
+        results = await asyncio.gather(*(
+            scheduler.transcribe(segment, language=language, word_timestamps=word_timestamps)
+            for segment in segments
+        ))
+
+    merged_segments = []
+    for offset, result in zip(offsets, results):
+        for segment in result.get("segments", []):
+            merged = {**segment, "start": segment["start"] + offset, "end": segment["end"] + offset}
+            if segment.get("words"):
+                merged["words"] = [
+                    {**word, "start": word["start"] + offset, "end": word["end"] + offset}
+                    for word in segment["words"]
+                ]
+            merged_segments.append(merged)
+
+    confidence, no_speech_prob = transcript_confidence(merged_segments)
+
+    # Langue du segment le plus long si elle n'est pas imposée
+    longest = max(range(len(segments)), key=lambda i: len(segments[i]))
+    return {
+        "text": " ".join(result["text"].strip() for result in results if result["text"].strip()),
+        "language": results[longest].get("language") or language,
+        "segments": merged_segments,
+        "dropped_seconds": dropped,
+        "confidence": confidence,
+        "no_speech_prob": no_speech_prob,
+    }
+
+def transcription_payload(result, language, word_timestamps=False):
+    """Champs communs des réponses de transcription"""
+    confidence = result.get("confidence")
+    payload = {
+        "text": result["text"].strip(),
+        "language": result.get("language") or language or "en",
+        "confidence": confidence,
+        "no_speech_prob": result.get("no_speech_prob"),
+        "low_confidence": confidence is not None and confidence < MIN_CONFIDENCE,
+        "dropped_seconds": result.get("dropped_seconds"),
+    }
+    if word_timestamps:
+        payload["words"] = [
+            {"word": word["word"].strip(), "start": round(word["start"], 3),
+             "end": round(word["end"], 3), "probability": round(word.get("probability", 0.0), 4)}
+            for segment in result.get("segments", [])
+            for word in segment.get("words", [])
+        ]
+    return payload
+
+async def transcribe_bytes(content, language=None, word_timestamps=False):
+    """Décode un fichier audio reçu (tout format lu par ffmpeg) puis le transcrit"""
+    # Créer un fichier temporaire
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as temp_file:
+        temp_file.write(content)
+        temp_file_path = temp_file.name
+    
+    try:
+        # Décoder en float32 mono 16 kHz
+        with tracing.span("decode"):
+            audio = await run_in_threadpool(whisper.load_audio, temp_file_path)
+        # Langue détectée par Whisper dans le lot si non spécifiée
+        return await transcribe_speech(audio, language=language, word_timestamps=word_timestamps)
+    finally:
+        # Nettoyer les fichiers temporaires
+        try:
+            os.unlink(temp_file_path)
+        except Exception as e:
+            logger.warning(f"Erreur lors du nettoyage des fichiers temporaires : {e}")
+
+def read_file_bytes(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+@app.on_event("startup")
+async def announce_ready():
+    # Modèle Whisper chargé : start_service.py peut démarrer les services dépendants
+    readiness.notify_ready(service="stt")
 
 @app.get("/languages/")
 async def get_languages():
@@ -110,9 +288,15 @@ async def health_check():
 @app.post("/transcribe/", response_model=TranscriptionResponse)
 async def transcribe_audio(
     file: UploadFile = File(...),
-    language: str | None = None
+    language: str | None = None,
+    lang: str | None = Form(None),
+    word_timestamps: bool = False
 ):
     try:
+        # Le frontend envoie la locale (ex. "fr-fr") dans le champ "lang" du formulaire
+        if not language and lang:
+            language = lang.split("-")[0].lower()
+        
         if not file.filename:
             raise HTTPException(status_code=400, detail="Fichier audio requis")
         
@@ -120,64 +304,21 @@ async def transcribe_audio(
         if not file.content_type or not file.content_type.startswith("audio/"):
             raise HTTPException(status_code=400, detail="Le fichier doit être un fichier audio")
         
-        # Créer un fichier temporaire
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as temp_file:
+        with tracing.span("upload"):
             content = await file.read()
-            temp_file.write(content)
-            temp_file_path = temp_file.name
+        cache_key = TranscriptCache.make_key(content, MODEL_NAME, language, f"{CACHE_OPTIONS}|words={word_timestamps}")
+        logger.info(f"Transcription audio : langue={language or 'auto'}")
+        result = await transcript_cache.get_or_compute(
+            cache_key, lambda: transcribe_bytes(content, language, word_timestamps)
+        )
+        payload = transcription_payload(result, language, word_timestamps)
         
-        try:
-            # Convertir en WAV si nécessaire
-            audio = AudioSegment.from_file(temp_file_path)
-            audio = audio.set_channels(1).set_frame_rate(16000)
-            
-            # Sauvegarder en WAV
-            wav_path = temp_file_path.replace(".wav", "_converted.wav")
-            audio.export(wav_path, format="wav")
-            
-            # Détecter la langue si non spécifiée
-            if not language:
-                try:
-                    # Utiliser Whisper pour détecter la langue
-                    result = model.transcribe(wav_path, language=None)
-                    detected_lang = result["language"]
-                    logger.info(f"Langue détectée : {detected_lang}")
-                except Exception as e:
-                    logger.warning(f"Erreur lors de la détection de langue : {e}")
-                    detected_lang = "en"
-            else:
-                detected_lang = language
-            
-            # Transcrire avec la langue détectée
-            logger.info(f"Transcription audio : langue={detected_lang}")
-            
-            result = model.transcribe(
-                wav_path,
-                language=detected_lang,
-                task="transcribe"
-            )
-            
-            transcribed_text = result["text"].strip()
-            
-            if not transcribed_text:
-                raise HTTPException(status_code=400, detail="Aucun texte transcrit détecté")
-            
-            logger.info(f"Transcription réussie : '{transcribed_text[:50]}...'")
-            
-            return TranscriptionResponse(
-                text=transcribed_text,
-                language=detected_lang,
-                confidence=result.get("confidence", None)
-            )
-            
-        finally:
-            # Nettoyer les fichiers temporaires
-            try:
-                os.unlink(temp_file_path)
-                if os.path.exists(wav_path):
-                    os.unlink(wav_path)
-            except Exception as e:
-                logger.warning(f"Erreur lors du nettoyage des fichiers temporaires : {e}")
+        if not payload["text"]:
+            raise HTTPException(status_code=400, detail="Aucun texte transcrit détecté")
+        
+        logger.info(f"Transcription réussie : '{payload['text'][:50]}...' (confiance : {payload['confidence']})")
+        
+        return TranscriptionResponse(**payload)
                 
     except HTTPException:
         raise
@@ -195,39 +336,27 @@ async def transcribe_file(request: TranscriptionRequest):
         if not os.path.exists(audio_path):
             raise HTTPException(status_code=404, detail="Fichier audio non trouvé")
         
-        # Détecter la langue si non spécifiée
-        if not request.language:
-            try:
-                result = model.transcribe(audio_path, language=None)
-                detected_lang = result["language"]
-                logger.info(f"Langue détectée : {detected_lang}")
-            except Exception as e:
-                logger.warning(f"Erreur lors de la détection de langue : {e}")
-                detected_lang = "en"
-        else:
-            detected_lang = request.language
+        # Transcrire (langue détectée dans le lot si non spécifiée)
+        logger.info(f"Transcription fichier : {request.audio_id}, langue={request.language or 'auto'}")
         
-        # Transcrire
-        logger.info(f"Transcription fichier : {request.audio_id}, langue={detected_lang}")
+        async def transcribe_path():
+            with tracing.span("decode"):
+                audio = await run_in_threadpool(whisper.load_audio, audio_path)
+            return await transcribe_speech(audio, language=request.language, word_timestamps=request.word_timestamps)
         
-        result = model.transcribe(
-            audio_path,
-            language=detected_lang,
-            task="transcribe"
+        content = await run_in_threadpool(read_file_bytes, audio_path)
+        cache_key = TranscriptCache.make_key(
+            content, MODEL_NAME, request.language, f"{CACHE_OPTIONS}|words={request.word_timestamps}"
         )
+        result = await transcript_cache.get_or_compute(cache_key, transcribe_path)
+        payload = transcription_payload(result, request.language, request.word_timestamps)
         
-        transcribed_text = result["text"].strip()
-        
-        if not transcribed_text:
+        if not payload["text"]:
             raise HTTPException(status_code=400, detail="Aucun texte transcrit détecté")
         
-        logger.info(f"Transcription réussie : '{transcribed_text[:50]}...'")
+        logger.info(f"Transcription réussie : '{payload['text'][:50]}...' (confiance : {payload['confidence']})")
         
-        return {
-            "text": transcribed_text,
-            "language": detected_lang,
-            "confidence": result.get("confidence", None)
-        }
+        return payload
         
     except HTTPException:
         raise
@@ -235,6 +364,175 @@ async def transcribe_file(request: TranscriptionRequest):
         logger.exception(f"Erreur lors de la transcription : {e}")
         raise HTTPException(status_code=500, detail=f"Erreur lors de la transcription : {str(e)}")
 
+@app.post("/transcribe/batch")
+async def transcribe_batch(request: TranscriptionBatchRequest):
+    """
+    Transcription en lot de fichiers déjà présents (comme /transcribe-file/) :
+    les éléments identiques ne sont transcrits qu'une fois, les clips en cours
+    alimentent les lots de l'ordonnanceur Whisper, et chaque résultat part en
+    NDJSON dès qu'il est prêt, avec son index dans le lot.
+    """
+    if not request.items:
+        raise HTTPException(status_code=400, detail="Le lot ne peut pas être vide")
+    if len(request.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Lot trop grand (maximum {BATCH_MAX_ITEMS} éléments)")
+
+    groups = ndjson.group_duplicates(
+        request.items, key=lambda item: (item.audio_id, item.language, item.word_timestamps)
+    )
+    limiter = asyncio.Semaphore(max(1, min(request.concurrency or BATCH_CONCURRENCY, BATCH_CONCURRENCY)))
+    logger.info(f"Lot STT : {len(request.items)} élément(s), {len(groups)} distinct(s)")
+
+    async def transcribe(item):
+        async with limiter, batch_semaphore:
+            return await transcribe_file(item)
+
+    return ndjson.response(ndjson.run_batch(groups, transcribe))
+
+@app.websocket("/ws/transcribe")
+async def transcribe_stream(
+    websocket: WebSocket,
+    language: str | None = None,
+    format: str = "pcm16",
+    forward: bool = False
+):
+    """
+    Transcription en continu. Le client envoie des trames binaires (PCM 16 bits
+    mono 16 kHz, ou Opus/WebM avec format=opus) et des messages texte JSON :
+    {"type": "history", "history": [...]} pour le contexte de /api/generate,
+    {"type": "end"} pour terminer. Le serveur répond par des messages
+    "partial", "final", "reply" (si forward=true) puis "done".
+    Avec forward=true et streaming.stable_silence_ms, la partielle stable
+    démarre le LLM avant la finale (si SPECULATIVE_LLM=1 sur l'API principale).
+    """
+    await websocket.accept()
+    history = []
+    connection_id = uuid.uuid4().hex
+    # Énoncé -> speculationId accepté par l'API principale
+    speculations = {}
+    speculate = forward and bool(STREAMING_CONFIG.get("stable_silence_ms"))
+
+    async def send(message):
+        await websocket.send_json(message)
+
+    async def forward_to_generate(text, lang, utterance_id):
+        # Enchaîner directement sur le LLM sans repasser par le navigateur
+        history.append({"role": "user", "content": text})
+        speculation_id = speculations.pop(utterance_id, None)
+        try:
+            async with httpx.AsyncClient(timeout=60.0) as client:
+                start_time = time.time()
+                response = await client.post(
+                    STREAMING_CONFIG.get("generate_url", "http://localhost:5001/api/generate"),
+                    json={"history": history, "detectedLanguage": lang, "speculationId": speculation_id}
+                )
+                response.raise_for_status()
+                reply = response.json()
+                logger.info(f"Temps requête /api/generate : {time.time() - start_time} secondes")
+        except Exception as e:
+            logger.error(f"Erreur lors du transfert vers /api/generate : {e}")
+            await send({"type": "error", "message": "Erreur lors de la génération de la réponse"})
+            return
+        history.append({"role": "assistant", "content": reply.get("text", "")})
+        await send({"type": "reply", **reply})
+
+    async def speculate_on_partial(text, lang, utterance_id):
+        nonlocal speculate
+        if not speculate:
+            return
+        speculation_id = f"{connection_id}:{utterance_id}"
+        try:
+            async with httpx.AsyncClient(timeout=5.0) as client:
+                response = await client.post(
+                    STREAMING_CONFIG.get("speculate_url", "http://localhost:5001/api/generate/speculate"),
+                    json={
+                        "speculationId": speculation_id,
+                        "history": [*history, {"role": "user", "content": text}],
+                        "detectedLanguage": lang,
+                    }
+                )
+                response.raise_for_status()
+        except Exception as e:
+            logger.warning(f"Échec du démarrage spéculatif du LLM : {e}")
+            return
+        if response.json().get("accepted"):
+            speculations[utterance_id] = speculation_id
+        else:
+            # Mode désactivé sur l'API principale : inutile de réessayer sur cette connexion
+            speculate = False
+
+    transcriber = StreamingTranscriber(
+        scheduler,
+        send,
+        language=language,
+        threshold_db=STREAMING_CONFIG.get("vad_threshold_db", -40.0),
+        endpoint_silence_ms=STREAMING_CONFIG.get("endpoint_silence_ms", 700),
+        partial_interval_ms=STREAMING_CONFIG.get("partial_interval_ms", 1000),
+        min_confidence=MIN_CONFIDENCE,
+        on_final=forward_to_generate if forward else None,
+        stable_silence_ms=STREAMING_CONFIG.get("stable_silence_ms"),
+        on_stable_partial=speculate_on_partial if speculate else None,
+    )
+    decoder = FfmpegStreamDecoder(transcriber.push) if format != "pcm16" else None
+
+    try:
+        if decoder:
+            await decoder.start()
+        logger.info(f"Flux STT ouvert (format={format}, langue={language or 'auto'}, forward={forward})")
+
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+
+            if message.get("bytes"):
+                if decoder:
+                    await decoder.feed(message["bytes"])
+                else:
+                    await transcriber.push(pcm16_to_float32(message["bytes"]))
+                continue
+
+            control = json.loads(message.get("text") or "{}")
+            if control.get("type") == "history":
+                history[:] = control.get("history", [])
+            elif control.get("type") == "end":
+                if decoder:
+                    await decoder.close()
+                    decoder = None
+                await transcriber.flush()
+                await send({"type": "done"})
+                await websocket.close()
+                break
+
+    except WebSocketDisconnect:
+        logger.info("Flux STT fermé par le client")
+    except Exception as e:
+        logger.exception(f"Erreur dans le flux STT : {e}")
+        try:
+            await send({"type": "error", "message": str(e)})
+            await websocket.close(code=1011)
+        except Exception:
+            pass
+    finally:
+        transcriber.cancel()
+        if decoder and decoder.process and decoder.process.returncode is None:
+            decoder.process.kill()
+
+def after_fork():
+    # Pool de threads torch propre à chaque worker pré-fork
+    whisper_tuning.apply_torch_threads(PROFILE)
+
 if __name__ == "__main__":
-    import uvicorn # type: ignore
-    uvicorn.run(app, host="0.0.0.0", port=5002)
\ No newline at end of file
+    import serving
+    # Workers pré-fork partageant le modèle déjà chargé (copie à l'écriture) ; STT_WORKERS ou stt.workers
+    workers = int(os.getenv("STT_WORKERS") or STT_CONFIG.get("workers", 1))
+    if workers > 1 and model.device.type != "cpu":
+        logger.warning("Workers pré-fork impossibles avec CUDA initialisé avant le fork : un seul worker")
+        workers = 1
+    if workers > 1:
+        logger.info(
+            f"{workers} workers pré-fork : une nouvelle tentative après timeout peut arriver sur un autre "
+            "worker et recommencer la transcription (utiliser --instances stt=N pour garder l'affinité)"
+        )
+    # PORT (et SERVICE_UDS avec --uds) sont fournis par start_service.py
+    serving.run(app, 5002, workers=workers, after_fork=after_fork)
\ No newline at end of file
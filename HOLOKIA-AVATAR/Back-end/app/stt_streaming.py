@@ -0,0 +1,265 @@
+"""
+Transcription en continu pour le endpoint WebSocket du serveur STT.
+
+Le client envoie l'audio par morceaux pendant qu'il parle ; la VAD découpe les
+énoncés, des transcriptions partielles sont produites sur une fenêtre
+glissante, puis une transcription finale à la fin de chaque énoncé.
+"""
+
+import asyncio
+import logging
+import time
+
+import numpy as np # type: ignore
+
+from stt_batching import transcript_confidence
+from vad import SAMPLE_RATE, FRAME_MS, frame_energy_db, frame_size, pcm16_to_float32
+
+logger = logging.getLogger("stt-server")
+
+# Durée conservée avant le début de la parole pour ne pas couper la première syllabe
+PREROLL_MS = 300
+# Attente maximale de la partielle stable (décodage et envoi de la spéculation) avant on_final
+STABLE_PARTIAL_WAIT_S = 2.0
+
+
+class FfmpegStreamDecoder:
+    """Décode un flux Opus/WebM en PCM 16 kHz mono via un processus ffmpeg"""
+
+    def __init__(self, on_samples):
+        self.on_samples = on_samples
+        self.process = None
+        self._reader = None
+
+    async def start(self):
+        self.process = await asyncio.create_subprocess_exec(
+            "ffmpeg", "-loglevel", "error", "-i", "pipe:0",
+            "-f", "s16le", "-ac", "1", "-ar", str(SAMPLE_RATE), "pipe:1",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+        )
+        self._reader = asyncio.create_task(self._read())
+
+    async def _read(self):
+        remainder = b""
+        while True:
+            data = await self.process.stdout.read(4096)
+            if not data:
+                break
+            data = remainder + data
+            usable = len(data) - len(data) % 2
+            remainder = data[usable:]
+            await self.on_samples(pcm16_to_float32(data[:usable]))
+
+    async def feed(self, chunk):
+        self.process.stdin.write(chunk)
+        await self.process.stdin.drain()
+
+    async def close(self):
+        if self.process is None:
+            return
+        if not self.process.stdin.is_closing():
+            self.process.stdin.close()
+        await self._reader
+        await self.process.wait()
+
+
+class StreamingTranscriber:
+    """Machine à états VAD + décodage incrémental pour une connexion WebSocket"""
+
+    def __init__(self, scheduler, send, language=None, threshold_db=-40.0,
+                 endpoint_silence_ms=700, partial_interval_ms=1000, max_utterance_s=30,
+                 min_confidence=0.0, on_final=None, stable_silence_ms=None, on_stable_partial=None):
+        self.scheduler = scheduler
+        self.send = send
+        self.language = language
+        self.threshold_db = threshold_db
+        self.frame = frame_size()
+        self.endpoint_frames = max(1, int(endpoint_silence_ms / FRAME_MS))
+        self.partial_samples = int(SAMPLE_RATE * partial_interval_ms / 1000)
+        self.max_samples = int(SAMPLE_RATE * max_utterance_s)
+        self.preroll_frames = max(1, int(PREROLL_MS / FRAME_MS))
+        self.min_confidence = min_confidence
+        self.on_final = on_final
+        # Partielle décodée dès ce silence, avant la fin d'énoncé : probablement identique à la finale
+        self.on_stable_partial = on_stable_partial
+        self.stable_frames = max(1, int(stable_silence_ms / FRAME_MS)) if stable_silence_ms else None
+
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._preroll = []
+        self._utterance = []
+        self._utterance_samples = 0
+        self._in_speech = False
+        self._silent_frames = 0
+        self._since_partial = 0
+        self._partial_task = None
+        self._stable_task = None
+        self._utterance_id = 0
+        self._last_partial = ""
+        # Dernier transfert on_final lancé : les suivants s'enchaînent derrière lui
+        self._final_task = None
+
+    async def push(self, samples):
+        """Ajoute des échantillons float32 16 kHz et déclenche les décodages nécessaires"""
+        data = np.concatenate([self._pending, samples]) if len(self._pending) else samples
+        n_frames = len(data) // self.frame
+        self._pending = data[n_frames * self.frame:]
+        if n_frames == 0:
+            return
+
+        frames = data[:n_frames * self.frame].reshape(n_frames, self.frame)
+        is_speech = frame_energy_db(frames.reshape(-1)) > self.threshold_db
+
+        for frame, speech in zip(frames, is_speech):
+            if not self._in_speech:
+                self._preroll.append(frame)
+                if len(self._preroll) > self.preroll_frames:
+                    self._preroll.pop(0)
+                if speech:
+                    self._start_utterance()
+                continue
+
+            self._utterance.append(frame)
+            self._utterance_samples += len(frame)
+            self._since_partial += len(frame)
+            self._silent_frames = 0 if speech else self._silent_frames + 1
+
+            if self._silent_frames >= self.endpoint_frames or self._utterance_samples >= self.max_samples:
+                await self._finalize()
+            elif self.on_stable_partial and self._silent_frames == self.stable_frames:
+                self._schedule_stable_partial()
+            elif self._since_partial >= self.partial_samples:
+                self._schedule_partial()
+
+    async def flush(self):
+        """Fin du flux : finalise l'énoncé en cours s'il y en a un et attend les transferts on_final"""
+        if self._in_speech:
+            await self._finalize()
+        if self._final_task:
+            await asyncio.gather(self._final_task, return_exceptions=True)
+
+    def cancel(self):
+        """Connexion fermée : abandonne les décodages partiels et le transfert on_final en cours"""
+        for task in (self._partial_task, self._stable_task, self._final_task):
+            if task and not task.done():
+                task.cancel()
+
+    def _start_utterance(self):
+        self._in_speech = True
+        self._utterance = list(self._preroll)
+        self._utterance_samples = sum(len(frame) for frame in self._utterance)
+        self._preroll = []
+        self._silent_frames = 0
+        self._since_partial = 0
+        self._last_partial = ""
+        # Une partielle stable encore en cours appartient à l'énoncé précédent et à son on_final
+        self._stable_task = None
+        self._utterance_id += 1
+
+    def _utterance_audio(self, drop_trailing_silence=False):
+        frames = self._utterance
+        if drop_trailing_silence and self._silent_frames:
+            frames = frames[:len(frames) - self._silent_frames] or frames
+        return np.concatenate(frames)
+
+    def _schedule_partial(self):
+        self._since_partial = 0
+        # Un seul décodage partiel à la fois : on saute plutôt que d'empiler
+        if self._partial_task and not self._partial_task.done():
+            return
+        self._partial_task = asyncio.create_task(
+            self._decode_partial(self._utterance_id, self._utterance_audio())
+        )
+
+    def _schedule_stable_partial(self):
+        # Décodage dédié, même si un partiel est en cours : c'est celui qui démarre le LLM
+        self._since_partial = 0
+        self._stable_task = asyncio.create_task(
+            self._decode_partial(self._utterance_id, self._utterance_audio(drop_trailing_silence=True), stable=True)
+        )
+
+    async def _decode_partial(self, utterance_id, audio, stable=False):
+        try:
+            result = await self.scheduler.transcribe(audio, language=self.language)
+        except Exception as e:
+            logger.warning(f"Échec de la transcription partielle : {e}")
+            return
+        text = result["text"].strip()
+        if utterance_id != self._utterance_id or not text:
+            return
+        # La partielle stable part même si la finale est déjà décodée : on_final l'attend
+        if stable:
+            await self.on_stable_partial(text, result.get("language") or self.language, utterance_id)
+        # Ignorer un partiel arrivé après la finale, ou identique au précédent
+        if not self._in_speech or text == self._last_partial:
+            return
+        self._last_partial = text
+        await self.send({"type": "partial", "text": text, "language": result.get("language")})
+
+    async def _finalize(self):
+        audio = self._utterance_audio(drop_trailing_silence=True)
+        self._in_speech = False
+        self._utterance = []
+        self._utterance_samples = 0
+        self._silent_frames = 0
+        if self._partial_task and not self._partial_task.done():
+            self._partial_task.cancel()
+        # Le décodage stable est déjà dans la file Whisper : l'annuler ne ferait que jeter son résultat.
+        # Il reste référencé dans _stable_task pour cancel() à la fermeture.
+        stable_task = self._stable_task
+
+        start_time = time.time()
+        result = await self.scheduler.transcribe(audio, language=self.language)
+        text = result["text"].strip()
+        logger.info(f"Transcription finale ({len(audio) / SAMPLE_RATE:.1f}s audio) en {time.time() - start_time:.3f} secondes")
+        if not text:
+            self._cancel_stable(stable_task)
+            return
+
+        language = result.get("language") or self.language
+        confidence, no_speech_prob = transcript_confidence(result.get("segments", []))
+        low_confidence = confidence is not None and confidence < self.min_confidence
+        await self.send({
+            "type": "final",
+            "text": text,
+            "language": language,
+            "confidence": confidence,
+            "no_speech_prob": no_speech_prob,
+            "low_confidence": low_confidence,
+            "duration": len(audio) / SAMPLE_RATE,
+        })
+        # Pas d'appel LLM ni de synthèse pour du bruit transcrit
+        if low_confidence:
+            logger.info(f"Transcription finale ignorée (confiance {confidence} < {self.min_confidence})")
+            self._cancel_stable(stable_task)
+            return
+        if not self.on_final:
+            self._cancel_stable(stable_task)
+        else:
+            # Hors de push() : la réception de l'audio continue pendant l'aller-retour
+            # /api/generate ; les transferts restent dans l'ordre des énoncés
+            self._final_task = asyncio.create_task(
+                self._run_on_final(self._final_task, stable_task, text, language, self._utterance_id)
+            )
+
+    @staticmethod
+    def _cancel_stable(stable_task):
+        if stable_task and not stable_task.done():
+            stable_task.cancel()
+
+    async def _run_on_final(self, previous, stable_task, text, language, utterance_id):
+        try:
+            if previous:
+                await asyncio.gather(previous, return_exceptions=True)
+            # La spéculation de l'énoncé doit être acceptée avant que on_final ne cherche son identifiant
+            if stable_task:
+                _, pending = await asyncio.wait({stable_task}, timeout=STABLE_PARTIAL_WAIT_S)
+                if pending:
+                    logger.info(f"Partielle stable non prête après {STABLE_PARTIAL_WAIT_S:.1f}s, génération sur la finale")
+        finally:
+            # Trop tard ou connexion fermée : pas de spéculation orpheline côté API principale
+            self._cancel_stable(stable_task)
+        try:
+            await self.on_final(text, language, utterance_id)
+        except Exception as e:
+            logger.error(f"Échec du traitement de la transcription finale : {e}")
@@ -0,0 +1,67 @@
+"""
+Backends factices pour les tests de charge (benchmarks/loadtest.py).
+
+LLM_BACKEND=stub remplace Groq par une réponse construite localement et
+TTS_BACKEND=stub remplace gTTS par un MP3 silencieux. Les latences simulées se
+règlent avec STUB_LLM_LATENCY_MS et STUB_TTS_LATENCY_MS, pour mesurer le coût
+propre des services sans dépendre du réseau ni des quotas.
+"""
+
+import os
+import time
+
+# Trame MPEG-1 Layer III 32 kb/s 44,1 kHz mono silencieuse (~26 ms)
+_SILENT_FRAME = bytes.fromhex("fffb10c4") + bytes(100)
+_FRAME_SECONDS = 1152 / 44100
+
+STUB_REPLIES = {
+    "fr": "Je suis HOLOKIA. Voici une réponse de test à votre question",
+    "en": "I am HOLOKIA. Here is a test answer to your question",
+    "ar": "أنا HOLOKIA. هذه إجابة تجريبية على سؤالك",
+}
+
+
+def llm_stub_enabled():
+    return os.getenv("LLM_BACKEND", "groq") == "stub"
+
+
+def tts_stub_enabled():
+    return os.getenv("TTS_BACKEND", "gtts") == "stub"
+
+
+def _latency(env_name, default_ms):
+    return float(os.getenv(env_name, default_ms)) / 1000
+
+
+def make_stub_llm():
+    """Runnable LangChain utilisable à la place de ChatGroq dans `prompt | llm | parser`"""
+    from langchain_core.runnables import RunnableLambda # type: ignore
+
+    latency = _latency("STUB_LLM_LATENCY_MS", 300)
+
+    def reply(prompt_value):
+        # Bloquant comme l'appel Groq synchrone qu'il remplace
+        time.sleep(latency)
+        messages = prompt_value.to_messages()
+        system, question = messages[0].content, messages[-1].content
+        # Langue déduite du prompt système choisi par /api/generate
+        lang = "fr" if system.startswith("Tu es") else "ar" if system.startswith("أنت") else "en"
+        last_line = question.strip().splitlines()[-1] if question.strip() else ""
+        return f"{STUB_REPLIES[lang]} ({len(last_line)})."
+
+    return RunnableLambda(reply)
+
+
+class StubTTS:
+    """Même interface que gTTS (constructeur, write_to_fp) ; durée audio proportionnelle au texte"""
+
+    def __init__(self, text, lang="en", slow=False):
+        self.text = text
+        self.lang = lang
+        self.latency = _latency("STUB_TTS_LATENCY_MS", 200)
+
+    def write_to_fp(self, fp):
+        time.sleep(self.latency)
+        # Environ 70 ms de parole par caractère
+        frames = max(1, int(len(self.text) * 0.07 / _FRAME_SECONDS))
+        fp.write(_SILENT_FRAME * frames)
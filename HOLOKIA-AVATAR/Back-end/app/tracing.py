@@ -0,0 +1,214 @@
+"""
+Traçage des requêtes entre l'API principale et les services TTS/STT.
+
+Chaque requête HTTP reçoit un identifiant (en-tête X-Request-ID fourni par
+l'appelant, sinon généré) transmis aux services appelés via les proxys httpx.
+Les étapes mesurées avec `span()` sont renvoyées dans l'en-tête Server-Timing
+et, si TRACE_EXPORT_PATH est défini, ajoutées en JSON lines à ce fichier
+(par un thread d'écriture) pour une analyse hors ligne.
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+logger = logging.getLogger("tracing")
+
+REQUEST_ID_HEADER = "X-Request-ID"
+EXPORT_PATH_ENV = "TRACE_EXPORT_PATH"
+
+_VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+_current = contextvars.ContextVar("holokia_trace", default=None)
+
+
+class Trace:
+    """Étapes chronométrées d'une requête"""
+
+    def __init__(self, request_id, service):
+        self.request_id = request_id
+        self.service = service
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.spans = []
+
+    def add(self, name, start, duration, **attributes):
+        self.spans.append({
+            "name": name,
+            "start_ms": round((start - self.start) * 1000, 2) if start is not None else None,
+            "duration_ms": round(duration * 1000, 2),
+            **attributes,
+        })
+
+    def server_timing(self):
+        entries = [f"{_timing_token(span['name'])};dur={span['duration_ms']:.1f}" for span in self.spans]
+        entries.append(f"total;dur={(time.perf_counter() - self.start) * 1000:.1f}")
+        return ", ".join(entries)
+
+
+def _timing_token(name):
+    return re.sub(r"[^A-Za-z0-9!#$%&'*+.^_`|~-]", "_", name)
+
+
+def current_request_id():
+    trace = _current.get()
+    return trace.request_id if trace else None
+
+
+def propagation_headers():
+    """En-têtes à transmettre aux services appelés"""
+    request_id = current_request_id()
+    return {REQUEST_ID_HEADER: request_id} if request_id else {}
+
+
+@contextmanager
+def span(name, **attributes):
+    """Chronomètre une étape de la requête en cours (sans effet hors requête)"""
+    trace = _current.get()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if trace is not None:
+            trace.add(name, start, time.perf_counter() - start, **attributes)
+
+
+def import_server_timing(header, prefix):
+    """Reprend les étapes Server-Timing d'un service appelé (préfixées, ex. « tts. »)"""
+    trace = _current.get()
+    if trace is None or not header:
+        return
+    for entry in header.split(","):
+        name, _, params = entry.strip().partition(";")
+        match = re.search(r"dur=([0-9.]+)", params)
+        if name and match:
+            trace.add(f"{prefix}{name}", None, float(match.group(1)) / 1000)
+
+
+class SpanExporter:
+    """
+    Ajoute une ligne JSON par requête au fichier TRACE_EXPORT_PATH. Les
+    enregistrements passent par une file bornée vidée par un thread d'écriture :
+    le disque n'est jamais attendu sur la boucle d'événements.
+    """
+
+    def __init__(self, path=None, max_queue=10000):
+        self.path = path if path is not None else os.getenv(EXPORT_PATH_ENV)
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._writer = None
+        self._writer_pid = None
+        self._lock = threading.Lock()
+        if self.path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+
+    def export(self, trace, method, path, status):
+        if not self.path:
+            return
+        record = {
+            "request_id": trace.request_id,
+            "service": trace.service,
+            "method": method,
+            "path": path,
+            "status": status,
+            "timestamp": trace.started_at,
+            "duration_ms": round((time.perf_counter() - trace.start) * 1000, 2),
+            "spans": trace.spans,
+        }
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait(json.dumps(record, ensure_ascii=False) + "\n")
+        except queue.Full:
+            # Disque trop lent : on perd des traces plutôt que de ralentir les requêtes
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                logger.warning(f"File d'export des traces pleine, {self.dropped} trace(s) perdue(s)")
+
+    def flush(self):
+        """Attend l'écriture des traces déjà exportées"""
+        if self._writer_pid == os.getpid():
+            self._queue.join()
+
+    def _ensure_writer(self):
+        # Le thread ne survit pas à un fork (workers pré-fork) : un par processus
+        if self._writer_pid == os.getpid():
+            return
+        with self._lock:
+            if self._writer_pid != os.getpid():
+                self._queue = queue.Queue(maxsize=self._queue.maxsize)
+                self._writer = threading.Thread(target=self._write_loop, args=(self._queue,), name="trace-export", daemon=True)
+                self._writer.start()
+                self._writer_pid = os.getpid()
+                atexit.register(self.flush)
+
+    def _write_loop(self, records):
+        while True:
+            lines = [records.get()]
+            while True:
+                try:
+                    lines.append(records.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                # Un seul write par lot de lignes complètes : les services peuvent partager le même fichier
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write("".join(lines))
+            except OSError as e:
+                logger.warning(f"Impossible d'écrire {len(lines)} trace(s) dans {self.path} : {e}")
+            finally:
+                for _ in lines:
+                    records.task_done()
+
+
+class TracingMiddleware:
+    """Middleware ASGI : identifiant de requête, contexte de trace et en-tête Server-Timing"""
+
+    def __init__(self, app, service, exporter=None):
+        self.app = app
+        self.service = service
+        self.exporter = exporter or SpanExporter()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = ""
+        for key, value in scope.get("headers", []):
+            if key == b"x-request-id":
+                request_id = value.decode("latin-1")
+                break
+        if not _VALID_REQUEST_ID.match(request_id):
+            request_id = uuid.uuid4().hex
+
+        trace = Trace(request_id, self.service)
+        token = _current.set(trace)
+        status = 500
+
+        async def send_with_headers(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"x-request-id", request_id.encode("latin-1")))
+                headers.append((b"server-timing", trace.server_timing().encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            _current.reset(token)
+            self.exporter.export(trace, scope["method"], scope["path"], status)
+
+
+def instrument_app(app, service):
+    """Ajoute le traçage à une application FastAPI (à appeler après les autres middlewares)"""
+    app.add_middleware(TracingMiddleware, service=service)
@@ -2,8 +2,8 @@ import os
 import stat
 from fastapi import FastAPI, HTTPException # type: ignore
 from fastapi.middleware.cors import CORSMiddleware # type: ignore
-from fastapi.middleware.gzip import GZipMiddleware # type: ignore
 from pydantic import BaseModel # type: ignore
+from typing import List
 import yaml
 import io
 import subprocess
@@ -17,6 +17,11 @@ from asyncio import Semaphore
 import time
 import hashlib
 import platform
+import readiness
+import metrics
+import tracing
+import stubs
+import ndjson
 
 app = FastAPI(
     title="TTS Server",
@@ -33,15 +38,33 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Activer la compression GZip
-app.add_middleware(GZipMiddleware, minimum_size=1000)
+# Activer la compression GZip (sauf pour les lots renvoyés en flux)
+app.add_middleware(ndjson.SelectiveGZipMiddleware, minimum_size=1000, excluded_paths={"/generate-tts/batch"})
+
+# Latences par route et GET /metrics
+metrics.instrument_app(app, "tts")
+
+# X-Request-ID reçu de l'API principale et en-tête Server-Timing
+tracing.instrument_app(app, "tts")
 
 # Configurer les logs
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("tts-server")
 
-# Limiter à 5 requêtes simultanées
-semaphore = Semaphore(5)
+# TTS_BACKEND=stub : MP3 silencieux au lieu de gTTS pour les tests de charge
+TTS_ENGINE = stubs.StubTTS if stubs.tts_stub_enabled() else gTTS
+if TTS_ENGINE is not gTTS:
+    logger.warning("TTS factice activé (TTS_BACKEND=stub) : aucune requête vers gTTS")
+
+# Limiter à 5 requêtes simultanées (TTS_MAX_CONCURRENCY pour les essais de dimensionnement)
+semaphore = Semaphore(int(os.getenv("TTS_MAX_CONCURRENCY", 5)))
+SYNTHESIS_WAITING = metrics.gauge("holokia_tts_synthesis_waiting", "Synthèses en attente du sémaphore")
+SYNTHESIS_ACTIVE = metrics.gauge("holokia_tts_synthesis_active", "Synthèses en cours (sémaphore acquis)")
+
+# Lots de pré-génération : sémaphore distinct, pour ne pas retarder les requêtes interactives
+BATCH_CONCURRENCY = int(os.getenv("TTS_BATCH_CONCURRENCY", 8))
+BATCH_MAX_ITEMS = int(os.getenv("TTS_BATCH_MAX_ITEMS", 5000))
+batch_semaphore = Semaphore(BATCH_CONCURRENCY)
 
 # Charger la configuration
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
@@ -60,7 +83,8 @@ logger.info(f"Langues disponibles : {LANGUAGES}")
 logger.info(f"Locuteurs disponibles : {SPEAKERS}")
 
 # Dossier de sortie
-OUTPUT_DIR = os.path.join(BASE_DIR, "../../lipsync-demo/public/audios")
+# TTS_OUTPUT_DIR permet aux tests de charge de ne pas mélanger leur audio au cache réel
+OUTPUT_DIR = os.getenv("TTS_OUTPUT_DIR") or os.path.join(BASE_DIR, "../../lipsync-demo/public/audios")
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 logger.info(f"Dossier de sortie : {OUTPUT_DIR}")
 
@@ -70,6 +94,15 @@ class SynthesisRequest(BaseModel):
     audio_id: str | None = None
     speaker: str | None = None
 
+class SynthesisBatchRequest(BaseModel):
+    items: List[SynthesisRequest]
+    concurrency: int | None = None
+
+@app.on_event("startup")
+async def announce_ready():
+    # Configuration chargée : start_service.py peut démarrer les services dépendants
+    readiness.notify_ready(service="tts")
+
 @app.get("/languages/")
 async def get_languages():
     return {"languages": LANGUAGES}
@@ -104,8 +137,36 @@ async def health_check():
 
 @app.post("/generate-tts/")
 async def generate_tts(request: SynthesisRequest):
-    async with semaphore:
-        return await run_in_threadpool(lambda: sync_generate_tts(request))
+    with SYNTHESIS_WAITING.track(), tracing.span("queue"):
+        await semaphore.acquire()
+    try:
+        with SYNTHESIS_ACTIVE.track():
+            return await run_in_threadpool(lambda: sync_generate_tts(request))
+    finally:
+        semaphore.release()
+
+@app.post("/generate-tts/batch")
+async def generate_tts_batch(request: SynthesisBatchRequest):
+    """
+    Synthèse en lot : les éléments identiques ne sont synthétisés qu'une fois,
+    au plus `concurrency` à la fois (TTS_BATCH_CONCURRENCY au maximum), et
+    chaque résultat part en NDJSON dès qu'il est prêt, avec son index dans le lot.
+    """
+    if not request.items:
+        raise HTTPException(status_code=400, detail="Le lot ne peut pas être vide")
+    if len(request.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Lot trop grand (maximum {BATCH_MAX_ITEMS} éléments)")
+
+    groups = ndjson.group_duplicates(request.items, key=lambda item: (item.text, item.lang, item.audio_id, item.speaker))
+    limiter = Semaphore(max(1, min(request.concurrency or BATCH_CONCURRENCY, BATCH_CONCURRENCY)))
+    logger.info(f"Lot TTS : {len(request.items)} élément(s), {len(groups)} distinct(s)")
+
+    async def synthesize(item):
+        async with limiter, batch_semaphore:
+            with SYNTHESIS_ACTIVE.track():
+                return await run_in_threadpool(sync_generate_tts, item)
+
+    return ndjson.response(ndjson.run_batch(groups, synthesize))
 
 def sync_generate_tts(request: SynthesisRequest):
     try:
@@ -127,23 +188,32 @@ def sync_generate_tts(request: SynthesisRequest):
         cache_audio_path = os.path.join(OUTPUT_DIR, f"{cache_key}.mp3")
     
 
-        if os.path.exists(cache_audio_path):
+        with tracing.span("cache"):
+            cached = os.path.exists(cache_audio_path)
+        if cached:
+            metrics.record_cache("tts_audio", True)
             logger.info(f"Utilisation du cache pour : {cache_key}")
             return {
                 "audioId": cache_key,
                 "audioPath": f"/audios/{cache_key}.mp3",
+                "cached": True,
             }
 
         audio_id = request.audio_id or cache_key
         audio_path = os.path.join(OUTPUT_DIR, f"{audio_id}.mp3")
 
-        if os.path.exists(audio_path):
+        with tracing.span("cache"):
+            cached = os.path.exists(audio_path)
+        if cached:
+            metrics.record_cache("tts_audio", True)
             logger.info(f"Utilisation du cache pour : {audio_id}")
             return {
                 "audioId": audio_id,
                 "audioPath": f"/audios/{audio_id}.mp3",
+                "cached": True,
             }
 
+        metrics.record_cache("tts_audio", False)
         logger.info(f"Génération TTS : '{request.text[:50]}...' (lang: {normalized_lang}, id: {audio_id})")
 
 
@@ -151,7 +221,7 @@ def sync_generate_tts(request: SynthesisRequest):
             for attempt in range(3):
                 try:
                     start_time = time.time()
-                    tts = gTTS(text=text, lang=lang, slow=False)
+                    tts = TTS_ENGINE(text=text, lang=lang, slow=False)
                     logger.info(f"Temps gTTS (tentative {attempt + 1}) : {time.time() - start_time} secondes")
                     return tts
                 except Exception as e:
@@ -165,16 +235,20 @@ def sync_generate_tts(request: SynthesisRequest):
             tts = generate_audio_with_retry(request.text, normalized_lang)
             start_time = time.time()
             audio_buffer = io.BytesIO()
-            tts.write_to_fp(audio_buffer)
+            # L'appel réseau à Google a lieu ici, pas à la construction de gTTS
+            with metrics.time_upstream("gtts"), tracing.span("synthesis"):
+                tts.write_to_fp(audio_buffer)
             audio_buffer.seek(0)
             temp_audio_path = os.path.join(OUTPUT_DIR, f"{audio_id}.mp3")
-            with open(temp_audio_path, "wb") as f:
+            with tracing.span("write"), open(temp_audio_path, "wb") as f:
                 f.write(audio_buffer.getvalue())
             logger.info(f"Temps creation audio : {time.time() - start_time} secondes")
             logger.info(f"Audio MP3 temporaire généré : {temp_audio_path}")
             return {
                 "audioId": audio_id,
-                "audioPath": temp_audio_path,
+                # URL publique, comme les réponses du cache (pas le chemin disque du serveur)
+                "audioPath": f"/audios/{audio_id}.mp3",
+                "cached": False,
             }
 
         except Exception as e:
@@ -187,5 +261,6 @@ def sync_generate_tts(request: SynthesisRequest):
         raise HTTPException(status_code=500, detail="Erreur interne du serveur TTS")
             
 if __name__ == "__main__":
-    import uvicorn # type: ignore
-    uvicorn.run(app, host="0.0.0.0", port=5000)
\ No newline at end of file
+    import serving
+    # PORT (et SERVICE_UDS avec --uds) sont fournis par start_service.py
+    serving.run(app, 5000)
\ No newline at end of file
@@ -0,0 +1,246 @@
+"""
+Répartition des appels de l'API principale entre les instances TTS/STT.
+
+Chaque instance suit ses requêtes en cours et une moyenne mobile exponentielle
+(EWMA) de sa latence. Le choix se fait soit sur le moins de requêtes en cours,
+soit sur la latence EWMA pondérée par la charge. Une instance qui enchaîne les
+échecs est écartée un temps (doublé à chaque nouvelle exclusion), puis réadmise
+à l'essai : un succès la remet en service, un échec l'écarte à nouveau.
+
+Avec l'affinité par hachage, une clé (l'identifiant audio md5(text_lang) pour le
+TTS) va toujours à la même instance, propriétaire de son cache audio, tant que
+celle-ci n'est pas surchargée (hachage cohérent à charge bornée).
+"""
+
+import bisect
+import hashlib
+import logging
+import math
+import random
+import time
+from contextlib import asynccontextmanager
+
+import httpx # type: ignore
+
+import metrics
+
+logger = logging.getLogger("avatar-backend")
+
+STRATEGIES = ("least_outstanding", "ewma")
+
+# Points par instance sur l'anneau : répartit les clés uniformément
+RING_VIRTUAL_NODES = 160
+
+
+def _ring_hash(value):
+    return int(hashlib.md5(value.encode()).hexdigest()[:16], 16)
+
+
+class HashRing:
+    """Anneau de hachage cohérent : ajouter ou retirer une instance ne déplace que ses clés"""
+
+    def __init__(self, nodes, virtual_nodes=RING_VIRTUAL_NODES):
+        self.nodes = frozenset(nodes)
+        points = sorted((_ring_hash(f"{node}#{index}"), node) for node in self.nodes for index in range(virtual_nodes))
+        self._hashes = [point for point, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def walk(self, key):
+        """Instances dans l'ordre de l'anneau à partir de la clé (propriétaire en premier)"""
+        if not self._nodes:
+            return
+        start = bisect.bisect(self._hashes, _ring_hash(key))
+        seen = set()
+        for offset in range(len(self._nodes)):
+            node = self._nodes[(start + offset) % len(self._nodes)]
+            if node not in seen:
+                seen.add(node)
+                yield node
+                if len(seen) == len(self.nodes):
+                    return
+
+
+def is_upstream_failure(error):
+    """Erreurs imputables à l'instance (réseau, timeout, 5xx), pas à la requête"""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500
+    return isinstance(error, httpx.RequestError)
+
+
+class Replica:
+    """État d'une instance : charge, latence, échecs et exclusion"""
+
+    def __init__(self, url):
+        self.url = url
+        self.in_flight = 0
+        self.ewma_latency = None
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+
+    def available(self, now):
+        return self.ejected_until <= now
+
+    def snapshot(self, now):
+        return {
+            "url": self.url,
+            "in_flight": self.in_flight,
+            "ewma_latency_ms": round(self.ewma_latency * 1000, 1) if self.ewma_latency is not None else None,
+            "requests": self.requests,
+            "failures": self.failures,
+            "consecutive_failures": self.consecutive_failures,
+            "ejected": not self.available(now),
+            "ejected_for_s": round(max(0.0, self.ejected_until - now), 1),
+        }
+
+
+class UpstreamPool:
+    """Choisit l'instance la moins chargée parmi celles du registre de services"""
+
+    def __init__(self, service, registry, strategy="least_outstanding", ewma_alpha=0.3,
+                 max_failures=3, eject_seconds=10.0, max_eject_seconds=120.0,
+                 hash_affinity=False, load_factor=1.25):
+        if strategy not in STRATEGIES:
+            logger.warning(f"Stratégie de répartition inconnue '{strategy}', utilisation de least_outstanding")
+            strategy = "least_outstanding"
+        self.service = service
+        self.registry = registry
+        self.strategy = strategy
+        self.ewma_alpha = ewma_alpha
+        self.max_failures = max(1, int(max_failures))
+        self.eject_seconds = eject_seconds
+        self.max_eject_seconds = max_eject_seconds
+        self.hash_affinity = hash_affinity
+        # Une instance accepte au plus load_factor fois la charge moyenne avant débordement
+        self.load_factor = max(1.0, float(load_factor))
+        self.affinity_hits = 0
+        self.affinity_spills = 0
+        self._replicas = {}
+        self._ring = HashRing([])
+
+    def replicas(self):
+        """Instances actuelles du registre ; l'état des instances connues est conservé"""
+        urls = self.registry.instances(self.service)
+        self._replicas = {url: self._replicas.get(url) or Replica(url) for url in urls}
+        if self.hash_affinity and self._ring.nodes != frozenset(urls):
+            self._ring = HashRing(urls)
+        return list(self._replicas.values())
+
+    def choose(self, exclude=(), key=None):
+        now = time.monotonic()
+        replicas = self.replicas()
+        if key is not None and self.hash_affinity:
+            replica = self._choose_by_key(key, exclude, now)
+            if replica:
+                return replica
+        candidates = [replica for replica in replicas if replica.url not in exclude and replica.available(now)]
+        if not candidates:
+            # Toutes écartées : mieux vaut essayer une instance douteuse que refuser la requête
+            candidates = [replica for replica in replicas if replica.url not in exclude] or replicas
+            candidates = [min(candidates, key=lambda replica: replica.ejected_until)]
+        # Mélange pour départager les ex æquo sans favoriser la première instance
+        random.shuffle(candidates)
+        return min(candidates, key=self._load)
+
+    def _choose_by_key(self, key, exclude, now):
+        """Première instance de l'anneau disponible et sous la charge maximale autorisée"""
+        available = [replica for replica in self._replicas.values() if replica.url not in exclude and replica.available(now)]
+        if not available:
+            return None
+        total = sum(replica.in_flight for replica in available) + 1
+        capacity = math.ceil(self.load_factor * total / len(available))
+        for position, url in enumerate(self._ring.walk(key)):
+            replica = self._replicas[url]
+            if replica in available and replica.in_flight < capacity:
+                if position == 0:
+                    self.affinity_hits += 1
+                else:
+                    self.affinity_spills += 1
+                return replica
+        return None
+
+    def _load(self, replica):
+        latency = replica.ewma_latency or 0.0
+        if self.strategy == "ewma":
+            return latency * (replica.in_flight + 1), replica.in_flight
+        return replica.in_flight, latency
+
+    @asynccontextmanager
+    async def request(self, exclude=(), key=None):
+        """Réserve une instance le temps d'un appel et enregistre son issue"""
+        replica = self.choose(exclude, key)
+        replica.in_flight += 1
+        start_time = time.perf_counter()
+        try:
+            yield replica
+        except Exception as e:
+            self._record(replica, time.perf_counter() - start_time, failed=is_upstream_failure(e))
+            raise
+        else:
+            self._record(replica, time.perf_counter() - start_time, failed=False)
+        finally:
+            replica.in_flight -= 1
+
+    def _record(self, replica, latency, failed):
+        metrics.UPSTREAM_SECONDS.labels(self.service, "error" if failed else "ok").observe(latency)
+        replica.requests += 1
+        if replica.ewma_latency is None:
+            replica.ewma_latency = latency
+        else:
+            replica.ewma_latency += self.ewma_alpha * (latency - replica.ewma_latency)
+
+        if not failed:
+            if replica.ejections:
+                logger.info(f"Instance {self.service} {replica.url} réadmise")
+            replica.consecutive_failures = 0
+            replica.ejections = 0
+            return
+
+        replica.failures += 1
+        replica.consecutive_failures += 1
+        if replica.consecutive_failures >= self.max_failures:
+            delay = min(self.eject_seconds * 2 ** replica.ejections, self.max_eject_seconds)
+            replica.ejected_until = time.monotonic() + delay
+            replica.ejections += 1
+            logger.warning(
+                f"Instance {self.service} {replica.url} écartée pour {delay:.0f}s "
+                f"({replica.consecutive_failures} échecs consécutifs)"
+            )
+
+    def snapshot(self):
+        now = time.monotonic()
+        snapshot = {"strategy": self.strategy, "replicas": [replica.snapshot(now) for replica in self.replicas()]}
+        if self.hash_affinity:
+            snapshot["affinity"] = {"hits": self.affinity_hits, "spills": self.affinity_spills, "load_factor": self.load_factor}
+        return snapshot
+
+
+def register_pool_metrics(pools):
+    """Jauges par instance (requêtes en cours, latence EWMA, exclusion) exportées sur /metrics"""
+    def samples(attribute):
+        def collect():
+            now = time.monotonic()
+            for pool in pools:
+                for replica in pool.replicas():
+                    yield (pool.service, replica.url), attribute(replica, now)
+        return collect
+
+    labels = ("service", "url")
+    metrics.callback(
+        "holokia_upstream_replica_in_flight", "Requêtes en cours par instance",
+        samples(lambda replica, now: replica.in_flight), labels,
+    )
+    metrics.callback(
+        "holokia_upstream_replica_ewma_latency_seconds", "Latence EWMA par instance",
+        samples(lambda replica, now: replica.ewma_latency), labels,
+    )
+    metrics.callback(
+        "holokia_upstream_replica_ejected", "1 si l'instance est écartée après des échecs",
+        samples(lambda replica, now: 0 if replica.available(now) else 1), labels,
+    )
+    metrics.callback(
+        "holokia_upstream_replica_failures_total", "Échecs par instance",
+        samples(lambda replica, now: replica.failures), labels, type="counter",
+    )
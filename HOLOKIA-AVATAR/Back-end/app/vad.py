@@ -0,0 +1,94 @@
+"""
+Détection d'activité vocale par énergie, vectorisée sur le signal NumPy.
+"""
+
+import numpy as np # type: ignore
+
+SAMPLE_RATE = 16000
+FRAME_MS = 30
+# Plancher pour éviter log10(0) sur le silence numérique
+_EPSILON = 1e-10
+
+
+def frame_size(sample_rate=SAMPLE_RATE, frame_ms=FRAME_MS):
+    return int(sample_rate * frame_ms / 1000)
+
+
+def frame_energy_db(audio, sample_rate=SAMPLE_RATE, frame_ms=FRAME_MS):
+    """Énergie RMS (dBFS) de chaque trame complète du signal float32 [-1, 1]"""
+    size = frame_size(sample_rate, frame_ms)
+    n_frames = len(audio) // size
+    if n_frames == 0:
+        return np.zeros(0, dtype=np.float32)
+    frames = np.asarray(audio[:n_frames * size], dtype=np.float32).reshape(n_frames, size)
+    rms = np.sqrt(np.mean(np.square(frames), axis=1) + _EPSILON)
+    return 20 * np.log10(rms)
+
+
+def pcm16_to_float32(data):
+    """Convertit des octets PCM 16 bits little-endian en float32 [-1, 1]"""
+    return np.frombuffer(data, dtype="<i2").astype(np.float32) / 32768.0
+
+
+def speech_segments(audio, sample_rate=SAMPLE_RATE, threshold_db=-40.0, noise_margin_db=10.0,
+                    min_pause_ms=500, padding_ms=200, min_speech_ms=120, frame_ms=FRAME_MS,
+                    min_dynamic_range_db=20.0):
+    """
+    Repère les zones de parole et renvoie une liste de (début, fin) en échantillons.
+
+    Une trame est de la parole si son énergie dépasse `threshold_db` et, quand le
+    clip a un vrai fond calme (écart d'au moins `min_dynamic_range_db` entre les
+    10e et 90e percentiles), ce bruit de fond + `noise_margin_db`. Sur un clip
+    presque entièrement parlé, le 10e percentile est de la parole : seul
+    `threshold_db` s'applique. Les pauses plus courtes que `min_pause_ms` sont
+    comblées, les zones plus courtes que `min_speech_ms` ignorées, et chaque zone
+    est élargie de `padding_ms`. Si aucune zone n'est retenue alors que le signal
+    dépasse `threshold_db`, le clip entier est renvoyé.
+    """
+    energies = frame_energy_db(audio, sample_rate, frame_ms)
+    if len(energies) == 0:
+        return []
+
+    loud = energies > threshold_db
+    if not loud.any():
+        return []
+    noise_floor, speech_level = np.percentile(energies, [10, 90])
+    if speech_level - noise_floor >= min_dynamic_range_db:
+        is_speech = loud & (energies > noise_floor + noise_margin_db)
+    else:
+        is_speech = loud
+    if not is_speech.any():
+        return [(0, len(audio))]
+
+    # Début/fin de chaque zone de parole à partir des fronts du masque
+    edges = np.diff(np.concatenate(([0], is_speech.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+
+    # Fusion des zones séparées par une pause trop courte
+    min_pause = int(np.ceil(min_pause_ms / frame_ms))
+    keep = np.concatenate(([True], starts[1:] - ends[:-1] >= min_pause))
+    starts = starts[keep]
+    ends = ends[np.concatenate((keep[1:], [True]))]
+
+    min_speech = int(np.ceil(min_speech_ms / frame_ms))
+    long_enough = ends - starts >= min_speech
+    starts, ends = starts[long_enough], ends[long_enough]
+    if len(starts) == 0:
+        # Signal audible mais aucune zone assez longue : mieux vaut tout transcrire que rien
+        return [(0, len(audio))]
+
+    size = frame_size(sample_rate, frame_ms)
+    padding = int(sample_rate * padding_ms / 1000)
+    starts = np.maximum(starts * size - padding, 0)
+    ends = np.minimum(ends * size + padding, len(audio))
+    return list(zip(starts.tolist(), ends.tolist()))
+
+
+def trim_silence(audio, sample_rate=SAMPLE_RATE, **options):
+    """Découpe le signal sur les pauses ; renvoie (segments, offsets en s, secondes supprimées)"""
+    bounds = speech_segments(audio, sample_rate, **options)
+    segments = [audio[start:end] for start, end in bounds]
+    kept = sum(end - start for start, end in bounds)
+    offsets = [start / sample_rate for start, _ in bounds]
+    return segments, offsets, (len(audio) - kept) / sample_rate
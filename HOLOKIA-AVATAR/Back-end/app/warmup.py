@@ -0,0 +1,78 @@
+"""
+Préchauffage des caches au démarrage de l'API principale (HOLOKIA_WARMUP=1,
+ou `start_service.py --warmup`).
+
+Chaque phrase de app/warmup_phrases.yaml passe par /api/generate puis par le
+service TTS, avec un nombre borné de phrases en parallèle : le cache de
+réponses LLM et les MP3 sont prêts avant les premiers utilisateurs. Le service
+ne se déclare prêt qu'à la fin du préchauffage ou à l'expiration du délai ;
+les phrases restantes continuent alors en arrière-plan.
+"""
+
+import asyncio
+import logging
+import time
+
+import yaml # type: ignore
+
+logger = logging.getLogger("avatar-backend")
+
+
+def load_phrases(path):
+    """[(langue, phrase)] dans l'ordre du fichier"""
+    with open(path, "r", encoding="utf-8") as f:
+        config = yaml.safe_load(f) or {}
+    return [(lang, phrase) for lang, phrases in config.items() for phrase in phrases or []]
+
+
+class WarmupProgress:
+    def __init__(self, total):
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.started = time.time()
+        self.finished = None
+        self.deadline_expired = False
+
+    def snapshot(self):
+        return {
+            "total": self.total,
+            "done": self.done,
+            "failed": self.failed,
+            "finished": self.finished is not None,
+            "deadline_expired": self.deadline_expired,
+            "seconds": round((self.finished or time.time()) - self.started, 2),
+        }
+
+
+async def warm_up(phrases, warm_phrase, progress, concurrency=4, deadline=60.0):
+    """Appelle `warm_phrase(phrase, langue)` sur chaque phrase ; rend la main à la fin ou au délai"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def warm(lang, phrase):
+        async with semaphore:
+            try:
+                await warm_phrase(phrase, lang)
+                progress.done += 1
+            except Exception as e:
+                progress.failed += 1
+                logger.warning(f"Préchauffage de '{phrase[:30]}' ({lang}) échoué : {e}")
+            logger.info(f"Préchauffage : {progress.done + progress.failed}/{progress.total}")
+
+    tasks = [asyncio.create_task(warm(lang, phrase)) for lang, phrase in phrases]
+    if not tasks:
+        progress.finished = time.time()
+        return progress
+    _, pending = await asyncio.wait(tasks, timeout=deadline)
+    progress.finished = time.time()
+    if pending:
+        progress.deadline_expired = True
+        logger.warning(
+            f"Délai de préchauffage ({deadline:.0f}s) écoulé : {len(pending)} phrase(s) poursuivies en arrière-plan"
+        )
+    else:
+        logger.info(
+            f"Préchauffage terminé en {progress.finished - progress.started:.1f}s "
+            f"({progress.done} phrase(s), {progress.failed} échec(s))"
+        )
+    return progress
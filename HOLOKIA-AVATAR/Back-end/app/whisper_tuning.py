@@ -0,0 +1,83 @@
+"""
+Profils d'inférence Whisper (threads torch, quantification int8, options de décodage).
+
+Un profil est un dict lu dans la section stt.profiles de lipsync_config.yaml ;
+le profil actif est stt.profile, ou la variable d'environnement STT_PROFILE.
+"""
+
+import logging
+import os
+
+import torch # type: ignore
+import whisper # type: ignore
+
+logger = logging.getLogger("stt-server")
+
+DEFAULT_PROFILE = {
+    "intra_op_threads": None,   # None : valeur par défaut de torch
+    "inter_op_threads": None,
+    "quantize_int8": False,
+    "fp16": None,               # None : fp16 seulement sur GPU
+    "beam_size": None,          # None : décodage glouton
+    "best_of": None,
+    "condition_on_previous_text": True,
+}
+
+
+def resolve_profile(stt_config, name=None):
+    """Renvoie (nom, profil complété avec les valeurs par défaut)"""
+    profiles = stt_config.get("profiles") or {}
+    name = name or os.getenv("STT_PROFILE") or stt_config.get("profile") or "default"
+    if name not in profiles and name != "default":
+        logger.warning(f"Profil STT inconnu '{name}', utilisation du profil par défaut")
+        name = "default"
+    return name, {**DEFAULT_PROFILE, **(profiles.get(name) or {})}
+
+
+def apply_torch_threads(profile):
+    """Fixe le nombre de threads torch du processus (à appeler avant toute inférence)"""
+    if profile.get("intra_op_threads"):
+        torch.set_num_threads(int(profile["intra_op_threads"]))
+    if profile.get("inter_op_threads"):
+        try:
+            torch.set_num_interop_threads(int(profile["inter_op_threads"]))
+        except RuntimeError as e:
+            # Impossible une fois que torch a démarré son pool inter-op
+            logger.warning(f"Threads inter-op non modifiés : {e}")
+
+
+def quantize_int8(model):
+    """Quantification dynamique int8 des couches linéaires (CPU uniquement)"""
+    # whisper.model.Linear ne fait que convertir le dtype des poids : en fp32 c'est
+    # un nn.Linear standard, que quantize_dynamic sait remplacer
+    for module in model.modules():
+        if isinstance(module, whisper.model.Linear):
+            module.__class__ = torch.nn.Linear
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def load_model(model_name, profile, device=None):
+    """Charge Whisper en appliquant les threads et la quantification du profil"""
+    apply_torch_threads(profile)
+    model = whisper.load_model(model_name, device=device)
+    if profile.get("quantize_int8"):
+        if model.device.type != "cpu":
+            logger.warning("Quantification int8 ignorée : disponible uniquement sur CPU")
+        else:
+            model = quantize_int8(model)
+            logger.info("Couches linéaires Whisper quantifiées en int8")
+    return model
+
+
+def decode_options(profile, model):
+    """Options passées à l'ordonnanceur (décodage par lot et model.transcribe)"""
+    fp16 = profile.get("fp16")
+    if fp16 is None or model.device.type == "cpu":
+        # fp16 n'existe pas sur CPU : Whisper repasse en fp32 avec un avertissement
+        fp16 = model.device.type == "cuda"
+    return {
+        "fp16": bool(fp16),
+        "beam_size": profile.get("beam_size"),
+        "best_of": profile.get("best_of"),
+        "condition_on_previous_text": bool(profile.get("condition_on_previous_text", True)),
+    }
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Compare le déploiement en trois processus et le mode monolithe
+(start_service.py --monolith) : mémoire résidente et latence par tour.
+
+Pour chaque disposition, les services sont démarrés avec le LLM et le TTS
+factices de loadtest.py (Whisper est chargé réellement dans les deux cas),
+puis des tours de conversation de samples/conversations.yaml sont joués
+(POST /api/generate puis POST /api/tts sur la réponse). Le script relève la
+mémoire (RSS et USS) de tous les processus de services, au repos puis après la
+charge, et les latences p50/p95/p99 par tour et par endpoint.
+
+    python benchmarks/bench_monolith.py --turns 300 --concurrency 4
+    python benchmarks/bench_monolith.py --layouts monolith --output monolith.json
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import psutil # type: ignore
+import yaml
+
+from loadtest import (
+    CONVERSATIONS_FILE, LoadTest, Recorder, start_services, stop_services, summarize_latencies, wait_until_ready
+)
+
+LAYOUTS = {"services": [], "monolith": ["--monolith"]}
+
+MB = 1024 * 1024
+
+
+def service_memory(supervisor_pid):
+    """RSS et USS (Mo) de chaque processus lancé par start_service.py, et leur somme"""
+    processes = {}
+    for child in psutil.Process(supervisor_pid).children(recursive=True):
+        try:
+            name = " ".join(child.cmdline()[1:2]) or child.name()
+            rss = child.memory_info().rss
+            try:
+                uss = child.memory_full_info().uss
+            except psutil.AccessDenied:
+                uss = None
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            continue
+        processes[f"{name} ({child.pid})"] = {
+            "rss_mb": round(rss / MB, 1),
+            "uss_mb": round(uss / MB, 1) if uss is not None else None,
+        }
+    uss_values = [p["uss_mb"] for p in processes.values()]
+    return {
+        "processes": processes,
+        "rss_mb": round(sum(p["rss_mb"] for p in processes.values()), 1),
+        "uss_mb": round(sum(uss_values), 1) if None not in uss_values else None,
+    }
+
+
+async def play_turns(test, turns, concurrency, seed):
+    """Joue `turns` tours répartis entre `concurrency` utilisateurs ; latences par tour"""
+    latencies = []
+    remaining = turns
+
+    async def user(index):
+        nonlocal remaining
+        rng = random.Random(seed + index)
+        while remaining > 0:
+            conversation = test.pick_conversation(rng)
+            history = []
+            for user_text in conversation["turns"]:
+                if remaining <= 0:
+                    return
+                remaining -= 1
+                start = time.perf_counter()
+                if not await test.run_turn(conversation, history, user_text):
+                    break
+                latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(user(index) for index in range(concurrency)))
+    return latencies
+
+
+async def run_layout(args, layout, data):
+    args.service_args = [*args.base_service_args, *LAYOUTS[layout]]
+    work_dir = Path(tempfile.mkdtemp(prefix=f"holokia-bench-{layout}-"))
+    started = time.perf_counter()
+    process, log_file = start_services(args, work_dir)
+    try:
+        if not await wait_until_ready(args.base_url, args.startup_timeout):
+            print(f"❌ L'API principale ne répond pas ({layout}), voir {work_dir / 'services.log'}")
+            return None
+        startup_s = time.perf_counter() - started
+        idle = service_memory(process.pid)
+
+        test = LoadTest(args.base_url, data["conversations"], data["mix"], timeout=args.timeout)
+        try:
+            await play_turns(test, args.warmup_turns, 1, args.seed)
+            test.recorder = Recorder()
+            start = time.perf_counter()
+            latencies = await play_turns(test, args.turns, args.concurrency, args.seed)
+            elapsed = time.perf_counter() - start
+        finally:
+            await test.client.aclose()
+        loaded = service_memory(process.pid)
+
+        recorder = test.recorder
+        return {
+            "startup_s": round(startup_s, 2),
+            "memory_idle": idle,
+            "memory_loaded": loaded,
+            "turns_per_s": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+            "turn": summarize_latencies(latencies),
+            "endpoints": {endpoint: summarize_latencies(values) for endpoint, values in recorder.latencies.items()},
+            "errors": dict(recorder.errors),
+        }
+    finally:
+        stop_services(process)
+        log_file.close()
+
+
+def print_comparison(results):
+    print(f"\n{'disposition':<12}{'proc.':>6}{'RSS Mo':>9}{'USS Mo':>9}{'tours/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for layout, result in results.items():
+        memory, turn = result["memory_loaded"], result["turn"]
+        print(
+            f"{layout:<12}{len(memory['processes']):>6}{memory['rss_mb']:>9}{memory['uss_mb'] or '-':>9}"
+            f"{result['turns_per_s']:>9}{turn.get('p50_ms', 0):>9}{turn.get('p95_ms', 0):>9}{turn.get('p99_ms', 0):>9}"
+        )
+        for endpoint, stats in result["endpoints"].items():
+            print(f"   {endpoint:<20} p50 {stats.get('p50_ms', 0)} ms, p95 {stats.get('p95_ms', 0)} ms")
+        if result["errors"]:
+            print(f"   erreurs : {result['errors']}")
+    if {"services", "monolith"} <= set(results):
+        before, after = results["services"], results["monolith"]
+        saved = before["memory_loaded"]["rss_mb"] - after["memory_loaded"]["rss_mb"]
+        print(f"\n   Mémoire résidente : {saved:+.1f} Mo économisés en mode monolithe")
+        if before["turn"].get("p50_ms") and after["turn"].get("p50_ms"):
+            delta = (after["turn"]["p50_ms"] - before["turn"]["p50_ms"]) / before["turn"]["p50_ms"]
+            print(f"   Latence par tour p50 : {delta:+.1%} en mode monolithe")
+
+
+async def run(args):
+    with open(args.conversations, "r", encoding="utf-8") as f:
+        data = yaml.safe_load(f)
+    args.base_service_args = list(args.service_args)
+    results = {}
+    for layout in args.layouts:
+        print(f"\n🏗  Disposition {layout}")
+        result = await run_layout(args, layout, data)
+        if result is None:
+            return 1
+        results[layout] = result
+    print_comparison(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"turns": args.turns, "concurrency": args.concurrency, "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 Résultats enregistrés dans {args.output}")
+    return 0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--layouts", nargs="+", choices=list(LAYOUTS), default=list(LAYOUTS))
+    parser.add_argument("--conversations", default=str(CONVERSATIONS_FILE), help="Fichier YAML des conversations")
+    parser.add_argument("--turns", type=int, default=200, help="Tours mesurés par disposition")
+    parser.add_argument("--warmup-turns", type=int, default=20, help="Tours ignorés avant la mesure")
+    parser.add_argument("--concurrency", type=int, default=4, help="Utilisateurs simultanés")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--base-url", default="http://localhost:5001", help="URL de l'API principale")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Timeout des requêtes (s)")
+    parser.add_argument("--real-backends", action="store_true", help="Groq et gTTS réels au lieu des backends factices")
+    parser.add_argument("--llm-latency-ms", type=float, default=300, help="Latence simulée du LLM factice")
+    parser.add_argument("--tts-latency-ms", type=float, default=200, help="Latence simulée du TTS factice")
+    parser.add_argument("--startup-timeout", type=float, default=180, help="Attente maximale du démarrage des services")
+    parser.add_argument("--service-args", nargs=argparse.REMAINDER, default=[],
+                        help="Arguments passés à start_service.py pour les deux dispositions")
+    parser.add_argument("--output", help="Fichier JSON des résultats")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(run(parse_args())))
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Benchmark du décodage Whisper : chemin un-par-un actuel vs ordonnanceur par lots.
+
+Les clips sont lus dans un dossier (par défaut les MP3 générés par le TTS dans
+lipsync-demo/public/audios) puis soumis par N clients concurrents. Le script
+affiche le débit (clips/s) et les latences p50/p95 de chaque mode, sur CPU.
+
+    python benchmarks/bench_stt_batching.py --concurrency 8 --requests 64
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent / "app"
+sys.path.insert(0, str(APP_DIR))
+
+import whisper # type: ignore
+from stt_batching import WhisperBatchScheduler, MAX_BATCH_SAMPLES, SAMPLE_RATE
+
+DEFAULT_AUDIO_DIR = APP_DIR / "../../lipsync-demo/public/audios"
+
+
+def load_clips(audio_dir, max_clips):
+    """Charge les clips courts (< 30 s) du dossier en float32 16 kHz"""
+    clips = []
+    for path in sorted(Path(audio_dir).glob("*")):
+        if path.suffix.lower() not in (".wav", ".mp3", ".webm", ".ogg", ".m4a"):
+            continue
+        audio = whisper.load_audio(str(path))
+        if 0 < len(audio) <= MAX_BATCH_SAMPLES:
+            clips.append(audio)
+        if len(clips) >= max_clips:
+            break
+    return clips
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def run_load(transcribe, clips, concurrency, total_requests, language):
+    """Lance `concurrency` clients qui enchaînent les requêtes jusqu'à `total_requests`"""
+    latencies = []
+    counter = iter(range(total_requests))
+
+    async def client():
+        for index in counter:
+            start = time.perf_counter()
+            await transcribe(clips[index % len(clips)], language)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return time.perf_counter() - start, latencies
+
+
+def report(label, elapsed, latencies):
+    print(
+        f"{label:<12} {len(latencies) / elapsed:8.2f} clips/s   "
+        f"p50 {statistics.median(latencies):6.3f}s   p95 {percentile(latencies, 95):6.3f}s"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="base")
+    parser.add_argument("--audio-dir", default=str(DEFAULT_AUDIO_DIR))
+    parser.add_argument("--max-clips", type=int, default=32)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--language", default=None, help="Langue imposée (détection automatique sinon)")
+    parser.add_argument("--max-batch-size", type=int, default=8)
+    parser.add_argument("--max-wait-ms", type=float, default=30)
+    args = parser.parse_args()
+
+    clips = load_clips(args.audio_dir, args.max_clips)
+    if not clips:
+        print(f"❌ Aucun clip audio (< 30 s) trouvé dans {args.audio_dir}")
+        return
+    durations = [len(clip) / SAMPLE_RATE for clip in clips]
+    print(f"🎧 {len(clips)} clips, durée moyenne {statistics.mean(durations):.1f}s")
+
+    model = whisper.load_model(args.model, device="cpu")
+
+    # Chemin actuel : un model.transcribe à la fois
+    executor = ThreadPoolExecutor(max_workers=1)
+
+    async def sequential(audio, language):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            executor, lambda: model.transcribe(audio, language=language, task="transcribe", fp16=False)
+        )
+
+    scheduler = WhisperBatchScheduler(model, args.max_batch_size, args.max_wait_ms)
+
+    # Préchauffage pour ne pas compter l'initialisation de torch
+    await sequential(clips[0], args.language)
+    await scheduler.transcribe(clips[0], args.language)
+
+    print(f"⚙  {args.requests} requêtes, {args.concurrency} clients concurrents")
+    report("séquentiel", *await run_load(sequential, clips, args.concurrency, args.requests, args.language))
+    report("par lots", *await run_load(scheduler.transcribe, clips, args.concurrency, args.requests, args.language))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Compare les profils d'inférence Whisper (stt.profiles de lipsync_config.yaml).
+
+Pour chaque profil, le modèle est chargé dans un processus séparé (les threads
+torch ne sont réglables qu'une fois par processus), puis le jeu d'échantillons
+de samples/stt_samples.yaml est transcrit. Le script affiche le facteur temps
+réel (RTF = temps de calcul / durée audio) et le taux d'erreur de mots (WER).
+
+    python benchmarks/bench_stt_profiles.py --synthesize
+    python benchmarks/bench_stt_profiles.py --profiles default cpu_fast
+"""
+
+import argparse
+import json
+import multiprocessing
+import sys
+import time
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import yaml
+
+BENCH_DIR = Path(__file__).resolve().parent
+APP_DIR = BENCH_DIR.parent / "app"
+SAMPLES_FILE = BENCH_DIR / "samples" / "stt_samples.yaml"
+AUDIO_DIR = BENCH_DIR / "samples" / "audio"
+sys.path.insert(0, str(APP_DIR))
+
+
+def load_samples():
+    with open(SAMPLES_FILE, "r", encoding="utf-8") as f:
+        return yaml.safe_load(f)["samples"]
+
+
+def synthesize_missing(samples):
+    """Génère avec gTTS l'audio des échantillons absents"""
+    from gtts import gTTS # type: ignore
+
+    AUDIO_DIR.mkdir(parents=True, exist_ok=True)
+    for sample in samples:
+        path = AUDIO_DIR / f"{sample['id']}.mp3"
+        if not path.exists():
+            print(f"🔊 Synthèse de {sample['id']}...")
+            gTTS(text=sample["text"], lang=sample["lang"], slow=False).save(str(path))
+
+
+def normalize_words(text):
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = "".join(" " if unicodedata.category(char).startswith("P") else char for char in text)
+    return text.split()
+
+
+def word_errors(reference, hypothesis):
+    """Distance d'édition en mots (substitutions + insertions + suppressions)"""
+    ref, hyp = normalize_words(reference), normalize_words(hypothesis)
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        current = [i]
+        for j, hyp_word in enumerate(hyp, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_word != hyp_word)))
+        previous = current
+    return previous[-1], len(ref)
+
+
+def run_profile(model_name, profile_name, stt_config, samples):
+    """Exécuté dans un processus dédié : charge le modèle et transcrit le jeu d'échantillons"""
+    import whisper # type: ignore
+    import whisper_tuning
+
+    _, profile = whisper_tuning.resolve_profile(stt_config, profile_name)
+    load_start = time.perf_counter()
+    model = whisper_tuning.load_model(model_name, profile, device="cpu")
+    load_time = time.perf_counter() - load_start
+    options = whisper_tuning.decode_options(profile, model)
+
+    def transcribe(audio, language):
+        return model.transcribe(
+            audio,
+            language=language,
+            task="transcribe",
+            fp16=options["fp16"],
+            beam_size=options["beam_size"],
+            best_of=options["best_of"],
+            condition_on_previous_text=options["condition_on_previous_text"],
+        )
+
+    clips = [(sample, whisper.load_audio(str(AUDIO_DIR / f"{sample['id']}.mp3"))) for sample in samples]
+    # Préchauffage
+    transcribe(clips[0][1], clips[0][0]["lang"])
+
+    rows = []
+    for sample, audio in clips:
+        start = time.perf_counter()
+        result = transcribe(audio, sample["lang"])
+        elapsed = time.perf_counter() - start
+        errors, words = word_errors(sample["text"], result["text"])
+        rows.append({
+            "id": sample["id"],
+            "lang": sample["lang"],
+            "audio_seconds": len(audio) / whisper.audio.SAMPLE_RATE,
+            "compute_seconds": elapsed,
+            "errors": errors,
+            "words": words,
+            "text": result["text"].strip(),
+        })
+    return {"profile": profile_name, "settings": profile, "load_seconds": load_time, "samples": rows}
+
+
+def summarize(rows):
+    audio = sum(row["audio_seconds"] for row in rows)
+    compute = sum(row["compute_seconds"] for row in rows)
+    errors = sum(row["errors"] for row in rows)
+    words = sum(row["words"] for row in rows)
+    return compute / audio if audio else 0.0, errors / words if words else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profiles", nargs="*", help="Profils à comparer (tous par défaut)")
+    parser.add_argument("--model", help="Taille du modèle (stt.model par défaut)")
+    parser.add_argument("--synthesize", action="store_true", help="Générer l'audio manquant avec gTTS")
+    parser.add_argument("--output", help="Fichier JSON où enregistrer les résultats détaillés")
+    args = parser.parse_args()
+
+    with open(APP_DIR / "lipsync_config.yaml", "r", encoding="utf-8") as f:
+        stt_config = (yaml.safe_load(f) or {}).get("stt") or {}
+    model_name = args.model or stt_config.get("model", "base")
+    profiles = args.profiles or ["default", *[name for name in (stt_config.get("profiles") or {}) if name != "default"]]
+
+    samples = load_samples()
+    if args.synthesize:
+        synthesize_missing(samples)
+    missing = [sample["id"] for sample in samples if not (AUDIO_DIR / f"{sample['id']}.mp3").exists()]
+    if missing:
+        print(f"❌ Audio manquant pour {', '.join(missing)} : relancer avec --synthesize")
+        return
+
+    results = []
+    context = multiprocessing.get_context("spawn")
+    for profile_name in profiles:
+        print(f"⚙  Profil {profile_name} (modèle {model_name})...")
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            results.append(executor.submit(run_profile, model_name, profile_name, stt_config, samples).result())
+
+    print(f"\n{'profil':<16}{'chargement':>12}{'RTF':>8}{'WER':>8}   WER par langue")
+    for result in results:
+        rtf, wer = summarize(result["samples"])
+        per_lang = []
+        for lang in sorted({row["lang"] for row in result["samples"]}):
+            _, lang_wer = summarize([row for row in result["samples"] if row["lang"] == lang])
+            per_lang.append(f"{lang} {lang_wer:.1%}")
+        print(f"{result['profile']:<16}{result['load_seconds']:>11.1f}s{rtf:>8.3f}{wer:>8.1%}   {', '.join(per_lang)}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 Résultats enregistrés dans {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Compare le coût du saut API principale -> service TTS en TCP loopback et par
+socket Unix (start_service.py --uds).
+
+Pour chaque transport, les services sont démarrés avec les backends factices
+de loadtest.py, une phrase est synthétisée une fois, puis /api/tts est appelé
+en boucle sur cette même phrase : le TTS répond depuis son cache et la latence
+mesurée est essentiellement celle du proxy. Le script affiche les latences de
+bout en bout et celles de l'étape « tts » vue par l'API principale (en-tête
+Server-Timing), en séquentiel puis à concurrence fixe.
+
+    python benchmarks/bench_uds.py --requests 2000 --concurrency 16
+    python benchmarks/bench_uds.py --output uds.json --service-args --instances tts=2
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx # type: ignore
+
+from loadtest import parse_server_timing, start_services, stop_services, summarize_latencies, wait_until_ready
+
+PHRASE = {"text": "Bonjour, ceci est une phrase de test du transport.", "lang": "fr"}
+TRANSPORTS = {"tcp": [], "uds": ["--uds"]}
+
+
+async def measure(client, base_url, requests, concurrency):
+    """Latences de bout en bout et de l'étape tts, avec `concurrency` requêtes en parallèle"""
+    totals, hops, errors = [], [], 0
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            try:
+                response = await client.post(f"{base_url}/api/tts", json=PHRASE)
+                response.raise_for_status()
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            totals.append(time.perf_counter() - start)
+            stage = parse_server_timing(response.headers.get("server-timing")).get("tts")
+            if stage is not None:
+                hops.append(stage)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        "concurrency": concurrency,
+        "throughput_rps": round(len(totals) / elapsed, 1) if elapsed else 0.0,
+        "errors": errors,
+        "end_to_end": summarize_latencies(totals),
+        "tts_hop": summarize_latencies(hops),
+    }
+
+
+async def run_transport(args, transport):
+    args.service_args = [*args.base_service_args, *TRANSPORTS[transport]]
+    work_dir = Path(tempfile.mkdtemp(prefix=f"holokia-bench-{transport}-"))
+    process, log_file = start_services(args, work_dir)
+    try:
+        if not await wait_until_ready(args.base_url, args.startup_timeout):
+            print(f"❌ L'API principale ne répond pas ({transport}), voir {work_dir / 'services.log'}")
+            return None
+        async with httpx.AsyncClient(timeout=args.timeout) as client:
+            # Première synthèse : les mesures suivantes sont des succès de cache TTS
+            (await client.post(f"{args.base_url}/api/tts", json=PHRASE)).raise_for_status()
+            await measure(client, args.base_url, args.warmup_requests, 1)
+            return {
+                "sequential": await measure(client, args.base_url, args.requests, 1),
+                "concurrent": await measure(client, args.base_url, args.requests, args.concurrency),
+            }
+    finally:
+        stop_services(process)
+        log_file.close()
+
+
+def print_comparison(results):
+    print(f"\n{'mode':<12}{'transport':<10}{'req/s':>8}{'e2e p50':>10}{'e2e p95':>10}{'hop p50':>10}{'hop p95':>10}")
+    for mode in ("sequential", "concurrent"):
+        for transport, result in results.items():
+            stats = result[mode]
+            e2e, hop = stats["end_to_end"], stats["tts_hop"]
+            print(
+                f"{mode:<12}{transport:<10}{stats['throughput_rps']:>8}"
+                f"{e2e.get('p50_ms', 0):>10}{e2e.get('p95_ms', 0):>10}{hop.get('p50_ms', 0):>10}{hop.get('p95_ms', 0):>10}"
+            )
+    if len(results) == 2:
+        for mode in ("sequential", "concurrent"):
+            tcp, uds = results["tcp"][mode]["tts_hop"], results["uds"][mode]["tts_hop"]
+            if tcp.get("p50_ms") and uds.get("p50_ms"):
+                delta = (uds["p50_ms"] - tcp["p50_ms"]) / tcp["p50_ms"]
+                print(f"   Saut TTS p50 ({mode}) : {delta:+.1%} avec le socket Unix")
+
+
+async def run(args):
+    args.base_service_args = list(args.service_args)
+    results = {}
+    for transport in args.transports:
+        print(f"\n🔌 Transport {transport}")
+        result = await run_transport(args, transport)
+        if result is None:
+            return 1
+        results[transport] = result
+    print_comparison(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"phrase": PHRASE, "requests": args.requests, "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 Résultats enregistrés dans {args.output}")
+    return 0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--transports", nargs="+", choices=list(TRANSPORTS), default=list(TRANSPORTS))
+    parser.add_argument("--requests", type=int, default=1000, help="Requêtes mesurées par mode")
+    parser.add_argument("--warmup-requests", type=int, default=50, help="Requêtes ignorées avant la mesure")
+    parser.add_argument("--concurrency", type=int, default=16, help="Requêtes en parallèle du mode concurrent")
+    parser.add_argument("--base-url", default="http://localhost:5001", help="URL de l'API principale")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Timeout des requêtes (s)")
+    parser.add_argument("--real-backends", action="store_true", help="Groq et gTTS réels au lieu des backends factices")
+    parser.add_argument("--llm-latency-ms", type=float, default=300, help="Latence simulée du LLM factice")
+    parser.add_argument("--tts-latency-ms", type=float, default=200, help="Latence simulée du TTS factice")
+    parser.add_argument("--startup-timeout", type=float, default=180, help="Attente maximale du démarrage des services")
+    parser.add_argument("--service-args", nargs=argparse.REMAINDER, default=[],
+                        help="Arguments passés à start_service.py pour les deux transports")
+    parser.add_argument("--output", help="Fichier JSON des résultats")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(run(parse_args())))
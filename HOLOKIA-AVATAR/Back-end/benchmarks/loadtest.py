@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+Test de charge de bout en bout de l'API principale.
+
+Le script démarre les trois services via start_service.py avec un LLM et un TTS
+factices (LLM_BACKEND=stub, TTS_BACKEND=stub, voir app/stubs.py), puis rejoue
+le mélange de conversations fr/en/ar de samples/conversations.yaml, soit à
+concurrence fixe (--concurrency, boucle fermée), soit à débit cible
+(--rate tours/s, arrivées de Poisson). Il affiche le débit, les latences
+p50/p95/p99 par endpoint et par étape (en-têtes Server-Timing), les taux
+d'erreur et de succès des caches (métriques /metrics), et enregistre le tout
+en JSON pour comparer les exécutions.
+
+    python benchmarks/loadtest.py --concurrency 8 --duration 60 --output run.json
+    python benchmarks/loadtest.py --rate 5 --duration 120 --compare run.json
+    python benchmarks/loadtest.py --no-start --base-url http://localhost:5001
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import httpx # type: ignore
+import yaml
+
+BENCH_DIR = Path(__file__).resolve().parent
+BACKEND_DIR = BENCH_DIR.parent
+CONVERSATIONS_FILE = BENCH_DIR / "samples" / "conversations.yaml"
+
+# Au-delà de cet écart relatif avec la référence, une métrique est signalée
+DEFAULT_TOLERANCE = 0.10
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize_latencies(values):
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean_ms": round(sum(values) / len(values) * 1000, 2),
+        "p50_ms": round(percentile(values, 50) * 1000, 2),
+        "p95_ms": round(percentile(values, 95) * 1000, 2),
+        "p99_ms": round(percentile(values, 99) * 1000, 2),
+    }
+
+
+def parse_server_timing(header):
+    stages = {}
+    for entry in (header or "").split(","):
+        name, _, params = entry.strip().partition(";")
+        match = re.search(r"dur=([0-9.]+)", params)
+        if name and match:
+            stages[name] = stages.get(name, 0.0) + float(match.group(1)) / 1000
+    return stages
+
+
+def parse_cache_counters(text):
+    """holokia_cache_requests_total{cache="...",result="..."} -> {(cache, result): valeur}"""
+    counters = defaultdict(float)
+    pattern = re.compile(r'^holokia_cache_requests_total\{cache="([^"]+)",result="([^"]+)"\} ([0-9.e+-]+)$')
+    for line in text.splitlines():
+        match = pattern.match(line)
+        if match:
+            counters[(match.group(1), match.group(2))] += float(match.group(3))
+    return counters
+
+
+class Recorder:
+    """Latences, erreurs et étapes par endpoint"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.stages = defaultdict(lambda: defaultdict(list))
+        self.turns = 0
+
+    def record(self, endpoint, elapsed, response=None, error=None):
+        if error is not None or response is None or response.status_code >= 400:
+            self.errors[endpoint] += 1
+        else:
+            self.latencies[endpoint].append(elapsed)
+            for stage, duration in parse_server_timing(response.headers.get("server-timing")).items():
+                self.stages[endpoint][stage].append(duration)
+
+
+class LoadTest:
+    def __init__(self, base_url, conversations, mix, timeout=60.0):
+        self.base_url = base_url.rstrip("/")
+        self.conversations = conversations
+        self.languages = [lang for lang in mix if any(c["lang"] == lang for c in conversations)]
+        self.weights = [mix[lang] for lang in self.languages]
+        self.recorder = Recorder()
+        self.client = httpx.AsyncClient(timeout=timeout)
+
+    def pick_conversation(self, rng):
+        lang = rng.choices(self.languages, self.weights)[0]
+        return rng.choice([c for c in self.conversations if c["lang"] == lang])
+
+    async def post(self, endpoint, payload):
+        start = time.perf_counter()
+        try:
+            response = await self.client.post(f"{self.base_url}{endpoint}", json=payload)
+        except Exception as e:
+            self.recorder.record(endpoint, time.perf_counter() - start, error=e)
+            return None
+        self.recorder.record(endpoint, time.perf_counter() - start, response)
+        return response if response.status_code < 400 else None
+
+    async def run_turn(self, conversation, history, user_text):
+        history.append({"role": "user", "content": user_text})
+        response = await self.post("/api/generate", {"history": history[-5:], "detectedLanguage": conversation["lang"]})
+        if response is None:
+            return False
+        reply = response.json().get("text", "")
+        history.append({"role": "assistant", "content": reply})
+        await self.post("/api/tts", {"text": reply, "lang": conversation["lang"]})
+        self.recorder.turns += 1
+        return True
+
+    async def run_conversation(self, rng, deadline):
+        conversation = self.pick_conversation(rng)
+        history = []
+        for user_text in conversation["turns"]:
+            if time.perf_counter() >= deadline or not await self.run_turn(conversation, history, user_text):
+                return
+
+    async def closed_loop(self, concurrency, duration, seed):
+        """`concurrency` utilisateurs enchaînent des conversations sans pause"""
+        deadline = time.perf_counter() + duration
+
+        async def user(index):
+            rng = random.Random(seed + index)
+            while time.perf_counter() < deadline:
+                await self.run_conversation(rng, deadline)
+
+        await asyncio.gather(*(user(index) for index in range(concurrency)))
+
+    async def open_loop(self, rate, duration, seed):
+        """Arrivées de Poisson à `rate` tours/s, indépendantes des temps de réponse"""
+        rng = random.Random(seed)
+        deadline = time.perf_counter() + duration
+        tasks = []
+        while time.perf_counter() < deadline:
+            conversation = self.pick_conversation(rng)
+            history = []
+            # Un tour isolé tiré de la conversation, avec l'historique qui le précède
+            turn_index = rng.randrange(len(conversation["turns"]))
+            for previous in conversation["turns"][:turn_index]:
+                history.extend([{"role": "user", "content": previous}, {"role": "assistant", "content": "..."}])
+            tasks.append(asyncio.create_task(self.run_turn(conversation, history, conversation["turns"][turn_index])))
+            await asyncio.sleep(rng.expovariate(rate))
+        await asyncio.gather(*tasks)
+
+    async def scrape_cache_counters(self):
+        """Compteurs de cache de l'API principale et de chaque instance TTS"""
+        urls = [self.base_url]
+        try:
+            upstreams = (await self.client.get(f"{self.base_url}/api/upstreams")).json()
+            urls += [replica["url"] for replica in upstreams["tts"]["replicas"]]
+        except Exception:
+            pass
+        counters = defaultdict(float)
+        for url in urls:
+            try:
+                response = await self.client.get(f"{url}/metrics")
+                for key, value in parse_cache_counters(response.text).items():
+                    counters[key] += value
+            except Exception:
+                continue
+        return counters
+
+
+def cache_ratios(before, after):
+    ratios = {}
+    for cache in sorted({cache for cache, _ in after}):
+        hits = after.get((cache, "hit"), 0) - before.get((cache, "hit"), 0)
+        misses = after.get((cache, "miss"), 0) - before.get((cache, "miss"), 0)
+        if hits + misses:
+            ratios[cache] = {"hits": int(hits), "misses": int(misses), "hit_ratio": round(hits / (hits + misses), 4)}
+    return ratios
+
+
+def build_results(args, recorder, elapsed, caches, mode=None):
+    endpoints = {}
+    for endpoint in sorted(set(recorder.latencies) | set(recorder.errors)):
+        ok = len(recorder.latencies[endpoint])
+        errors = recorder.errors[endpoint]
+        endpoints[endpoint] = {
+            **summarize_latencies(recorder.latencies[endpoint]),
+            "errors": errors,
+            "error_rate": round(errors / (ok + errors), 4) if ok + errors else 0.0,
+            "throughput_rps": round(ok / elapsed, 3),
+            "stages": {stage: summarize_latencies(values) for stage, values in sorted(recorder.stages[endpoint].items())},
+        }
+    return {
+        "timestamp": time.time(),
+        "settings": {
+            "mode": mode or ("rate" if args.rate else "concurrency"),
+            "concurrency": args.concurrency,
+            "rate": args.rate,
+            "duration": args.duration,
+            "stubs": not args.real_backends,
+            "llm_latency_ms": args.llm_latency_ms,
+            "tts_latency_ms": args.tts_latency_ms,
+        },
+        "elapsed_seconds": round(elapsed, 3),
+        "turns": recorder.turns,
+        "turns_per_second": round(recorder.turns / elapsed, 3),
+        "endpoints": endpoints,
+        "caches": caches,
+    }
+
+
+def print_results(results):
+    print(f"\n📊 {results['turns']} tours en {results['elapsed_seconds']:.1f}s ({results['turns_per_second']:.2f} tours/s)")
+    print(f"\n{'endpoint':<16}{'req/s':>8}{'p50':>10}{'p95':>10}{'p99':>10}{'erreurs':>10}")
+    for endpoint, stats in results["endpoints"].items():
+        if stats["count"]:
+            print(
+                f"{endpoint:<16}{stats['throughput_rps']:>8.2f}{stats['p50_ms']:>8.0f}ms"
+                f"{stats['p95_ms']:>8.0f}ms{stats['p99_ms']:>8.0f}ms{stats['error_rate']:>10.1%}"
+            )
+        else:
+            print(f"{endpoint:<16}{'-':>8}{'-':>10}{'-':>10}{'-':>10}{stats['error_rate']:>10.1%}")
+        for stage, stage_stats in stats["stages"].items():
+            if stage_stats["count"]:
+                print(f"  └ {stage:<12}{'':>8}{stage_stats['p50_ms']:>8.0f}ms{stage_stats['p95_ms']:>8.0f}ms{stage_stats['p99_ms']:>8.0f}ms")
+    if results["caches"]:
+        print("\n🗃  Caches")
+        for cache, stats in results["caches"].items():
+            print(f"   {cache:<16} {stats['hit_ratio']:6.1%}  ({stats['hits']} hits / {stats['misses']} misses)")
+
+
+def compare_results(results, baseline, tolerance):
+    """Signale les dégradations de débit, de latence p95 et d'erreurs par rapport à la référence"""
+    regressions = []
+    if baseline.get("turns_per_second") and results["turns_per_second"] < baseline["turns_per_second"] * (1 - tolerance):
+        regressions.append(f"débit {baseline['turns_per_second']:.2f} -> {results['turns_per_second']:.2f} tours/s")
+    for endpoint, stats in results["endpoints"].items():
+        reference = baseline.get("endpoints", {}).get(endpoint)
+        if not reference or not reference.get("count") or not stats.get("count"):
+            continue
+        if stats["p95_ms"] > reference["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{endpoint} p95 {reference['p95_ms']:.0f} -> {stats['p95_ms']:.0f} ms")
+        if stats["error_rate"] > reference["error_rate"] + 0.01:
+            regressions.append(f"{endpoint} erreurs {reference['error_rate']:.1%} -> {stats['error_rate']:.1%}")
+    return regressions
+
+
+def start_services(args, work_dir, extra_env=None):
+    env = {**os.environ, **(extra_env or {})}
+    if not args.real_backends:
+        env.update({
+            "LLM_BACKEND": "stub",
+            "TTS_BACKEND": "stub",
+            "STUB_LLM_LATENCY_MS": str(args.llm_latency_ms),
+            "STUB_TTS_LATENCY_MS": str(args.tts_latency_ms),
+            # Audio factice hors du cache réel de public/audios
+            "TTS_OUTPUT_DIR": str(work_dir / "audios"),
+        })
+    command = [sys.executable, "start_service.py", *args.service_args]
+    log_path = work_dir / "services.log"
+    print(f"🚀 Démarrage des services ({' '.join(command[1:])}), logs dans {log_path}")
+    log_file = open(log_path, "w", encoding="utf-8")
+    return subprocess.Popen(command, cwd=BACKEND_DIR, env=env, stdout=log_file, stderr=subprocess.STDOUT), log_file
+
+
+def stop_services(process):
+    if process.poll() is not None:
+        return
+    process.send_signal(signal.SIGINT if os.name != "nt" else signal.CTRL_C_EVENT)
+    try:
+        process.wait(timeout=20)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+async def wait_until_ready(base_url, timeout):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(timeout=2.0) as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(f"{base_url}/api/upstreams")).status_code == 200:
+                    return True
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.5)
+    return False
+
+
+async def run(args):
+    with open(args.conversations, "r", encoding="utf-8") as f:
+        data = yaml.safe_load(f)
+    mix = dict(data.get("mix") or {})
+    for item in args.mix or []:
+        lang, _, weight = item.partition("=")
+        mix[lang] = float(weight)
+
+    work_dir = Path(tempfile.mkdtemp(prefix="holokia-loadtest-"))
+    process = log_file = None
+    if not args.no_start:
+        process, log_file = start_services(args, work_dir)
+    try:
+        if not await wait_until_ready(args.base_url, args.startup_timeout):
+            print(f"❌ L'API principale ne répond pas sur {args.base_url}")
+            return 1
+
+        test = LoadTest(args.base_url, data["conversations"], mix)
+        before = await test.scrape_cache_counters()
+        mode = f"{args.rate} tours/s" if args.rate else f"{args.concurrency} utilisateurs"
+        print(f"⏱  Charge : {mode} pendant {args.duration}s")
+        start = time.perf_counter()
+        if args.rate:
+            await test.open_loop(args.rate, args.duration, args.seed)
+        else:
+            await test.closed_loop(args.concurrency, args.duration, args.seed)
+        elapsed = time.perf_counter() - start
+        caches = cache_ratios(before, await test.scrape_cache_counters())
+        await test.client.aclose()
+    finally:
+        if process:
+            stop_services(process)
+            log_file.close()
+
+    results = build_results(args, test.recorder, elapsed, caches)
+    print_results(results)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 Résultats enregistrés dans {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare_results(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n❌ Régressions par rapport à {args.compare} :")
+            for regression in regressions:
+                print(f"   - {regression}")
+            return 1
+        print(f"\n✅ Pas de régression par rapport à {args.compare} (tolérance {args.tolerance:.0%})")
+    return 0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:5001", help="URL de l'API principale")
+    parser.add_argument("--conversations", default=str(CONVERSATIONS_FILE), help="Fichier YAML des conversations")
+    parser.add_argument("--mix", nargs="*", metavar="LANG=POIDS", help="Remplace le mélange de langues (ex. fr=1 en=1)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Utilisateurs simultanés (boucle fermée)")
+    parser.add_argument("--rate", type=float, help="Débit cible en tours/s (boucle ouverte, remplace --concurrency)")
+    parser.add_argument("--duration", type=float, default=60, help="Durée de la charge en secondes")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-start", action="store_true", help="Utiliser des services déjà démarrés")
+    parser.add_argument("--real-backends", action="store_true", help="Groq et gTTS réels au lieu des backends factices")
+    parser.add_argument("--llm-latency-ms", type=float, default=300, help="Latence simulée du LLM factice")
+    parser.add_argument("--tts-latency-ms", type=float, default=200, help="Latence simulée du TTS factice")
+    parser.add_argument("--startup-timeout", type=float, default=180, help="Attente maximale du démarrage des services")
+    parser.add_argument("--service-args", nargs=argparse.REMAINDER, default=[],
+                        help="Arguments passés à start_service.py (ex. --instances tts=2)")
+    parser.add_argument("--output", help="Fichier JSON des résultats")
+    parser.add_argument("--compare", help="Résultats de référence (JSON) à comparer")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="Écart relatif toléré")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(run(parse_args())))
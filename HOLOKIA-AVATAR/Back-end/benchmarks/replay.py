@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Rejoue une capture de trafic de l'API principale (CAPTURE_PATH, voir
+app/capture.py) en respectant les instants d'arrivée, à vitesse 1x à Nx.
+
+Les requêtes sont reconstruites à partir des métadonnées capturées : même
+langue, même longueur d'historique et de texte, et un contenu répété quand la
+capture indique un succès de cache, nouveau sinon. Les services sont démarrés
+avec les backends factices de loadtest.py ; les réglages à dimensionner
+(taille du sémaphore TTS, taille du cache LLM, nombre d'instances) se passent
+en options. Le script affiche latences et erreurs par endpoint, taux de succès
+des caches (capturé et rejoué) et l'occupation observée des files d'attente.
+
+    python benchmarks/replay.py capture.jsonl --speed 4
+    python benchmarks/replay.py capture.jsonl --speed 2 --tts-concurrency 10 --llm-cache-size 2000 \\
+        --service-args --instances tts=2
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import re
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from loadtest import (
+    LoadTest, build_results, cache_ratios, print_results, start_services, stop_services, wait_until_ready,
+)
+
+REPLAYED_ENDPOINTS = ("/api/generate", "/api/tts", "/api/stt")
+
+FILLER_WORDS = {
+    "fr": "bonjour je voudrais savoir comment cela fonctionne aujourd'hui merci".split(),
+    "en": "hello I would like to know how this works today thank you".split(),
+    "ar": "مرحبا أريد أن أعرف كيف يعمل هذا اليوم شكرا".split(),
+}
+
+# Jauges suivies pendant le rejeu (somme sur les instances)
+SAMPLED_GAUGES = {
+    "tts_waiting": "holokia_tts_synthesis_waiting",
+    "tts_active": "holokia_tts_synthesis_active",
+    "in_flight": "holokia_http_requests_in_flight",
+    "whisper_queue": "holokia_whisper_queue_depth",
+}
+
+# Contenus déjà envoyés dont on tire les répétitions (succès de cache capturés)
+REUSE_WINDOW = 200
+
+
+def load_capture(path, endpoints=REPLAYED_ENDPOINTS):
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get("e") in endpoints:
+                records.append(record)
+    records.sort(key=lambda record: record["t"])
+    return records
+
+
+def parse_gauges(text):
+    values = defaultdict(float)
+    for line in text.splitlines():
+        match = re.match(r"^([a-z_]+)(\{[^}]*\})? ([0-9.e+-]+)$", line)
+        if match:
+            values[match.group(1)] += float(match.group(3))
+    return values
+
+
+class PayloadFactory:
+    """Reconstruit des requêtes plausibles à partir des métadonnées capturées"""
+
+    def __init__(self, seed):
+        self.rng = random.Random(seed)
+        self.counter = 0
+        self.sent = defaultdict(list)
+
+    def text(self, lang, length):
+        self.counter += 1
+        words = FILLER_WORDS.get(lang, FILLER_WORDS["en"])
+        text = f"{self.counter}"
+        while len(text) < length:
+            text += " " + self.rng.choice(words)
+        return text[:max(length, len(str(self.counter)))]
+
+    def _reuse_or_create(self, kind, record, create):
+        pool = self.sent[(kind, record.get("l"))]
+        if record.get("c") == "hit" and pool:
+            return self.rng.choice(pool[-REUSE_WINDOW:])
+        payload = create()
+        pool.append(payload)
+        return payload
+
+    def generate(self, record):
+        lang = record.get("l") or "en"
+
+        def create():
+            history = []
+            for index in range(max(0, record.get("h", 1) - 1)):
+                role = "user" if index % 2 == 0 else "assistant"
+                history.append({"role": role, "content": self.text(lang, 40)})
+            history.append({"role": "user", "content": self.text(lang, record.get("n", 40))})
+            return {"history": history, "detectedLanguage": lang}
+
+        return self._reuse_or_create("generate", record, create)
+
+    def tts(self, record):
+        lang = record.get("l") or "en"
+        return self._reuse_or_create("tts", record, lambda: {"text": self.text(lang, record.get("n", 80)), "lang": lang})
+
+
+class Replayer:
+    def __init__(self, test, factory, audio_files):
+        self.test = test
+        self.factory = factory
+        self.audio_files = audio_files
+        self.skipped = 0
+        self.samples = defaultdict(list)
+
+    async def send(self, record):
+        endpoint = record["e"]
+        if endpoint == "/api/generate":
+            await self.test.post(endpoint, self.factory.generate(record))
+        elif endpoint == "/api/tts":
+            await self.test.post(endpoint, self.factory.tts(record))
+        elif endpoint == "/api/stt" and self.audio_files:
+            await self.upload(record)
+        else:
+            self.skipped += 1
+
+    async def upload(self, record):
+        path = self.factory.rng.choice(self.audio_files)
+        params = {"language": record["l"]} if record.get("l") else None
+        start = time.perf_counter()
+        try:
+            response = await self.test.client.post(
+                f"{self.test.base_url}/api/stt",
+                files={"file": (path.name, path.read_bytes(), "audio/mpeg")},
+                params=params,
+            )
+        except Exception as e:
+            self.test.recorder.record("/api/stt", time.perf_counter() - start, error=e)
+            return
+        self.test.recorder.record("/api/stt", time.perf_counter() - start, response)
+
+    async def sample_gauges(self, interval, stop):
+        """Relève périodiquement les files d'attente et requêtes en cours sur chaque service"""
+        while not stop.is_set():
+            urls = [self.test.base_url]
+            try:
+                upstreams = (await self.test.client.get(f"{self.test.base_url}/api/upstreams")).json()
+                urls += [replica["url"] for service in upstreams.values() for replica in service["replicas"]]
+            except Exception:
+                pass
+            totals = defaultdict(float)
+            for url in urls:
+                try:
+                    values = parse_gauges((await self.test.client.get(f"{url}/metrics")).text)
+                except Exception:
+                    continue
+                for label, name in SAMPLED_GAUGES.items():
+                    totals[label] += values.get(name, 0.0)
+            for label in SAMPLED_GAUGES:
+                self.samples[label].append(totals[label])
+            try:
+                await asyncio.wait_for(stop.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def replay(self, records, speed):
+        origin = records[0]["t"]
+        start = time.perf_counter()
+        tasks = []
+        for record in records:
+            delay = (record["t"] - origin) / speed - (time.perf_counter() - start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(self.send(record)))
+        await asyncio.gather(*tasks)
+        return time.perf_counter() - start
+
+
+def captured_cache_ratios(records):
+    ratios = {}
+    for endpoint in REPLAYED_ENDPOINTS:
+        outcomes = [record["c"] for record in records if record["e"] == endpoint and record.get("c")]
+        if outcomes:
+            ratios[endpoint] = round(outcomes.count("hit") / len(outcomes), 4)
+    return ratios
+
+
+def gauge_summary(samples):
+    return {
+        label: {"max": max(values), "mean": round(sum(values) / len(values), 3)}
+        for label, values in samples.items() if values
+    }
+
+
+async def run(args):
+    records = load_capture(args.capture)
+    if args.limit:
+        records = records[:args.limit]
+    if not records:
+        print(f"❌ Aucune requête rejouable dans {args.capture}")
+        return 1
+    span = records[-1]["t"] - records[0]["t"]
+    print(f"📼 {len(records)} requêtes sur {span:.0f}s de capture, rejouées en {span / args.speed:.0f}s (x{args.speed})")
+
+    audio_files = sorted(Path(args.stt_audio_dir).glob("*.mp3")) if args.stt_audio_dir else []
+    extra_env = {}
+    if args.tts_concurrency:
+        extra_env["TTS_MAX_CONCURRENCY"] = str(args.tts_concurrency)
+    if args.llm_cache_size:
+        extra_env["LLM_CACHE_SIZE"] = str(args.llm_cache_size)
+
+    work_dir = Path(tempfile.mkdtemp(prefix="holokia-replay-"))
+    process = log_file = None
+    if not args.no_start:
+        process, log_file = start_services(args, work_dir, extra_env)
+    try:
+        if not await wait_until_ready(args.base_url, args.startup_timeout):
+            print(f"❌ L'API principale ne répond pas sur {args.base_url}")
+            return 1
+
+        test = LoadTest(args.base_url, [], {}, timeout=args.timeout)
+        replayer = Replayer(test, PayloadFactory(args.seed), audio_files)
+        before = await test.scrape_cache_counters()
+        stop = asyncio.Event()
+        sampler = asyncio.create_task(replayer.sample_gauges(args.sample_interval, stop))
+        elapsed = await replayer.replay(records, args.speed)
+        stop.set()
+        await sampler
+        caches = cache_ratios(before, await test.scrape_cache_counters())
+        await test.client.aclose()
+    finally:
+        if process:
+            stop_services(process)
+            log_file.close()
+
+    # build_results attend les réglages de loadtest.py
+    args.concurrency, args.rate, args.duration = None, None, round(span / args.speed, 3)
+    results = build_results(args, test.recorder, elapsed, caches, mode="replay")
+    results["replay"] = {
+        "capture": str(args.capture),
+        "speed": args.speed,
+        "requests": len(records),
+        "skipped": replayer.skipped,
+        "tts_concurrency": args.tts_concurrency,
+        "llm_cache_size": args.llm_cache_size,
+        "captured_cache_hit_ratios": captured_cache_ratios(records),
+        "gauges": gauge_summary(replayer.samples),
+    }
+    print_results(results)
+    print("\n📈 Files d'attente et requêtes en cours (max / moyenne)")
+    for label, stats in results["replay"]["gauges"].items():
+        print(f"   {label:<16} {stats['max']:6.0f} / {stats['mean']:.2f}")
+    if results["replay"]["captured_cache_hit_ratios"]:
+        captured = ", ".join(f"{endpoint} {ratio:.1%}" for endpoint, ratio in results["replay"]["captured_cache_hit_ratios"].items())
+        print(f"   Succès de cache dans la capture : {captured}")
+    if replayer.skipped:
+        print(f"⚠  {replayer.skipped} requête(s) STT ignorée(s) : utiliser --stt-audio-dir")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 Résultats enregistrés dans {args.output}")
+    return 0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("capture", help="Fichier de capture (CAPTURE_PATH de l'API principale)")
+    parser.add_argument("--speed", type=float, default=1.0, help="Facteur d'accélération (1 = temps réel)")
+    parser.add_argument("--limit", type=int, help="Nombre maximal de requêtes rejouées")
+    parser.add_argument("--base-url", default="http://localhost:5001", help="URL de l'API principale")
+    parser.add_argument("--stt-audio-dir", help="Dossier de MP3 envoyés pour les requêtes /api/stt")
+    parser.add_argument("--tts-concurrency", type=int, help="Taille du sémaphore TTS (TTS_MAX_CONCURRENCY)")
+    parser.add_argument("--llm-cache-size", type=int, help="Taille du cache de réponses LLM (LLM_CACHE_SIZE)")
+    parser.add_argument("--sample-interval", type=float, default=1.0, help="Période de relevé des jauges (s)")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Timeout des requêtes (s)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-start", action="store_true", help="Utiliser des services déjà démarrés")
+    parser.add_argument("--real-backends", action="store_true", help="Groq et gTTS réels au lieu des backends factices")
+    parser.add_argument("--llm-latency-ms", type=float, default=300, help="Latence simulée du LLM factice")
+    parser.add_argument("--tts-latency-ms", type=float, default=200, help="Latence simulée du TTS factice")
+    parser.add_argument("--startup-timeout", type=float, default=180, help="Attente maximale du démarrage des services")
+    parser.add_argument("--service-args", nargs=argparse.REMAINDER, default=[],
+                        help="Arguments passés à start_service.py (ex. --instances tts=2)")
+    parser.add_argument("--output", help="Fichier JSON des résultats")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(run(parse_args())))
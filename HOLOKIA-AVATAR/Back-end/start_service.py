@@ -11,9 +11,17 @@ import signal
 import threading
 import requests
 import json
+import argparse
+import queue
+import selectors
+import logging
+from logging.handlers import RotatingFileHandler
+from collections import Counter
 from pathlib import Path
 from datetime import datetime
 import psutil
+import socket
+import tempfile
 
 # Configuration des services
 SERVICES = {
@@ -23,7 +31,11 @@ SERVICES = {
         "name": "TTS Server",
         "health_endpoint": "/health",
         "startup_timeout": 30,
-        "expected_status": "healthy"
+        "expected_status": "healthy",
+        "depends_on": [],
+        "instances": 1,
+        "replica_port_start": 5010,  # Ports des instances supplémentaires : 5010, 5011...
+        "uds": False  # True : socket Unix en plus du port, pour les appels de l'API principale
     },
     "stt": {
         "script": "app/stt_server.py", 
@@ -31,7 +43,11 @@ SERVICES = {
         "name": "STT Server",
         "health_endpoint": "/health",
         "startup_timeout": 45,  # Plus long car Whisper doit se charger
-        "expected_status": "healthy"
+        "expected_status": "healthy",
+        "depends_on": [],
+        "instances": 1,
+        "replica_port_start": 5020,
+        "uds": False
     },
     "main": {
         "script": "app/main.py",
@@ -39,13 +55,166 @@ SERVICES = {
         "name": "Main API",
         "health_endpoint": "/health",
         "startup_timeout": 20,
-        "expected_status": "healthy"
+        "expected_status": "healthy",
+        "depends_on": ["tts", "stt"]  # Démarre dès que ses services amont sont prêts
     }
 }
 
+# Intervalle de vérification du fichier de disponibilité et du port
+READINESS_POLL_INTERVAL = 0.05
+
+# Redémarrage automatique (mode --supervise) : délai doublé à chaque crash rapproché
+RESTART_BACKOFF_INITIAL = 1.0
+RESTART_BACKOFF_MAX = 60.0
+RESTART_STABLE_UPTIME = 30.0  # Au-delà, le crash suivant repart du délai initial
+
+# Instances effectivement lancées (nom d'instance -> configuration), voir expand_instances()
+INSTANCES = {}
+ready_instances = set()
+restarting_instances = set()
+restart_delays = {}
+supervise_mode = False
+registry_lock = threading.Lock()
+
 processes = {}
 service_stats = {}
 monitoring_active = True
+log_multiplexer = None
+
+class LogMultiplexer:
+    """Draine stdout et stderr de tous les services sans jamais bloquer les processus enfants.
+
+    Sous POSIX, un seul thread lit tous les pipes (non bloquants) via un selector ;
+    sous Windows, où les pipes ne sont pas sélectionnables, un thread par flux.
+    Les lignes passent par une file bornée : au-delà du seuil haut, seule une
+    ligne sur `sample_every` est gardée (hors erreurs), et la file pleine fait
+    ignorer les lignes au lieu de bloquer la lecture.
+    """
+
+    HIGH_WATERMARK = 0.8
+    ALWAYS_KEEP = ("ERROR", "CRITICAL", "Traceback", "Exception")
+
+    def __init__(self, max_queue=10000, sample_every=10, log_dir=None, max_bytes=10 * 1024 * 1024, backup_count=5):
+        self.lines = queue.Queue(maxsize=max_queue)
+        self.max_queue = max_queue
+        self.sample_every = max(1, sample_every)
+        self.log_dir = Path(log_dir) if log_dir else None
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.dropped = Counter()
+        self._sampled = Counter()
+        self._file_loggers = {}
+        self._pending = queue.Queue()
+        self._use_selector = os.name != "nt"
+        self._selector = selectors.DefaultSelector() if self._use_selector else None
+        if self.log_dir:
+            self.log_dir.mkdir(parents=True, exist_ok=True)
+
+    def start(self):
+        if self._use_selector:
+            threading.Thread(target=self._select_loop, name="log-reader", daemon=True).start()
+        threading.Thread(target=self._write_loop, name="log-writer", daemon=True).start()
+
+    def add(self, service_name, process):
+        """Enregistre les deux flux d'un processus lancé avec stdout/stderr=PIPE"""
+        for stream in (process.stdout, process.stderr):
+            if stream is None:
+                continue
+            if self._use_selector:
+                os.set_blocking(stream.fileno(), False)
+                self._pending.put((service_name, stream))
+            else:
+                threading.Thread(
+                    target=self._drain_stream, args=(service_name, stream),
+                    name=f"log-{service_name}", daemon=True
+                ).start()
+
+    def _select_loop(self):
+        partial = {}
+        while True:
+            while not self._pending.empty():
+                service_name, stream = self._pending.get_nowait()
+                self._selector.register(stream, selectors.EVENT_READ, service_name)
+                partial[stream] = b""
+
+            if not self._selector.get_map():
+                time.sleep(0.2)
+                continue
+
+            for key, _ in self._selector.select(timeout=0.2):
+                stream, service_name = key.fileobj, key.data
+                try:
+                    data = os.read(stream.fileno(), 65536)
+                except BlockingIOError:
+                    continue
+                except OSError:
+                    data = b""
+
+                if not data:
+                    # Fin du flux : le processus s'est arrêté
+                    if partial[stream]:
+                        self._offer(service_name, partial[stream])
+                    self._selector.unregister(stream)
+                    partial.pop(stream, None)
+                    continue
+
+                chunks = (partial[stream] + data).split(b"\n")
+                partial[stream] = chunks.pop()
+                for line in chunks:
+                    self._offer(service_name, line)
+
+    def _drain_stream(self, service_name, stream):
+        for line in iter(stream.readline, b""):
+            self._offer(service_name, line.rstrip(b"\n"))
+
+    def _offer(self, service_name, raw_line):
+        line = raw_line.decode("utf-8", errors="replace").rstrip("\r")
+        if not line.strip():
+            return
+        if self.lines.qsize() >= self.max_queue * self.HIGH_WATERMARK and not any(word in line for word in self.ALWAYS_KEEP):
+            self._sampled[service_name] += 1
+            if self._sampled[service_name] % self.sample_every:
+                self.dropped[service_name] += 1
+                return
+        try:
+            self.lines.put_nowait((time.time(), service_name, line))
+        except queue.Full:
+            self.dropped[service_name] += 1
+
+    def _write_loop(self):
+        reported = Counter()
+        while True:
+            try:
+                timestamp, service_name, line = self.lines.get(timeout=1)
+            except queue.Empty:
+                timestamp = None
+
+            if timestamp is not None:
+                print(f"[{datetime.fromtimestamp(timestamp).strftime('%H:%M:%S')}] [{service_name}] {line}")
+                file_logger = self._file_logger(service_name)
+                if file_logger:
+                    file_logger.info(line)
+
+            for service_name, count in list(self.dropped.items()):
+                if count > reported[service_name]:
+                    print(f"⚠  [{service_name}] {count - reported[service_name]} ligne(s) de log ignorée(s) (file saturée)")
+                    reported[service_name] = count
+
+    def _file_logger(self, service_name):
+        if not self.log_dir:
+            return None
+        if service_name not in self._file_loggers:
+            file_logger = logging.getLogger(f"services.{service_name}")
+            file_logger.propagate = False
+            file_logger.setLevel(logging.INFO)
+            handler = RotatingFileHandler(
+                self.log_dir / f"{service_name}.log",
+                maxBytes=self.max_bytes, backupCount=self.backup_count, encoding="utf-8"
+            )
+            handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+            file_logger.addHandler(handler)
+            self._file_loggers[service_name] = file_logger
+        return self._file_loggers[service_name]
 
 class ServiceMonitor:
     def __init__(self, service_name, service_config, process):
@@ -92,12 +261,29 @@ def start_service(service_name, service_config):
     start_time = time.time()
     
     try:
+        # Le service crée ce fichier quand il est prêt (voir app/readiness.py)
+        ready_file = ready_file_path(service_name)
+        if ready_file.exists():
+            ready_file.unlink()
+        env = {
+            **os.environ,
+            "SERVICE_READY_FILE": str(ready_file),
+            "PORT": str(service_config["port"]),
+            "HOLOKIA_INSTANCES_FILE": str(instances_file_path())
+        }
+        # Socket Unix en plus du port TCP (voir app/serving.py)
+        if service_config.get("uds"):
+            env["SERVICE_UDS"] = service_config["uds"]
+        
+        # Flux binaires : le multiplexeur les lit sans bloquer et décode lui-même
         process = subprocess.Popen(
             [sys.executable, str(script_path)],
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
-            text=True
+            env=env
         )
+        if log_multiplexer:
+            log_multiplexer.add(service_name, process)
         
         startup_time = time.time() - start_time
         print(f"✅ {service_config['name']} démarré (PID: {process.pid}) en {startup_time:.2f}s")
@@ -172,49 +358,207 @@ def check_service_health(service_name, service_config, detailed=False):
         return False
 
 def monitor_service(service_name, service_config, process):
-    """Surveille un service et affiche ses logs en temps réel"""
+    """Surveille l'arrêt d'un service (les logs sont drainés par le LogMultiplexer)"""
     if not process:
         return
     
     print(f"📊 Surveillance de {service_config['name']}...")
-    
-    while process.poll() is None and monitoring_active:
-        try:
-            # Lire la sortie en temps réel
-            output = process.stdout.readline()
-            if output:
-                timestamp = datetime.now().strftime("%H:%M:%S")
-                print(f"[{timestamp}] [{service_name}] {output.strip()}")
-        except:
-            break
+    process.wait()
     
     if process.returncode:
         print(f"❌ {service_config['name']} s'est arrêté avec le code {process.returncode}")
 
+def ready_file_path(service_name):
+    return Path(tempfile.gettempdir()) / f"holokia-{service_name}-{os.getpid()}.ready"
+
+def port_is_open(port, host="127.0.0.1"):
+    try:
+        with socket.create_connection((host, port), timeout=0.2):
+            return True
+    except OSError:
+        return False
+
 def wait_for_service_startup(service_name, service_config):
-    """Attend que le service soit prêt avec timeout"""
+    """Attend le signal de disponibilité du service (fichier prêt puis port ouvert)"""
     print(f"⏳ Attente du démarrage de {service_config['name']}...")
     
+    process = processes.get(service_name)
+    ready_file = ready_file_path(service_name)
     start_time = time.time()
     timeout = service_config["startup_timeout"]
     
     while time.time() - start_time < timeout:
-        if check_service_health(service_name, service_config):
+        if process and process.poll() is not None:
+            print(f"❌ {service_config['name']} s'est arrêté pendant le démarrage (code {process.returncode})")
+            return False
+        # Le fichier est écrit à la fin du démarrage applicatif, le port suit immédiatement
+        if ready_file.exists() and port_is_open(service_config["port"]):
             startup_time = time.time() - start_time
             print(f"✅ {service_config['name']} prêt en {startup_time:.2f}s")
+            # Détails écrits par le service, ex. « warmup=18/20 » (voir app/readiness.py)
+            for detail in ready_file.read_text(encoding="utf-8").split()[2:]:
+                if detail.startswith("warmup="):
+                    print(f"🔥 {service_config['name']} : {detail.partition('=')[2]} phrase(s) préchauffée(s)")
             return True
-        time.sleep(1)
+        time.sleep(READINESS_POLL_INTERVAL)
     
     print(f"⏰ Timeout: {service_config['name']} n'a pas démarré dans les {timeout}s")
     return False
 
+def expand_instances(instance_counts=None):
+    """Construit la liste des instances : la première sur le port du service, les suivantes sur des ports consécutifs"""
+    instance_counts = instance_counts or {}
+    INSTANCES.clear()
+    for service_name, service_config in SERVICES.items():
+        count = max(1, int(instance_counts.get(service_name, service_config.get("instances", 1))))
+        if count > 1 and "replica_port_start" not in service_config:
+            print(f"⚠  {service_config['name']} ne peut pas avoir plusieurs instances, une seule sera lancée")
+            count = 1
+        for index in range(count):
+            instance_name = service_name if index == 0 else f"{service_name}-{index + 1}"
+            INSTANCES[instance_name] = {
+                **service_config,
+                "service": service_name,
+                "port": service_config["port"] if index == 0 else service_config["replica_port_start"] + index - 1,
+                "name": service_config["name"] if count == 1 else f"{service_config['name']} #{index + 1}",
+                "uds": str(socket_file_path(instance_name)) if service_config.get("uds") else None
+            }
+    return INSTANCES
+
+def socket_file_path(instance_name):
+    return Path(tempfile.gettempdir()) / f"holokia-{instance_name}-{os.getpid()}.sock"
+
+def instances_file_path():
+    return Path(tempfile.gettempdir()) / f"holokia-instances-{os.getpid()}.json"
+
+def write_instance_registry():
+    """Publie les instances prêtes et vivantes pour l'API principale (voir app/service_registry.py)"""
+    services = {}
+    for instance_name, instance_config in INSTANCES.items():
+        process = processes.get(instance_name)
+        if instance_name not in ready_instances or not process or process.poll() is not None:
+            continue
+        services.setdefault(instance_config["service"], []).append({
+            "name": instance_name,
+            "url": f"http://localhost:{instance_config['port']}",
+            "port": instance_config["port"],
+            "uds": instance_config.get("uds"),
+            "pid": process.pid
+        })
+    
+    path = instances_file_path()
+    tmp_path = path.with_suffix(".tmp")
+    with registry_lock:
+        tmp_path.write_text(json.dumps({"updated_at": time.time(), "services": services}, indent=2), encoding="utf-8")
+        os.replace(tmp_path, path)
+
+def start_instance(instance_name, instance_config):
+    """Lance une instance et attend qu'elle soit prête ; renvoie True si elle l'est"""
+    process = start_service(instance_name, instance_config)
+    if not process:
+        return False
+    # Démarrer la surveillance dans un thread séparé
+    threading.Thread(
+        target=monitor_service,
+        args=(instance_name, instance_config, process),
+        daemon=True
+    ).start()
+    if not wait_for_service_startup(instance_name, instance_config):
+        return False
+    ready_instances.add(instance_name)
+    write_instance_registry()
+    return True
+
+def start_services_parallel():
+    """Démarre les services selon leurs dépendances : chacun dès que ses services amont sont prêts"""
+    ready_events = {instance_name: threading.Event() for instance_name in INSTANCES}
+    results = {}
+    
+    def launch(instance_name, instance_config):
+        dependencies = [
+            name for name, config in INSTANCES.items()
+            if config["service"] in instance_config.get("depends_on", [])
+        ]
+        for dependency in dependencies:
+            ready_events[dependency].wait()
+            if not results.get(dependency):
+                print(f"❌ {instance_config['name']} non démarré : {INSTANCES[dependency]['name']} n'est pas prêt")
+                results[instance_name] = False
+                ready_events[instance_name].set()
+                return
+        
+        results[instance_name] = start_instance(instance_name, instance_config)
+        ready_events[instance_name].set()
+    
+    start_time = time.time()
+    threads = [
+        threading.Thread(target=launch, args=(instance_name, instance_config), daemon=True)
+        for instance_name, instance_config in INSTANCES.items()
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    print(f"\n⏱  Démarrage à froid terminé en {time.time() - start_time:.2f}s")
+    return all(results.get(instance_name) for instance_name in INSTANCES)
+
+def next_restart_delay(instance_name):
+    """Backoff exponentiel : remis à zéro si l'instance a tourné assez longtemps"""
+    monitor = service_stats.get(instance_name)
+    previous = restart_delays.get(instance_name)
+    if previous is None or (monitor and monitor.get_uptime() >= RESTART_STABLE_UPTIME):
+        delay = RESTART_BACKOFF_INITIAL
+    else:
+        delay = min(previous * 2, RESTART_BACKOFF_MAX)
+    restart_delays[instance_name] = delay
+    return delay
+
+def restart_instance(instance_name):
+    """Redémarre une instance arrêtée, en réessayant avec backoff tant qu'elle ne démarre pas"""
+    instance_config = INSTANCES[instance_name]
+    try:
+        while monitoring_active:
+            delay = next_restart_delay(instance_name)
+            print(f"🔁 Redémarrage de {instance_config['name']} dans {delay:.1f}s")
+            deadline = time.time() + delay
+            while monitoring_active and time.time() < deadline:
+                time.sleep(0.2)
+            if not monitoring_active:
+                return
+            
+            if start_instance(instance_name, instance_config):
+                print(f"✅ {instance_config['name']} redémarré")
+                return
+            
+            # Échec du démarrage : arrêter le processus et réessayer plus tard
+            process = processes.get(instance_name)
+            if process and process.poll() is None:
+                process.kill()
+    finally:
+        restarting_instances.discard(instance_name)
+
+def handle_stopped_instance(instance_name):
+    """Retire une instance arrêtée de la liste publiée et la relance en mode superviseur"""
+    processes.pop(instance_name, None)
+    ready_instances.discard(instance_name)
+    write_instance_registry()
+    
+    if not supervise_mode:
+        print(f"❌ {INSTANCES[instance_name]['name']} s'est arrêté inopinément")
+        return
+    
+    print(f"❌ {INSTANCES[instance_name]['name']} s'est arrêté inopinément, redémarrage automatique")
+    restarting_instances.add(instance_name)
+    threading.Thread(target=restart_instance, args=(instance_name,), daemon=True).start()
+
 def print_service_stats():
     """Affiche les statistiques détaillées de tous les services"""
     print("\n" + "="*60)
     print("📊 STATISTIQUES DES SERVICES")
     print("="*60)
     
-    for service_name, service_config in SERVICES.items():
+    for service_name, service_config in INSTANCES.items():
         monitor = service_stats.get(service_name)
         if not monitor:
             continue
@@ -245,7 +589,7 @@ def run_health_check_loop():
             print("="*60)
             
             all_healthy = True
-            for service_name, service_config in SERVICES.items():
+            for service_name, service_config in INSTANCES.items():
                 if not check_service_health(service_name, service_config, detailed=True):
                     all_healthy = False
                 print()  # Ligne vide entre services
@@ -266,13 +610,13 @@ def run_health_check_loop():
             print(f"❌ Erreur lors de la vérification : {e}")
             time.sleep(10)
 
-def signal_handler(signum, frame):
-    """Gestionnaire de signal pour arrêter proprement les services"""
+def stop_all_services():
+    """Arrête toutes les instances lancées et retire le fichier d'instances"""
     global monitoring_active
     print("\n🛑 Arrêt des services...")
     monitoring_active = False
     
-    for service_name, process in processes.items():
+    for service_name, process in list(processes.items()):
         if process and process.poll() is None:
             print(f"🛑 Arrêt de {service_name}...")
             process.terminate()
@@ -282,6 +626,14 @@ def signal_handler(signum, frame):
                 process.kill()
     
     print_service_stats()
+    try:
+        instances_file_path().unlink()
+    except OSError:
+        pass
+
+def signal_handler(signum, frame):
+    """Gestionnaire de signal pour arrêter proprement les services"""
+    stop_all_services()
     sys.exit(0)
 
 def test_service_integration():
@@ -352,54 +704,107 @@ def test_service_integration():
     except Exception as e:
         print(f"❌ Erreur test STT: {e}") """
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Démarrage et monitoring des services backend")
+    parser.add_argument("--log-dir", help="Dossier des fichiers de log par service (rotation automatique)")
+    parser.add_argument("--log-max-bytes", type=int, default=10 * 1024 * 1024, help="Taille max d'un fichier de log")
+    parser.add_argument("--log-backups", type=int, default=5, help="Nombre de fichiers de log conservés par service")
+    parser.add_argument("--log-queue-size", type=int, default=10000, help="Lignes en attente avant d'en ignorer")
+    parser.add_argument("--supervise", action="store_true", help="Redémarrer automatiquement les services arrêtés")
+    parser.add_argument(
+        "--instances", nargs="*", default=[], metavar="SERVICE=N",
+        help="Nombre d'instances par service, ex. --instances tts=3 stt=2"
+    )
+    parser.add_argument(
+        "--warmup", action="store_true",
+        help="Préchauffer le cache LLM et les MP3 des phrases courantes avant de déclarer l'API prête"
+    )
+    parser.add_argument(
+        "--uds", action="store_true",
+        help="Services TTS/STT joignables par socket Unix depuis l'API principale (en plus de leur port)"
+    )
+    parser.add_argument(
+        "--stt-workers", type=int, metavar="N",
+        help="Workers pré-fork du STT partageant le modèle Whisper chargé une fois (voir app/serving.py)"
+    )
+    parser.add_argument(
+        "--monolith", action="store_true",
+        help="API principale, TTS et STT dans un seul processus (mêmes ports, appels internes sans réseau)"
+    )
+    parser.add_argument("--warmup-deadline", type=float, default=60, help="Durée maximale du préchauffage (s)")
+    return parser.parse_args()
+
+def parse_instance_counts(values):
+    counts = {}
+    for value in values:
+        service_name, _, count = value.partition("=")
+        if service_name not in SERVICES or not count.isdigit():
+            raise SystemExit(f"❌ Valeur --instances invalide : {value}")
+        counts[service_name] = int(count)
+    return counts
+
 def main():
     """Fonction principale avec monitoring complet"""
+    global log_multiplexer, supervise_mode
+    args = parse_args()
+    supervise_mode = args.supervise
+    if args.warmup:
+        # Lu par app/main.py (voir app/warmup.py) ; l'attente du démarrage inclut le préchauffage
+        os.environ["HOLOKIA_WARMUP"] = "1"
+        os.environ["WARMUP_DEADLINE_S"] = str(args.warmup_deadline)
+        SERVICES["main"]["startup_timeout"] += args.warmup_deadline
+    if args.stt_workers:
+        # Lu par app/stt_server.py : un seul chargement de Whisper, puis fork des workers
+        os.environ["STT_WORKERS"] = str(args.stt_workers)
+    if args.monolith:
+        # Lu par app/main.py (voir app/monolith.py) : le TTS et le STT sont chargés dans l'API principale
+        os.environ["HOLOKIA_MONOLITH"] = "1"
+        os.environ["TTS_PORT"] = str(SERVICES["tts"]["port"])
+        os.environ["STT_PORT"] = str(SERVICES["stt"]["port"])
+        SERVICES["main"]["startup_timeout"] += SERVICES["tts"]["startup_timeout"] + SERVICES["stt"]["startup_timeout"]
+        SERVICES["main"]["depends_on"] = []
+        del SERVICES["tts"], SERVICES["stt"]
+        if args.uds or args.instances:
+            print("⚠  --uds et --instances sont ignorés en mode monolithe")
+            args.uds, args.instances = False, []
+    if args.uds:
+        if not hasattr(socket, "AF_UNIX"):
+            print("⚠  Sockets Unix non disponibles sur cette plateforme, --uds ignoré")
+        else:
+            for service_name in ("tts", "stt"):
+                SERVICES[service_name]["uds"] = True
+    expand_instances(parse_instance_counts(args.instances))
     print("🎯 Démarrage des services backend avec monitoring...")
     print("="*60)
     
+    log_multiplexer = LogMultiplexer(
+        max_queue=args.log_queue_size,
+        log_dir=args.log_dir,
+        max_bytes=args.log_max_bytes,
+        backup_count=args.log_backups
+    )
+    log_multiplexer.start()
+    
     # Configuration du gestionnaire de signal
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
     
-    # Démarrer tous les services
-    startup_success = True
-    for service_name, service_config in SERVICES.items():
-        process = start_service(service_name, service_config)
-        if process:
-            # Démarrer la surveillance dans un thread séparé
-            monitor_thread = threading.Thread(
-                target=monitor_service,
-                args=(service_name, service_config, process),
-                daemon=True
-            )
-            monitor_thread.start()
-        else:
-            startup_success = False
-    
-    if not startup_success:
-        print("❌ Échec du démarrage de certains services")
-        return
-    
-    # Attendre que tous les services démarrent
-    print("\n⏳ Attente du démarrage des services...")
-    time.sleep(5)
-    
-    # Vérifier que tous les services sont prêts
-    print("\n🔍 Vérification de la santé des services...")
-    all_ready = True
-    for service_name, service_config in SERVICES.items():
-        if not wait_for_service_startup(service_name, service_config):
-            all_ready = False
-    
-    if not all_ready:
+    # Démarrer les services en parallèle, dans l'ordre des dépendances
+    if not start_services_parallel():
         print("❌ Certains services ne sont pas prêts")
-        return
+        # Ne pas laisser tourner les instances déjà démarrées (ports occupés au prochain lancement)
+        stop_all_services()
+        sys.exit(1)
     
     print("\n✅ Tous les services sont démarrés !")
     print("📋 Services disponibles :")
-    print("   - TTS Server: http://localhost:5000")
-    print("   - STT Server: http://localhost:5002") 
-    print("   - Main API:  http://localhost:5001")
+    for instance_config in INSTANCES.values():
+        socket_info = f" (socket {instance_config['uds']})" if instance_config.get("uds") else ""
+        print(f"   - {instance_config['name']}: http://localhost:{instance_config['port']}{socket_info}")
+    if args.monolith:
+        print(f"   - TTS et STT (dans le processus de l'API principale) : ports {os.environ['TTS_PORT']} et {os.environ['STT_PORT']}")
+    if supervise_mode:
+        print("🛡  Mode superviseur : redémarrage automatique des services arrêtés")
     print("\n💡 Appuyez sur Ctrl+C pour arrêter tous les services")
     
     # Test d'intégration
@@ -415,10 +820,11 @@ def main():
         while monitoring_active:
             time.sleep(1)
             # Vérifier si tous les processus sont encore en vie
-            for service_name, process in list(processes.items()):
+            for instance_name, process in list(processes.items()):
+                if instance_name in restarting_instances:
+                    continue
                 if process and process.poll() is not None:
-                    print(f"❌ {SERVICES[service_name]['name']} s'est arrêté inopinément")
-                    processes.pop(service_name, None)
+                    handle_stopped_instance(instance_name)
     except KeyboardInterrupt:
         signal_handler(signal.SIGINT, None)
 
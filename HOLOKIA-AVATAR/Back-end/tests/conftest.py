@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Les modules du back-end sont importés à plat depuis app/, comme au lancement des services
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app"))
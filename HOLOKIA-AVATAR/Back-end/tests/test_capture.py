@@ -0,0 +1,41 @@
+import asyncio
+import json
+
+from capture import UNMATCHED_ROUTE, CaptureMiddleware, CaptureWriter, annotate
+
+
+def run_request(tmp_path, path, route=None, status=200):
+    class Route:
+        pass
+
+    async def app(scope, receive, send):
+        if route:
+            scope["route"] = Route()
+            scope["route"].path = route
+        annotate(lang="fr", chars=12)
+        await send({"type": "http.response.start", "status": status})
+
+    async def send(message):
+        pass
+
+    capture_path = tmp_path / "capture.jsonl"
+    middleware = CaptureMiddleware(app, CaptureWriter(str(capture_path)))
+    scope = {"type": "http", "method": "DELETE", "path": path}
+    asyncio.run(middleware(scope, None, send))
+    return json.loads(capture_path.read_text(encoding="utf-8").splitlines()[-1])
+
+
+def test_route_template_replaces_session_id(tmp_path):
+    record = run_request(tmp_path, "/api/sessions/9b2f6c", route="/api/sessions/{session_id}", status=204)
+    assert record["e"] == "/api/sessions/{session_id}"
+    assert (record["m"], record["s"], record["l"], record["n"]) == ("DELETE", 204, "fr", 12)
+    assert "9b2f6c" not in json.dumps(record)
+
+
+def test_unmatched_path_is_not_recorded(tmp_path):
+    record = run_request(tmp_path, "/api/inconnu/9b2f6c", status=404)
+    assert record["e"] == UNMATCHED_ROUTE
+
+
+def test_annotate_outside_request_is_ignored():
+    annotate(lang="fr")
@@ -0,0 +1,54 @@
+import os
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+from intents import IntentMatcher, load_intents
+
+INTENTS_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app", "intents.yaml")
+
+
+@pytest.fixture(scope="module")
+def matcher():
+    return IntentMatcher.from_file(INTENTS_FILE)
+
+
+@pytest.mark.parametrize("text, lang, intent", [
+    ("Bonjour !", "fr", "greeting"),
+    ("Salut HOLOKIA", "fr", "greeting"),
+    ("Qui es-tu ?", "fr", "identity"),
+    ("Thank you so much!", "en", "thanks"),
+    ("مرحبًا", "ar", "greeting"),
+    ("Au revoir", "fr", "goodbye"),
+])
+def test_known_intents(matcher, text, lang, intent):
+    name, language, reply = matcher.match(text, lang)
+    assert (name, language) == (intent, lang)
+    assert reply == matcher.replies[(intent, lang)]
+
+
+def test_greeting_followed_by_question_goes_to_llm(matcher):
+    assert matcher.match("Bonjour, quelle est la capitale du Canada ?", "fr") is None
+
+
+def test_long_message_goes_to_llm(matcher):
+    assert matcher.match("merci " * 20, "fr") is None
+
+
+def test_wrong_detected_language_still_matches(matcher):
+    # langdetect classe souvent « Hello » comme autre chose que de l'anglais
+    assert matcher.match("Hello", "fr")[:2] == ("greeting", "en")
+
+
+def test_intent_without_reply_is_ignored():
+    matcher = IntentMatcher({"greeting": {"patterns": {"fr": ["bonjour"]}, "replies": {"en": "Hello!"}}})
+    assert matcher.match("bonjour", "fr") is None
+    assert matcher.phrases() == [("Hello!", "en")]
+
+
+def test_invalid_file_disables_intents(tmp_path):
+    path = tmp_path / "intents.yaml"
+    path.write_text("intents:\n  greeting:\n    patterns:\n      fr: ['(bonjour']\n", encoding="utf-8")
+    assert load_intents(str(path)) is None
+    assert load_intents(str(tmp_path / "absent.yaml")) is None
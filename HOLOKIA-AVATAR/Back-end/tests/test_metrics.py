@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+import metrics
+from metrics import CallbackMetric, Counter, Gauge, Histogram, Registry
+
+
+def test_counter_and_gauge_render_with_labels():
+    requests = Counter("test_requests_total", "Requêtes", labels=("route",))
+    requests.labels("/api/generate").inc()
+    requests.labels("/api/generate").inc(2)
+    queue = Gauge("test_queue", "File d'attente")
+    queue.set(4)
+    assert requests.render() == [
+        "# HELP test_requests_total Requêtes",
+        "# TYPE test_requests_total counter",
+        'test_requests_total{route="/api/generate"} 3.0',
+    ]
+    assert queue.render()[-1] == "test_queue 4.0"
+
+
+def test_label_values_are_escaped():
+    errors = Counter("test_errors_total", "Erreurs", labels=("message",))
+    errors.labels('dit "non"\\\n').inc()
+    assert errors.render()[-1] == 'test_errors_total{message="dit \\"non\\"\\\\\\n"} 1.0'
+
+
+def test_histogram_buckets_are_cumulative_and_inclusive():
+    latency = Histogram("test_seconds", "Latence", labels=("service",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        latency.labels("tts").observe(value)
+    assert latency.render()[2:] == [
+        'test_seconds_bucket{service="tts",le="0.1"} 2',
+        'test_seconds_bucket{service="tts",le="1.0"} 3',
+        'test_seconds_bucket{service="tts",le="+Inf"} 4',
+        'test_seconds_sum{service="tts"} 3.65',
+        'test_seconds_count{service="tts"} 4',
+    ]
+
+
+def test_callback_skips_missing_values_and_errors():
+    sizes = CallbackMetric("test_size", "Taille", lambda: [(("llm",), 3), (("stt",), None)], labels=("cache",))
+    assert sizes.render()[2:] == ['test_size{cache="llm"} 3.0']
+
+    def broken():
+        raise RuntimeError("indisponible")
+
+    assert CallbackMetric("test_broken", "Cassée", broken).render()[2:] == []
+
+
+def test_registry_reuses_metric_with_same_name():
+    registry = Registry()
+    first = registry.register(Counter("test_total", "Total"))
+    assert registry.register(Counter("test_total", "Total")) is first
+    first.inc()
+    assert registry.render() == "# HELP test_total Total\n# TYPE test_total counter\ntest_total 1.0\n"
+
+
+def test_middleware_labels_route_template():
+    class Route:
+        path = "/api/sessions/{session_id}"
+
+    async def app(scope, receive, send):
+        scope["route"] = Route()
+        await send({"type": "http.response.start", "status": 204})
+
+    async def send(message):
+        pass
+
+    scope = {"type": "http", "method": "DELETE", "path": "/api/sessions/0f3a"}
+    asyncio.run(metrics.MetricsMiddleware(app, "test")(scope, None, send))
+    rendered = metrics.REQUEST_SECONDS.render()
+    assert any('route="/api/sessions/{session_id}",status="204"' in line for line in rendered)
+    assert not any("0f3a" in line for line in rendered)
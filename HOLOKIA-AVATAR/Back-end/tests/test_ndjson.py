@@ -0,0 +1,80 @@
+import asyncio
+import json
+
+import pytest
+
+fastapi = pytest.importorskip("fastapi")
+
+from ndjson import group_duplicates, line, run_batch
+
+
+def collect(events):
+    async def read():
+        return [json.loads(event) async for event in events]
+
+    return asyncio.run(read())
+
+
+def test_line_is_one_json_object_per_line():
+    assert line({"type": "done", "text": "مرحبا"}) == '{"type": "done", "text": "مرحبا"}\n'
+
+
+def test_group_duplicates_keeps_first_item_and_all_indexes():
+    items = [{"text": "a"}, {"text": "b"}, {"text": "a"}, {"text": "c"}, {"text": "b"}]
+    groups = group_duplicates(items, key=lambda item: item["text"])
+    assert groups == [({"text": "a"}, [0, 2]), ({"text": "b"}, [1, 4]), ({"text": "c"}, [3])]
+    assert groups[0][0] is items[0]
+
+
+def test_run_batch_calls_handler_once_per_group():
+    calls = []
+
+    async def handler(item):
+        calls.append(item)
+        return {"text": item.upper()}
+
+    events = collect(run_batch(group_duplicates(["a", "b", "a"], key=str), handler))
+    assert sorted(calls) == ["a", "b"]
+    results = {event["index"]: event["text"] for event in events if event["type"] == "result"}
+    assert results == {0: "A", 1: "B", 2: "A"}
+    assert events[-1]["type"] == "done"
+    assert (events[-1]["items"], events[-1]["unique"], events[-1]["errors"]) == (3, 2, 0)
+
+
+def test_run_batch_streams_in_completion_order():
+    async def handler(item):
+        await asyncio.sleep(item)
+        return {}
+
+    events = collect(run_batch(group_duplicates([0.05, 0.0], key=str), handler))
+    assert [event["index"] for event in events[:-1]] == [1, 0]
+
+
+def test_run_batch_reports_errors_per_item():
+    async def handler(item):
+        if item == "absent":
+            raise fastapi.HTTPException(status_code=404, detail="Fichier audio non trouvé")
+        if item == "cassé":
+            raise RuntimeError("décodage impossible")
+        return {"ok": True}
+
+    events = collect(run_batch(group_duplicates(["ok", "absent", "cassé", "absent"], key=str), handler))
+    errors = {event["index"]: (event["status"], event["detail"]) for event in events if event["type"] == "error"}
+    assert errors == {1: (404, "Fichier audio non trouvé"), 2: (500, "décodage impossible"), 3: (404, "Fichier audio non trouvé")}
+    assert events[-1]["errors"] == 3
+
+
+def test_closing_stream_cancels_remaining_work():
+    async def scenario():
+        async def handler(item):
+            await asyncio.sleep(0 if item == "rapide" else 10)
+            return {}
+
+        events = run_batch(group_duplicates(["rapide", "lent"], key=str), handler)
+        assert json.loads(await events.__anext__())["index"] == 0
+        await events.aclose()
+        await asyncio.sleep(0)
+        pending = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        assert all(task.done() for task in pending)
+
+    asyncio.run(scenario())
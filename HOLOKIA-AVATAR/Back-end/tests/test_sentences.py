@@ -0,0 +1,28 @@
+from sentences import split_sentences
+
+
+def test_incomplete_text_stays_in_buffer():
+    assert split_sentences("Je suis HOLOKIA et je") == ([], "Je suis HOLOKIA et je")
+
+
+def test_sentence_needs_trailing_space():
+    # La ponctuation peut être suivie de la suite du mot ou d'un autre signe
+    assert split_sentences("Voici une réponse complète.") == ([], "Voici une réponse complète.")
+
+
+def test_complete_sentences_are_split():
+    sentences, rest = split_sentences("Voici la première phrase. Et voici la deuxième ! Et la suite")
+    assert sentences == ["Voici la première phrase.", "Et voici la deuxième !"]
+    assert rest == "Et la suite"
+
+
+def test_short_sentences_are_merged():
+    sentences, rest = split_sentences("Bonjour ! Comment puis-je vous aider ? ")
+    assert sentences == ["Bonjour ! Comment puis-je vous aider ?"]
+    assert rest == ""
+
+
+def test_arabic_question_mark():
+    sentences, rest = split_sentences("مرحبًا، كيف يمكنني مساعدتك اليوم؟ أنا")
+    assert sentences == ["مرحبًا، كيف يمكنني مساعدتك اليوم؟"]
+    assert rest == "أنا"
@@ -0,0 +1,77 @@
+import os
+import time
+
+from sessions import CONTEXT_LINES, Session, SessionStore, valid_session_id
+
+
+def test_context_keeps_last_lines():
+    session = Session("s" * 32)
+    for index in range(3):
+        session.record_turn(f"question {index}", f"réponse {index}")
+    assert len(session.lines) == CONTEXT_LINES
+    assert session.conversation("suite") == "user: question 1\nassistant: réponse 1\nuser: question 2\nassistant: réponse 2\nuser: suite"
+    assert session.turns == 3
+    assert Session("s" * 32).conversation("bonjour") == "user: bonjour"
+
+
+def test_create_with_history_and_delete():
+    store = SessionStore()
+    session = store.create([("user", "Bonjour"), ("assistant", "Bonjour !")])
+    assert store.get(session.id).context == "user: Bonjour\nassistant: Bonjour !"
+    store.delete(session.id)
+    assert store.get(session.id) is None
+
+
+def test_invalid_ids_are_rejected():
+    assert not valid_session_id("../../etc/passwd")
+    assert not valid_session_id("court")
+    assert SessionStore().get("../secret") is None
+
+
+def test_lru_evicts_least_recently_used():
+    store = SessionStore(max_sessions=2)
+    first, second = store.create(), store.create()
+    store.get(first.id)
+    third = store.create()
+    assert len(store) == 2
+    assert store.get(second.id) is None
+    assert store.get(first.id) is first and store.get(third.id) is third
+
+
+def test_expired_session_is_dropped():
+    store = SessionStore(ttl=60)
+    session = store.create()
+    session.updated = time.time() - 61
+    assert store.get(session.id) is None
+    assert len(store) == 0
+
+
+def test_purge_removes_expired_sessions():
+    store = SessionStore(ttl=60)
+    old, recent = store.create(), store.create()
+    old.updated = time.time() - 61
+    store.purge_expired()
+    assert len(store) == 1 and store.get(recent.id) is recent
+
+
+def test_evicted_session_is_spilled_and_reloaded(tmp_path):
+    store = SessionStore(max_sessions=1, spill_dir=str(tmp_path))
+    first = store.create([("user", "Bonjour")])
+    first.record_turn("Qui es-tu ?", "Je suis HOLOKIA.")
+    second = store.create()
+    assert os.path.exists(tmp_path / f"{first.id}.json")
+
+    reloaded = store.get(first.id)
+    assert reloaded is not first
+    assert (reloaded.context, reloaded.turns) == (first.context, 1)
+    # Rechargée en mémoire, elle évince à son tour la seconde
+    assert not os.path.exists(tmp_path / f"{first.id}.json")
+    assert os.path.exists(tmp_path / f"{second.id}.json")
+
+
+def test_expired_sessions_are_not_spilled(tmp_path):
+    store = SessionStore(max_sessions=1, ttl=60, spill_dir=str(tmp_path))
+    first = store.create()
+    first.updated = time.time() - 61
+    store.create()
+    assert not os.path.exists(tmp_path / f"{first.id}.json")
@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+from speculation import Speculator, normalize_transcript, transcripts_match
+
+
+def test_normalize_ignores_case_punctuation_and_spaces():
+    assert normalize_transcript("  Bonjour,   comment ça va ?") == "bonjour comment ça va"
+
+
+def test_normalize_drops_arabic_vowel_marks():
+    assert normalize_transcript("مَرْحَبًا") == normalize_transcript("مرحبا")
+
+
+@pytest.mark.parametrize("partial, final, expected", [
+    ("Bonjour, comment ça va", "bonjour comment ça va ?", True),
+    ("quelle heure est il", "Quelle heure est-il ?", True),
+    ("quel temps fait-il à Paris", "quel temps fait-il à Lyon", False),
+    ("bonjour", "au revoir", False),
+])
+def test_transcripts_match(partial, final, expected):
+    assert transcripts_match(partial, final, tolerance=0.9) is expected
+
+
+def test_tolerance_one_requires_identical_normalized_text():
+    assert transcripts_match("Bonjour !", "bonjour", tolerance=1.0)
+    assert not transcripts_match("bonjour", "bonjours", tolerance=1.0)
+
+
+def test_resolve_keeps_matching_speculation():
+    async def generation():
+        return "réponse"
+
+    async def scenario():
+        speculator = Speculator(tolerance=0.9)
+        speculator.start("c:1", "quelle heure est il", generation())
+        assert await speculator.resolve("c:1", "Quelle heure est-il ?") == "réponse"
+        assert await speculator.resolve("c:1", "Quelle heure est-il ?") is None
+
+    asyncio.run(scenario())
+
+
+def test_resolve_cancels_mismatched_speculation():
+    async def generation():
+        await asyncio.sleep(10)
+
+    async def scenario():
+        speculator = Speculator(tolerance=0.9)
+        speculator.start("c:1", "quel temps fait-il à Paris", generation())
+        task = speculator._pending["c:1"].task
+        assert await speculator.resolve("c:1", "quel temps fait-il à Lyon") is None
+        await asyncio.gather(task, return_exceptions=True)
+        assert task.cancelled()
+
+    asyncio.run(scenario())
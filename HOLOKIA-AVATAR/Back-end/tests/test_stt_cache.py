@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+from stt_cache import TranscriptCache
+
+
+def test_key_depends_on_content_and_options():
+    key = TranscriptCache.make_key(b"audio", "small", "fr")
+    assert key == TranscriptCache.make_key(b"audio", "small", "fr")
+    assert key != TranscriptCache.make_key(b"autre", "small", "fr")
+    assert key != TranscriptCache.make_key(b"audio", "small", "en")
+    assert key != TranscriptCache.make_key(b"audio", "small", "fr", "words=True")
+
+
+def test_concurrent_requests_share_one_transcription():
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"text": "bonjour"}
+
+    async def scenario():
+        cache = TranscriptCache(None)
+        results = await asyncio.gather(*(cache.get_or_compute("k", compute) for _ in range(5)))
+        assert results == [{"text": "bonjour"}] * 5
+        assert calls == 1
+        assert (cache.hits, cache.misses) == (4, 1)
+        assert cache._inflight == {}
+
+    asyncio.run(scenario())
+
+
+def test_failure_is_shared_and_not_cached():
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        raise RuntimeError("décodage impossible")
+
+    async def scenario():
+        cache = TranscriptCache(None)
+        results = await asyncio.gather(*(cache.get_or_compute("k", compute) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert calls == 1
+        assert cache.get("k") is None
+        # L'échec n'est pas mémorisé : la requête suivante recommence
+        with pytest.raises(RuntimeError):
+            await cache.get_or_compute("k", compute)
+        assert calls == 2
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_does_not_cancel_transcription():
+    async def compute():
+        await asyncio.sleep(0.02)
+        return {"text": "bonjour"}
+
+    async def scenario():
+        cache = TranscriptCache(None)
+        owner = asyncio.create_task(cache.get_or_compute("k", compute))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(cache.get_or_compute("k", compute))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        assert await owner == {"text": "bonjour"}
+
+    asyncio.run(scenario())
+
+
+def test_lru_eviction_and_disk_reload(tmp_path):
+    cache = TranscriptCache(str(tmp_path), max_entries=2)
+    for key in ("a", "b", "c"):
+        cache.put(key, {"text": key})
+    assert list(cache._entries) == ["b", "c"]
+    # Évincée de la mémoire mais relue depuis le disque, y compris par une nouvelle instance
+    assert cache.get("a") == {"text": "a"}
+    assert TranscriptCache(str(tmp_path)).get("c") == {"text": "c"}
+
+
+def test_cancelled_first_caller_leaves_result_to_retry():
+    async def compute():
+        await asyncio.sleep(0.02)
+        return {"text": "bonjour"}
+
+    async def scenario():
+        cache = TranscriptCache(None)
+        owner = asyncio.create_task(cache.get_or_compute("k", compute))
+        await asyncio.sleep(0)
+        retry = asyncio.create_task(cache.get_or_compute("k", compute))
+        await asyncio.sleep(0)
+        # Timeout du proxy : la première requête est abandonnée, la nouvelle tentative attend
+        owner.cancel()
+        assert await retry == {"text": "bonjour"}
+        assert owner.cancelled()
+        assert cache.get("k") == {"text": "bonjour"}
+
+    asyncio.run(scenario())
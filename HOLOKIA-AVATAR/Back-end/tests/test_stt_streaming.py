@@ -0,0 +1,147 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("whisper")
+
+import stt_streaming
+from stt_streaming import StreamingTranscriber
+from vad import SAMPLE_RATE
+
+
+class FakeScheduler:
+    async def transcribe(self, audio, language=None):
+        return {"text": "bonjour", "language": "fr", "segments": []}
+
+
+def utterance():
+    t = np.arange(SAMPLE_RATE) / SAMPLE_RATE
+    speech = (0.3 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+    return np.concatenate([speech, np.zeros(SAMPLE_RATE, dtype=np.float32)])
+
+
+def test_final_is_sent_before_forward_completes():
+    async def scenario():
+        sent = []
+        release = asyncio.Event()
+
+        async def on_final(text, language, utterance_id):
+            await release.wait()
+            sent.append({"type": "reply", "utterance": utterance_id})
+
+        async def send(message):
+            sent.append(message)
+
+        transcriber = StreamingTranscriber(FakeScheduler(), send, on_final=on_final)
+        # push() rend la main sans attendre la réponse de on_final
+        await asyncio.wait_for(transcriber.push(utterance()), timeout=1.0)
+        assert [m["type"] for m in sent] == ["final"]
+        release.set()
+        await transcriber.flush()
+        assert [m["type"] for m in sent] == ["final", "reply"]
+        assert sent[1]["utterance"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_forwards_keep_utterance_order():
+    async def scenario():
+        replies = []
+
+        async def on_final(text, language, utterance_id):
+            # Le premier transfert est le plus lent
+            await asyncio.sleep(0.05 if utterance_id == 1 else 0)
+            replies.append(utterance_id)
+
+        async def send(message):
+            pass
+
+        transcriber = StreamingTranscriber(FakeScheduler(), send, on_final=on_final)
+        await transcriber.push(utterance())
+        await transcriber.push(utterance())
+        await transcriber.flush()
+        assert replies == [1, 2]
+
+    asyncio.run(scenario())
+
+
+def test_cancel_stops_pending_forward():
+    async def scenario():
+        finished = []
+
+        async def on_final(text, language, utterance_id):
+            await asyncio.sleep(10)
+            finished.append(utterance_id)
+
+        async def send(message):
+            pass
+
+        transcriber = StreamingTranscriber(FakeScheduler(), send, on_final=on_final)
+        await transcriber.push(utterance())
+        task = transcriber._final_task
+        transcriber.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        assert task.cancelled()
+        assert finished == []
+
+    asyncio.run(scenario())
+
+
+def test_stable_partial_speculation_is_registered_before_forward():
+    async def scenario():
+        speculations = {}
+        forwarded = []
+
+        async def on_stable_partial(text, language, utterance_id):
+            # Aller-retour vers /api/generate/speculate
+            await asyncio.sleep(0.01)
+            speculations[utterance_id] = f"c:{utterance_id}"
+
+        async def on_final(text, language, utterance_id):
+            forwarded.append(speculations.pop(utterance_id, None))
+
+        async def send(message):
+            pass
+
+        transcriber = StreamingTranscriber(
+            FakeScheduler(), send, on_final=on_final, stable_silence_ms=330, on_stable_partial=on_stable_partial
+        )
+        # Silence de stabilité et fin d'énoncé dans le même morceau : la partielle stable n'a pas encore tourné
+        await transcriber.push(utterance())
+        await transcriber.flush()
+        assert forwarded == ["c:1"]
+
+    asyncio.run(scenario())
+
+
+def test_slow_stable_partial_is_cancelled_after_wait(monkeypatch):
+    monkeypatch.setattr(stt_streaming, "STABLE_PARTIAL_WAIT_S", 0.01)
+
+    async def scenario():
+        speculated = []
+        forwarded = []
+
+        async def on_stable_partial(text, language, utterance_id):
+            await asyncio.sleep(10)
+            speculated.append(utterance_id)
+
+        async def on_final(text, language, utterance_id):
+            forwarded.append(utterance_id)
+
+        async def send(message):
+            pass
+
+        transcriber = StreamingTranscriber(
+            FakeScheduler(), send, on_final=on_final, stable_silence_ms=330, on_stable_partial=on_stable_partial
+        )
+        await transcriber.push(utterance())
+        stable_task = transcriber._stable_task
+        await transcriber.flush()
+        await asyncio.gather(stable_task, return_exceptions=True)
+        # Génération sur la finale, sans spéculation orpheline
+        assert forwarded == [1]
+        assert stable_task.cancelled() and speculated == []
+
+    asyncio.run(scenario())
@@ -0,0 +1,33 @@
+import json
+import os
+
+from tracing import SpanExporter, Trace
+
+
+def test_exporter_writes_from_background_thread(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    exporter = SpanExporter(str(path))
+    for index in range(50):
+        trace = Trace(f"req-{index}", "main")
+        trace.add("llm", None, 0.25)
+        exporter.export(trace, "POST", "/api/generate", 200)
+    exporter.flush()
+    assert exporter._writer.name == "trace-export" and exporter._writer.is_alive()
+    records = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert [record["request_id"] for record in records] == [f"req-{index}" for index in range(50)]
+    assert records[0]["status"] == 200 and records[0]["spans"][0]["name"] == "llm"
+
+
+def test_full_queue_drops_instead_of_blocking(tmp_path):
+    exporter = SpanExporter(str(tmp_path / "traces.jsonl"), max_queue=1)
+    # Pas de thread d'écriture : la file reste pleine
+    exporter._writer_pid = os.getpid()
+    for index in range(3):
+        exporter.export(Trace(f"req-{index}", "tts"), "POST", "/generate-tts/", 200)
+    assert exporter.dropped == 2
+
+
+def test_no_export_path_writes_nothing(tmp_path):
+    exporter = SpanExporter("")
+    exporter.export(Trace("req", "stt"), "POST", "/transcribe/", 200)
+    assert exporter._writer is None
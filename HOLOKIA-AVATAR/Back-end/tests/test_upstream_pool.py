@@ -0,0 +1,126 @@
+import asyncio
+import time
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+pytest.importorskip("fastapi")
+
+from upstream_pool import HashRing, UpstreamPool
+
+URLS = ["http://tts-a", "http://tts-b", "http://tts-c"]
+
+
+class StaticRegistry:
+    def __init__(self, urls):
+        self.urls = list(urls)
+
+    def instances(self, service):
+        return self.urls
+
+
+def make_pool(urls=URLS, **options):
+    return UpstreamPool("tts", StaticRegistry(urls), **options)
+
+
+def test_least_outstanding_picks_idle_replica():
+    pool = make_pool()
+    busy = {replica.url: replica for replica in pool.replicas()}
+    busy["http://tts-a"].in_flight = 2
+    busy["http://tts-b"].in_flight = 1
+    assert pool.choose().url == "http://tts-c"
+    assert pool.choose(exclude={"http://tts-c"}).url == "http://tts-b"
+
+
+def test_request_tracks_in_flight():
+    async def scenario():
+        pool = make_pool(["http://tts-a"])
+        async with pool.request() as replica:
+            assert replica.in_flight == 1
+        assert replica.in_flight == 0
+        assert replica.requests == 1
+
+    asyncio.run(scenario())
+
+
+def test_consecutive_failures_eject_replica():
+    async def scenario():
+        pool = make_pool(["http://tts-a", "http://tts-b"], max_failures=2)
+        for _ in range(2):
+            with pytest.raises(httpx.RequestError):
+                async with pool.request(exclude={"http://tts-b"}) as replica:
+                    raise httpx.RequestError("connexion refusée")
+        assert not replica.available(time.monotonic())
+        # Instance écartée : la suivante est choisie même sans exclusion
+        assert pool.choose().url == "http://tts-b"
+
+    asyncio.run(scenario())
+
+
+def test_client_errors_do_not_count_against_replica():
+    class Response:
+        status_code = 404
+
+    async def scenario():
+        pool = make_pool(["http://tts-a"], max_failures=1)
+        with pytest.raises(httpx.HTTPStatusError):
+            async with pool.request() as replica:
+                raise httpx.HTTPStatusError("introuvable", request=None, response=Response())
+        assert replica.failures == 0
+        assert replica.ejected_until == 0.0
+
+    asyncio.run(scenario())
+
+
+def test_all_ejected_still_returns_a_replica():
+    pool = make_pool(["http://tts-a", "http://tts-b"])
+    replicas = {replica.url: replica for replica in pool.replicas()}
+    replicas["http://tts-a"].ejected_until = float("inf")
+    replicas["http://tts-b"].ejected_until = 1e12
+    assert pool.choose().url == "http://tts-b"
+
+
+def test_ring_owner_is_stable_and_covers_all_nodes():
+    ring = HashRing(URLS)
+    walk = list(ring.walk("cle"))
+    assert sorted(walk) == sorted(URLS)
+    assert list(HashRing(reversed(URLS)).walk("cle")) == walk
+
+
+def test_ring_removal_only_moves_removed_keys():
+    keys = [f"phrase-{index}" for index in range(500)]
+    full, reduced = HashRing(URLS), HashRing(URLS[:2])
+    before = {key: next(full.walk(key)) for key in keys}
+    after = {key: next(reduced.walk(key)) for key in keys}
+    moved = [key for key in keys if before[key] != after[key]]
+    assert moved and all(before[key] == URLS[2] for key in moved)
+
+
+def test_keyed_choice_follows_ring_owner():
+    pool = make_pool(hash_affinity=True)
+    pool.replicas()
+    owner = next(pool._ring.walk("cle"))
+    assert pool.choose(key="cle").url == owner
+    assert pool.choose(key="cle", exclude={owner}).url == list(pool._ring.walk("cle"))[1]
+    assert pool.affinity_hits == 1 and pool.affinity_spills == 1
+
+
+def test_bounded_load_spills_to_next_replica():
+    pool = make_pool(hash_affinity=True, load_factor=1.25)
+    replicas = {replica.url: replica for replica in pool.replicas()}
+    owner, second, _ = pool._ring.walk("cle")
+    # Charge totale 4 (+1) sur 3 instances : au plus ceil(1.25 * 5 / 3) = 3 requêtes chacune
+    replicas[owner].in_flight = 3
+    replicas[second].in_flight = 1
+    assert pool.choose(key="cle").url == second
+    # Charge totale 2 (+1) : au plus 2 requêtes, le propriétaire en a 1
+    replicas[owner].in_flight = 1
+    assert pool.choose(key="cle").url == owner
+
+
+def test_key_ignored_without_affinity():
+    pool = make_pool()
+    replicas = {replica.url: replica for replica in pool.replicas()}
+    for url in URLS[:2]:
+        replicas[url].in_flight = 1
+    assert pool.choose(key="cle").url == URLS[2]
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from vad import SAMPLE_RATE, frame_energy_db, pcm16_to_float32, speech_segments, trim_silence
+
+
+def tone(seconds, amplitude=0.3, modulation=0.5):
+    """Son continu modulé en amplitude, proche de l'enveloppe de la parole"""
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    envelope = amplitude * (1 + modulation * np.sin(2 * np.pi * 3 * t))
+    return (envelope * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+
+
+def silence(seconds):
+    return np.zeros(int(seconds * SAMPLE_RATE), dtype=np.float32)
+
+
+def test_digital_silence_has_no_speech():
+    assert speech_segments(silence(2)) == []
+
+
+def test_empty_clip():
+    assert speech_segments(np.zeros(10, dtype=np.float32)) == []
+
+
+@pytest.mark.parametrize("leading_silence", [0.0, 0.05, 0.09, 0.12, 0.3])
+def test_mostly_speech_clip_is_kept(leading_silence):
+    total = 3.0
+    audio = np.concatenate([silence(total * leading_silence), tone(total * (1 - leading_silence))])
+    segments = speech_segments(audio)
+    assert segments
+    start, end = segments[0]
+    assert start <= int(total * leading_silence * SAMPLE_RATE)
+    assert end == len(audio)
+
+
+def test_long_pause_splits_segments():
+    audio = np.concatenate([silence(0.5), tone(1), silence(1.5), tone(1), silence(0.5)])
+    segments = speech_segments(audio)
+    assert len(segments) == 2
+    assert segments[0][1] < segments[1][0]
+
+
+def test_short_pause_is_bridged():
+    audio = np.concatenate([silence(0.5), tone(1), silence(0.2), tone(1), silence(0.5)])
+    assert len(speech_segments(audio)) == 1
+
+
+def test_short_loud_blip_falls_back_to_whole_clip():
+    audio = np.concatenate([silence(1), tone(0.06), silence(1)])
+    assert speech_segments(audio) == [(0, len(audio))]
+
+
+def test_trim_silence_reports_dropped_seconds():
+    audio = np.concatenate([silence(1), tone(1), silence(1)])
+    segments, offsets, dropped = trim_silence(audio, padding_ms=0)
+    assert len(segments) == 1
+    assert offsets[0] == pytest.approx(1.0, abs=0.05)
+    assert dropped == pytest.approx(2.0, abs=0.1)
+
+
+def test_frame_energy_and_pcm_conversion():
+    pcm = (np.full(SAMPLE_RATE, 16384, dtype="<i2")).tobytes()
+    audio = pcm16_to_float32(pcm)
+    assert audio[0] == pytest.approx(0.5)
+    assert frame_energy_db(audio)[0] == pytest.approx(20 * np.log10(0.5), abs=0.01)
@@ -0,0 +1,65 @@
+import asyncio
+import os
+
+import pytest
+
+from warmup import WarmupProgress, load_phrases, warm_up
+
+PHRASES_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app", "warmup_phrases.yaml")
+
+
+def test_load_phrases_keeps_file_order(tmp_path):
+    path = tmp_path / "phrases.yaml"
+    path.write_text("fr:\n  - Bonjour\n  - Merci\nen:\n  - Hello\nar:\n", encoding="utf-8")
+    assert load_phrases(str(path)) == [("fr", "Bonjour"), ("fr", "Merci"), ("en", "Hello")]
+
+
+def test_shipped_phrases_load():
+    assert load_phrases(PHRASES_FILE)
+
+
+def test_concurrency_is_bounded_and_failures_counted():
+    running = 0
+    peak = 0
+
+    async def warm_phrase(phrase, lang):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        if phrase == "échec":
+            raise RuntimeError("TTS indisponible")
+
+    phrases = [("fr", f"phrase {index}") for index in range(9)] + [("fr", "échec")]
+    progress = asyncio.run(warm_up(phrases, warm_phrase, WarmupProgress(len(phrases)), concurrency=3))
+    assert peak == 3
+    assert (progress.done, progress.failed, progress.deadline_expired) == (9, 1, False)
+    assert progress.snapshot()["finished"]
+
+
+def test_deadline_returns_early_and_finishes_in_background():
+    async def warm_phrase(phrase, lang):
+        await asyncio.sleep(0.2 if phrase == "lente" else 0)
+
+    async def scenario():
+        phrases = [("fr", "rapide"), ("fr", "lente")]
+        progress = await warm_up(phrases, warm_phrase, WarmupProgress(2), deadline=0.05)
+        assert progress.deadline_expired and progress.done == 1
+        await asyncio.sleep(0.3)
+        assert progress.done == 2
+
+    asyncio.run(scenario())
+
+
+def test_no_phrases():
+    progress = asyncio.run(warm_up([], None, WarmupProgress(0)))
+    assert progress.snapshot()["finished"] and not progress.deadline_expired
+
+
+def test_shipped_phrases_reach_the_llm():
+    pytest.importorskip("fastapi")
+    from intents import IntentMatcher
+
+    matcher = IntentMatcher.from_file(os.path.join(os.path.dirname(PHRASES_FILE), "intents.yaml"))
+    assert [(lang, phrase) for lang, phrase in load_phrases(PHRASES_FILE) if matcher.match(phrase, lang)] == []
@@ -83,6 +83,7 @@ export const ChatInterface = () => {
   const [isPlaying,setIsPlaying]=useState(false);
   const messagesEndRef = useRef(null);
   const audioRef = useRef(null);
+  const sessionIdRef = useRef(null); // Session serveur : seul le nouveau message est envoyé
   const [audioFile, setAudioFile] = useState("");
 
  
@@ -214,14 +215,23 @@ const handleSendMessage = async (e) => {
         content: msg.text,
       }));
       conversationHistory.push({ role: "user", content: message });
-      const response = await apiClient.generateResponse({ history: conversationHistory,detectedLanguage: detectedLang});
+      const { response, sessionId } = await apiClient.generateInSession(
+        sessionIdRef.current, message, detectedLang, conversationHistory.slice(0, -1)
+      );
+      sessionIdRef.current = sessionId;
       console.log(response)
       // Le backend détecte automatiquement la langue, on l'utilise pour le TTS
       // On peut extraire la langue détectée du contexte ou utiliser la langue actuelle
       //const detectedLang = lang; // Pour l'instant, on utilise la langue sélectionnée
       
-      // Toujours générer l'audio car le backend ne le fait pas automatiquement
-      const audioPath = await generateAudioAndLipsync(response.text, message, audios, detectedLang);
+      // Réponse locale du backend (salutation...) : audio déjà synthétisé, sinon génération TTS
+      let audioPath;
+      if (response.audioId) {
+        audioPath = `/audios/${response.audioId}.mp3`;
+        setAudioFile(audioPath);
+      } else {
+        audioPath = await generateAudioAndLipsync(response.text, message, audios, detectedLang);
+      }
       if (!audioPath) {
         setError("Erreur lors de la génération de l'audio");
         return;
@@ -240,6 +250,7 @@ const handleSendMessage = async (e) => {
 
   const handleResetChat = () => {
     setMessages([]);
+    sessionIdRef.current = null;
     localStorage.removeItem("chatMessages");
     setDetectedLang("en");
     setShowLangIndicator(false);
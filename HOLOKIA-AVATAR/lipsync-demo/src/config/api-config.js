@@ -11,10 +11,39 @@ const apiClient = {
     } catch (error) {
       return {
         error: true,
+        status: error.response?.status,
         message: error.response?.data?.detail || error.message,
       };
     }
   },
+
+  createSession: async (history = []) => {
+    const response = await axios.post(`${BASE_URL}/api/sessions`, { history });
+    return response.data.sessionId;
+  },
+
+  // Mode session : seul le nouveau message est envoyé ; la session est (re)créée
+  // avec l'historique local si elle n'existe pas ou a expiré côté serveur
+  generateInSession: async (sessionId, message, detectedLanguage, history = []) => {
+    try {
+      if (!sessionId) {
+        sessionId = await apiClient.createSession(history);
+      }
+      let response = await apiClient.generateResponse({ sessionId, message, detectedLanguage });
+      if (response.error && response.status === 404) {
+        sessionId = await apiClient.createSession(history);
+        response = await apiClient.generateResponse({ sessionId, message, detectedLanguage });
+      }
+      return { response, sessionId };
+    } catch (error) {
+      // Sessions indisponibles : envoi de l'historique complet
+      const response = await apiClient.generateResponse({
+        history: [...history, { role: "user", content: message }],
+        detectedLanguage,
+      });
+      return { response, sessionId: null };
+    }
+  },
 };
 
 export { apiClient };
\ No newline at end of file